@@ -0,0 +1,390 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Banc d'essai de bout en bout sur une seule machine : N processus
+# écrivains, M lecteurs sans interface (le vrai moteur client.ChatClient)
+# et des transferts send_file de plusieurs tailles. Le résultat (latence
+# p50/p99, messages/s, Mo/s, CPU par client, lignes abîmées) est écrit en
+# JSON pour comparer deux réglages ou deux versions.
+# Usage : python bench.py --writers 4 --readers 4 --count 2000 --rate 500 \
+#             --dir /dev/shm --out resultat.json
+# --delta-mb 64 --delta-change 0.001 0.01 0.1 mesure en plus les octets
+# écrits par un nouvel envoi d'une version modifiée (transfert différentiel).
+# Chaque message porte son heure d'envoi : "bench w<n> <numéro> <heure> <taille> <remplissage>".
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+
+from config import get_config
+from format import format_msg
+from writer import make_writer
+from journal import writer_path
+from message import parse_line
+from file_transfer import send_file
+from compression import COMPRESSION_MODES
+
+PREFIX = "bench "
+WRITE_MODES = ("writer", "raw", "relay")
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def cpu_seconds():
+    times = os.times()
+    return times.user + times.system
+
+
+def bench_text(writer, number, size):
+    return f"{PREFIX}w{writer} {number} {time.time():.6f} {size} {'x' * size}"
+
+
+def parse_bench(body):
+    """
+    (écrivain, numéro, heure d'envoi) d'un message du banc, None si le
+    message est abîmé (champ manquant ou remplissage de mauvaise taille).
+    """
+    parts = body[len(PREFIX):].split(" ")
+    if len(parts) != 5 or not parts[0].startswith("w"):
+        return None
+    try:
+        writer, number, sent, size = int(parts[0][1:]), int(parts[1]), float(parts[2]), int(parts[3])
+    except ValueError:
+        return None
+    if len(parts[4]) != size or parts[4].strip("x"):
+        return None
+    return writer, number, sent
+
+
+def writer_process(index, config, mode, count, rate, size, start, results):
+    """
+    Écrit count messages au rythme rate (messages/s, 0 = au plus vite).
+    mode "raw" : ouverture en ajout et write par message (écriture
+    d'origine), "writer" : writer.LogWriter, "relay" : relay.RelayClient.
+    Avec "journal_mode": "per_writer", chacun écrit dans son journal.
+    """
+    username = f"writer{index}"
+    path = writer_path(config["shared_file"], config, username)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    sink = None
+    if mode == "writer":
+        sink = make_writer(path, config)
+    elif mode == "relay":
+        from relay import connect
+        sink = connect(config)
+    start.wait()
+    cpu = cpu_seconds()
+    begin = time.monotonic()
+    for number in range(count):
+        if rate:
+            delay = begin + number / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        text = bench_text(index, number, size)
+        if sink is None:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(format_msg(username, text))
+        else:
+            sink.post(username, text)
+    if sink is not None:
+        sink.close()
+    results.put(("writer", {"writer": index, "sent": count, "seconds": time.monotonic() - begin,
+                            "cpu_s": cpu_seconds() - cpu}))
+
+
+async def _read(index, config, expected, timeout, results):
+    from client import ChatClient, EVENT_LINES
+
+    client = ChatClient(config, f"reader{index}", "bench", announce=False)
+    await client.start()
+    results.put(("ready", index))
+    loop = asyncio.get_running_loop()
+    loop.call_later(timeout, lambda: asyncio.ensure_future(client.close()))
+    cpu = cpu_seconds()
+    latencies = []
+    last_seen = {}
+    stats = {"reader": index, "received": 0, "torn": 0, "reordered": 0, "duplicates": 0, "last_receive": None}
+    async for event in client.events():
+        if event.kind != EVENT_LINES:
+            continue
+        now = time.time()
+        for _, line in event.data:
+            msg = parse_line(line)
+            if msg is None or not msg.body.startswith(PREFIX):
+                stats["torn"] += 1
+                continue
+            fields = parse_bench(msg.body)
+            if fields is None:
+                stats["torn"] += 1
+                continue
+            writer, number, sent = fields
+            previous = last_seen.get(writer, -1)
+            if number == previous:
+                stats["duplicates"] += 1
+                continue
+            if number < previous:
+                stats["reordered"] += 1
+            else:
+                last_seen[writer] = number
+            stats["received"] += 1
+            latencies.append(now - sent)
+        stats["last_receive"] = now
+        if stats["received"] >= expected:
+            break
+    stats["cpu_s"] = cpu_seconds() - cpu
+    stats["latencies"] = latencies
+    await client.close()
+    results.put(("reader", stats))
+
+
+def reader_process(index, config, expected, timeout, results):
+    """
+    Lecteur sans interface : ChatClient (journal ou relais selon config),
+    jusqu'à avoir reçu expected messages ou timeout secondes.
+    """
+    asyncio.run(_read(index, config, expected, timeout, results))
+
+
+def relay_process(config):
+    from relay import RelayServer
+    from channels import ChannelWriter
+
+    writer = ChannelWriter(config["shared_file"], config) if config["relay_persist"] else None
+    server = RelayServer(config["relay_host"], int(config["relay_port"]), writer)
+    try:
+        asyncio.run(server.serve_forever())
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def wait_port(host, port, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), 0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def bench_transfers(config, root, sizes_mb, data="random"):
+    """
+    send_file de fichiers de sizes_mb Mo vers Downloads/bench, contenu
+    aléatoire (incompressible) ou texte de journal.
+    """
+    results = []
+    chunk = int(config["transfer_chunk_mb"] * 1024 * 1024)
+    workers = int(config["transfer_workers"])
+    if data == "text":
+        lines = (format_msg(f"writer{i % 7}", bench_text(i % 7, i, 64)) for i in range(1 << 20))
+        block = "".join(lines).encode("utf-8")[:1024 * 1024]
+    else:
+        block = os.urandom(1024 * 1024)
+    for size_mb in sizes_mb:
+        src = os.path.join(root, f"transfer_{size_mb:g}mb.bin")
+        with open(src, 'wb') as f:
+            for _ in range(int(size_mb)):
+                f.write(block)
+            f.write(block[:int((size_mb % 1) * len(block))])
+        _, dest, stats = send_file(src, "bench", config["downloads_dir"], chunk, workers,
+                                   config["transfer_compression"])
+        results.append({"size_mb": size_mb, "seconds": stats["seconds"],
+                        "mb_per_s": stats["mb_per_s"], "method": stats["method"],
+                        "written_mb": stats.get("written_bytes", stats["bytes"]) / 1e6})
+        os.remove(src)
+        os.remove(dest)
+    return results
+
+
+def _modify(path, change, block=4096):
+    """
+    Modifie une fraction change du fichier path (blocs de block octets
+    répartis) et insère quelques octets au début (décalage de tout le reste).
+    """
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+    edits = int(len(data) * change / block)
+    step = len(data) // max(edits, 1)
+    for i in range(edits):
+        offset = i * step + step // 2
+        data[offset:offset + block] = os.urandom(len(data[offset:offset + block]))
+    data[4096:4096] = b"inserted"
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def bench_delta(config, root, sizes_mb, changes):
+    """
+    Pour chaque taille et taux de modification : envoi complet, puis
+    nouvel envoi de la version modifiée (send_file avec delta).
+    """
+    results = []
+    for size_mb in sizes_mb:
+        for change in changes:
+            src = os.path.join(root, f"delta_{size_mb:g}mb.bin")
+            with open(src, 'wb') as f:
+                f.write(os.urandom(int(size_mb * 1024 * 1024)))
+            _, dest, _ = send_file(src, "bench", config["downloads_dir"], delta=True)
+            _modify(src, change)
+            _, dest, stats = send_file(src, "bench", config["downloads_dir"], delta=True)
+            with open(src, 'rb') as a, open(dest, 'rb') as b:
+                identical = a.read() == b.read()
+            results.append({"size_mb": size_mb, "change": change, "seconds": stats["seconds"],
+                            "written_mb": stats.get("written_bytes", stats["bytes"]) / 1e6,
+                            "reused_mb": stats.get("reused_bytes", 0) / 1e6,
+                            "method": stats["method"], "identical": identical})
+            os.remove(src)
+            os.remove(dest)
+    return results
+
+
+def run(args):
+    root = tempfile.mkdtemp(prefix="bench-", dir=args.dir)
+    config = dict(get_config())
+    config.update({
+        "shared_file": os.path.join(root, "shared_chat.log"),
+        "downloads_dir": os.path.join(root, "file"),
+        "state_dir": os.path.join(root, "state"),
+        "transport": "relay" if args.mode == "relay" else "file",
+        "channels": ["general"],
+        "search_index": False,
+    })
+    if args.mode == "relay":
+        config["relay_host"] = "127.0.0.1"
+        config["relay_port"] = args.relay_port
+        config["relay_persist"] = not args.no_persist
+    for key in ("fsync", "log_format", "watch", "journal_mode", "transfer_compression"):
+        if getattr(args, key):
+            config[key] = getattr(args, key)
+
+    ctx = multiprocessing.get_context()
+    results = ctx.Queue()
+    start = ctx.Event()
+    processes = []
+    relay = None
+    try:
+        if args.mode == "relay":
+            relay = ctx.Process(target=relay_process, args=(config,), daemon=True)
+            relay.start()
+            if not wait_port(config["relay_host"], config["relay_port"]):
+                raise RuntimeError("le relais ne répond pas")
+        expected = args.writers * args.count
+        for i in range(args.readers):
+            processes.append(ctx.Process(target=reader_process, args=(i, config, expected, args.timeout, results)))
+        for i in range(args.writers):
+            processes.append(ctx.Process(target=writer_process,
+                                         args=(i, config, args.mode, args.count, args.rate, args.size, start, results)))
+        for process in processes:
+            process.start()
+        for _ in range(args.readers):
+            results.get(timeout=30)   # lecteurs prêts (positionnés en fin de journal)
+        began = time.time()
+        start.set()
+
+        writers, readers = [], []
+        while len(writers) < args.writers or len(readers) < args.readers:
+            kind, data = results.get(timeout=args.timeout + 30)
+            (writers if kind == "writer" else readers).append(data)
+        for process in processes:
+            process.join()
+
+        transfers = bench_transfers(config, root, args.transfer_mb, args.transfer_data) if args.transfer_mb else []
+        deltas = bench_delta(config, root, args.delta_mb, args.delta_change) if args.delta_mb else []
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        if relay is not None:
+            relay.terminate()
+            relay.join()
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    latencies = [value for reader in readers for value in reader.pop("latencies")]
+    last = max((reader["last_receive"] or began for reader in readers), default=began)
+    received = sum(reader["received"] for reader in readers)
+    return {
+        "settings": {
+            "mode": args.mode, "writers": args.writers, "readers": args.readers, "count": args.count,
+            "rate": args.rate, "size": args.size, "dir": args.dir or tempfile.gettempdir(),
+            "fsync": config["fsync"], "log_format": config["log_format"], "watch": config["watch"],
+            "journal_mode": config["journal_mode"], "merge_window_ms": config["merge_window_ms"],
+            "transfer_compression": config["transfer_compression"], "transfer_data": args.transfer_data,
+            "group_window_ms": config["group_window_ms"], "min_interval": config["min_interval"],
+            "max_interval": config["max_interval"], "platform": sys.platform,
+        },
+        "latency_ms": {
+            "p50": _ms(percentile(latencies, 50)),
+            "p99": _ms(percentile(latencies, 99)),
+            "max": _ms(max(latencies, default=None)),
+        },
+        "messages_per_s": received / max(last - began, 1e-9) / max(args.readers, 1),
+        "sent": args.writers * args.count,
+        "missing": args.writers * args.count * args.readers - received,
+        "torn": sum(reader["torn"] for reader in readers),
+        "reordered": sum(reader["reordered"] for reader in readers),
+        "duplicates": sum(reader["duplicates"] for reader in readers),
+        "writers": sorted(writers, key=lambda w: w["writer"]),
+        "readers": sorted(readers, key=lambda r: r["reader"]),
+        "transfers": transfers,
+        "delta": deltas,
+    }
+
+
+def _ms(value):
+    return None if value is None else round(value * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai de la messagerie")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--count", type=int, default=1000, help="messages par écrivain")
+    parser.add_argument("--rate", type=float, default=200, help="messages/s par écrivain (0 = au plus vite)")
+    parser.add_argument("--size", type=int, default=64, help="taille du remplissage des messages")
+    parser.add_argument("--mode", choices=WRITE_MODES, default="writer")
+    parser.add_argument("--fsync", choices=("always", "interval", "never"))
+    parser.add_argument("--log-format", dest="log_format", choices=("text", "binary"))
+    parser.add_argument("--watch", choices=("auto", "inotify", "poll"))
+    parser.add_argument("--journal-mode", dest="journal_mode", choices=("shared", "per_writer"))
+    parser.add_argument("--relay-port", type=int, default=8799)
+    parser.add_argument("--no-persist", action="store_true", help="relais sans écriture du journal")
+    parser.add_argument("--transfer-mb", type=float, nargs="*", default=[1, 16, 64])
+    parser.add_argument("--transfer-data", choices=("random", "text"), default="random")
+    parser.add_argument("--transfer-compression", dest="transfer_compression", choices=COMPRESSION_MODES)
+    parser.add_argument("--delta-mb", type=float, nargs="*", default=[], help="tailles du banc différentiel")
+    parser.add_argument("--delta-change", type=float, nargs="*", default=[0.001, 0.01, 0.1],
+                        help="fractions modifiées entre deux envois")
+    parser.add_argument("--timeout", type=float, default=60.0, help="durée maximale d'attente des lecteurs")
+    parser.add_argument("--dir", help="dossier de travail (ex. /dev/shm pour un tmpfs)")
+    parser.add_argument("--keep", action="store_true", help="garder les fichiers du banc")
+    parser.add_argument("--out", help="fichier JSON (sinon sortie standard)")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        latency = report["latency_ms"]
+        print(f"[OK] p50 {latency['p50']} ms, p99 {latency['p99']} ms, "
+              f"{report['messages_per_s']:,.0f} messages/s, {report['missing']} manquants, "
+              f"{report['torn']} abîmés -> {args.out}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Micro-benchmark de l'analyse des lignes : anciennes regex en ligne
+# (read.py / ReaderThread) contre le module message.
+# Usage : python bench_parse.py [nombre_de_lignes]
+import re
+import sys
+import time
+
+from format import format_msg
+from message import parse_line, parse_lines, KIND_EXEC
+
+
+def sample_lines(count):
+    """
+    Trafic typique : surtout du texte, quelques @exec, [FILE] et [EXEC].
+    """
+    lines = []
+    for i in range(count):
+        if i % 50 == 0:
+            text = f"@exec bob dir C:\\temp\\{i}"
+        elif i % 50 == 1:
+            text = f"[FILE] Sent rapport_{i}.pdf to carol"
+        elif i % 50 == 2:
+            text = f"[EXEC] Accepted command from alice: ls {i}"
+        else:
+            text = f"message numéro {i} avec un peu de texte"
+        lines.append(format_msg(f"user{i % 7}", text).rstrip("\n"))
+    return lines
+
+
+def old_read(lines):
+    # read.py d'origine : pré-filtre puis regex en ligne
+    r_exp = r"^\d{4}-\d{2}-\d{2} .* ?[–-] (.*?) : (.*)$"
+    found = 0
+    for line in lines:
+        if "@exec" in line:
+            m = re.match(r_exp, line)
+            if m and m.group(2).strip().startswith("@exec"):
+                found += 1
+    return found
+
+
+def old_gui(lines):
+    # ReaderThread d'origine : regex en ligne sur chaque ligne
+    pattern = r"^(\d{4}-\d{2}-\d{2} .*?) ?[–-] (.*?) : (.*)$"
+    found = 0
+    for line in lines:
+        m = re.match(pattern, line)
+        if m and m.group(3).strip().startswith("@exec"):
+            found += 1
+    return found
+
+
+def new_exec(lines):
+    return len(parse_lines(lines, kinds={KIND_EXEC}))
+
+
+def new_full(lines):
+    return sum(1 for msg in map(parse_line, lines) if msg and msg.kind == KIND_EXEC)
+
+
+def bench(name, func, lines, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        found = func(lines)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<32} {len(lines) / best:>12,.0f} lignes/s  ({found} @exec)")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    lines = sample_lines(count)
+    bench("avant : read.py (regex)", old_read, lines)
+    bench("avant : ReaderThread (regex)", old_gui, lines)
+    bench("après : parse_lines(@exec)", new_exec, lines)
+    bench("après : parse_line (tout)", new_full, lines)
+
+
+if __name__ == "__main__":
+    main()
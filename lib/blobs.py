@@ -0,0 +1,428 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Stockage par contenu des fichiers envoyés avec @send ("blob_store" dans
+# chat.json). Le contenu est écrit une seule fois sous
+#   downloads_dir/.blobs/<2 premiers caractères>/<sha256>
+# (empreinte calculée pendant l'envoi) et chaque destinataire reçoit un
+# lien vers ce blob dans Downloads/<user>/ : clone (reflink, même système
+# de fichiers, chaque destinataire peut modifier sa copie), sinon lien
+# physique, sinon copie.
+# Un fichier déjà envoyé et inchangé (taille, date) n'est ni relu ni
+# renvoyé : son empreinte est gardée dans state_dir/blob-hashes.json.
+# Les blobs sont en lecture seule (un lien physique partage les données
+# entre destinataires) : un blob rendu modifiable est revérifié avant
+# d'être relié à nouveau (verify_blob). gc() supprime ceux qui n'ont plus
+# de lien.
+# Avec "transfer_compression", le blob est compressé par blocs
+# (<sha256>.cz, voir compression.py) et les destinataires reçoivent
+# <fichier>.cz ; l'empreinte reste celle du contenu d'origine.
+# Avec "transfer_delta", si un destinataire a déjà une version du fichier,
+# le nouveau blob est assemblé à partir d'elle (voir delta.py). La
+# signature d'un blob est gardée à côté de lui (<sha256>.sig), calculée
+# une seule fois ; celles des destinataires n'en sont que des renvois.
+# Usage : python blobs.py gc [heures]
+import os
+import sys
+import json
+import time
+import errno
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from format import make_dir, make_writable
+from file_transfer import transfer_stats, PART_SUFFIX
+from compression import choose_codec, compress_file, open_read, COMPRESSED_SUFFIX
+from delta import (
+    delta_base, delta_copy, load_signature, save_signature, save_signature_ref, signature_path,
+    SIGNATURES_DIR, SIGNATURE_SUFFIX, DELTA_MIN_SIZE,
+)
+
+BLOBS_DIR = ".blobs"
+BLOB_CHUNK = 8 * 1024 * 1024
+HASH_CACHE_MAX = 1000
+FICLONE = 0x40049409            # ioctl Linux (btrfs, XFS...) : clone des blocs
+
+BLOB_UPLOADED = metrics.counter("blob_uploaded_bytes_total", "Octets écrits dans le stockage par contenu")
+BLOB_DEDUP = metrics.counter("blob_dedup_total", "Envois servis par un blob déjà présent")
+BLOB_LINKS = metrics.counter("blob_links_total", "Fichiers de destinataires créés depuis un blob")
+
+_cache_lock = threading.Lock()
+
+
+def hash_cache_path(config):
+    return os.path.join(os.path.expanduser(config["state_dir"]), "blob-hashes.json")
+
+
+def blobs_dir(downloads_dir):
+    return os.path.join(downloads_dir, BLOBS_DIR)
+
+
+def blob_path(downloads_dir, digest, compressed=False):
+    path = os.path.join(blobs_dir(downloads_dir), digest[:2], digest)
+    return path + COMPRESSED_SUFFIX if compressed else path
+
+
+def find_blob(downloads_dir, digest):
+    """
+    Blob existant pour digest (compressé ou non), None s'il n'y en a pas.
+    """
+    for compressed in (False, True):
+        path = blob_path(downloads_dir, digest, compressed)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def verify_blob(blob, digest):
+    """
+    Vrai si blob a toujours le contenu de digest. Un blob encore en
+    lecture seule n'a pas pu être modifié sur place (pas de relecture) ;
+    sinon il est relu, et mis de côté (dossier tmp, supprimé par gc) si
+    un destinataire l'a modifié par son lien.
+    """
+    try:
+        if not os.stat(blob).st_mode & 0o222:
+            return True
+        current = hashlib.sha256()
+        with open_read(blob) as f:
+            for data in iter(lambda: f.read(BLOB_CHUNK), b""):
+                current.update(data)
+        if current.hexdigest() == digest:
+            os.chmod(blob, 0o444)
+            return True
+        metrics.log.warning("Blob modifié par un destinataire, mis de côté : %s", blob)
+        tmp_dir = os.path.join(blobs_dir(os.path.dirname(os.path.dirname(os.path.dirname(blob)))), "tmp")
+        make_dir(tmp_dir)
+        os.replace(blob, os.path.join(tmp_dir, f"{os.path.basename(blob)}-{time.time_ns()}.bad"))
+    except (OSError, ValueError) as e:
+        metrics.log.warning("Blob illisible %s : %s", blob, e)
+    return False
+
+
+# ---------------------- Empreintes déjà connues ----------------------
+
+def _load_cache(cache_path):
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def cached_digest(cache_path, src_path, st):
+    """
+    Empreinte de src_path si elle est connue pour cette taille et cette date.
+    """
+    if not cache_path:
+        return None
+    entry = _load_cache(cache_path).get(os.path.abspath(src_path))
+    if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+        return entry[2]
+    return None
+
+
+def remember_digest(cache_path, src_path, st, digest):
+    if not cache_path:
+        return
+    with _cache_lock:
+        cache = _load_cache(cache_path)
+        cache.pop(os.path.abspath(src_path), None)
+        cache[os.path.abspath(src_path)] = [st.st_size, st.st_mtime_ns, digest]
+        while len(cache) > HASH_CACHE_MAX:
+            cache.pop(next(iter(cache)))
+        make_dir(os.path.dirname(cache_path) or ".")
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+
+
+# ---------------------- Écriture du blob ----------------------
+
+def upload(src_path, downloads_dir, chunk_size=BLOB_CHUNK, codec=None, base=None):
+    """
+    Copie src_path dans le stockage en calculant son sha256 au passage
+    (lecture et écriture se chevauchent : un thread écrit le bloc
+    précédent pendant que le suivant est lu et haché), compressé par
+    blocs si codec est donné, ou assemblé depuis une ancienne version si
+    base = (chemin, chemin_de_sa_signature) est donné.
+    Retourne (empreinte, chemin_du_blob, octets_écrits, signature) ;
+    octets_écrits vaut 0 si le blob existait déjà (la copie temporaire est
+    abandonnée), signature est celle du nouveau contenu (None sans base).
+    """
+    tmp_dir = os.path.join(blobs_dir(downloads_dir), "tmp")
+    make_dir(tmp_dir)
+    tmp_path = os.path.join(tmp_dir, f"{os.getpid()}-{threading.get_ident()}-{time.time_ns()}{PART_SUFFIX}")
+    digest = hashlib.sha256()
+    written = 0
+    signature = None
+    try:
+        if base is not None:
+            written, _, signature = delta_copy(src_path, base[0], tmp_path, load_signature(*base), digest)
+        elif codec is not None:
+            _, written = compress_file(src_path, tmp_path, codec, digest=digest)
+        else:
+            written = _copy_hashed(src_path, tmp_path, chunk_size, digest)
+        hexdigest = digest.hexdigest()
+        final = find_blob(downloads_dir, hexdigest)
+        if final is not None and verify_blob(final, hexdigest):
+            os.remove(tmp_path)
+            return hexdigest, final, 0, signature
+        final = blob_path(downloads_dir, hexdigest, codec is not None)
+        make_dir(os.path.dirname(final))
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, final)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    BLOB_UPLOADED.inc(written)
+    return hexdigest, final, written, signature
+
+
+def _copy_hashed(src_path, tmp_path, chunk_size, digest):
+    written = 0
+    with open(src_path, 'rb', buffering=0) as src, open(tmp_path, 'wb', buffering=0) as dst, \
+            ThreadPoolExecutor(max_workers=1) as pool:
+        pending = None
+        buffers = [bytearray(chunk_size), bytearray(chunk_size)]
+        turn = 0
+        while True:
+            buf = buffers[turn]
+            n = src.readinto(buf)
+            if not n:
+                break
+            view = memoryview(buf)[:n]
+            digest.update(view)
+            if pending is not None:
+                pending.result()   # le tampon de l'autre tour est libre
+            pending = pool.submit(_write_all, dst, view)
+            written += n
+            turn ^= 1
+        if pending is not None:
+            pending.result()
+    return written
+
+
+def _write_all(dst, view):
+    done = 0
+    while done < len(view):
+        done += dst.write(view[done:])
+
+
+# ---------------------- Liens des destinataires ----------------------
+
+def _reflink(src, dst):
+    import fcntl
+
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+def link_blob(blob, dest_path):
+    """
+    Place le blob en dest_path (atomique : passe par dest_path.part).
+    Retourne la méthode utilisée : "reflink", "hardlink" ou "copy".
+    """
+    try:
+        if os.path.samefile(blob, dest_path):
+            return "hardlink"
+    except OSError:
+        pass
+    part_path = dest_path + PART_SUFFIX
+    make_writable(part_path)
+    try:
+        os.remove(part_path)
+    except FileNotFoundError:
+        pass
+    method = None
+    # clone d'abord : blocs partagés mais fichiers distincts, une
+    # modification chez un destinataire ne touche ni le blob ni les autres
+    if sys.platform.startswith("linux"):
+        try:
+            _reflink(blob, part_path)
+            method = "reflink"
+        except (OSError, ImportError):
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+    if method is None:
+        try:
+            os.link(blob, part_path)
+            method = "hardlink"
+        except (OSError, NotImplementedError):
+            pass
+    if method is None:
+        shutil.copyfile(blob, part_path, follow_symlinks=True)
+        os.chmod(part_path, 0o644)
+        method = "copy"
+    make_writable(dest_path)
+    os.replace(part_path, dest_path)
+    BLOB_LINKS.inc()
+    return method
+
+
+def _delta_base(downloads_dir, dest_users, filename):
+    """
+    Ancienne version du fichier chez un des destinataires, pour le
+    transfert différentiel : (chemin, chemin_de_sa_signature) ou None.
+    """
+    for user in dest_users:
+        path = os.path.join(downloads_dir, user, filename)
+        if delta_base(path):
+            return path, signature_path(downloads_dir, user, filename)
+    return None
+
+
+def send_blob(src_path, dest_users, downloads_dir, cache_path=None, chunk_size=BLOB_CHUNK, compression="off",
+              delta=False):
+    """
+    Envoie src_path à tous les dest_users en passant par le stockage par
+    contenu. Retourne (nom_du_fichier, {utilisateur: chemin}, statistiques).
+    """
+    if not os.path.isfile(src_path):
+        raise FileNotFoundError(f"Le fichier {src_path} n'existe pas.")
+    start = time.perf_counter()
+    filename = os.path.basename(src_path)
+    st = os.stat(src_path)
+
+    digest = cached_digest(cache_path, src_path, st)
+    blob = find_blob(downloads_dir, digest) if digest is not None else None
+    if blob is not None and not verify_blob(blob, digest):
+        blob = None
+    signature = None
+    if blob is not None:
+        uploaded, method = 0, "dedup"
+    else:
+        base = _delta_base(downloads_dir, dest_users, filename) if delta else None
+        codec = None if base is not None else choose_codec(src_path, compression)
+        digest, blob, uploaded, signature = upload(src_path, downloads_dir, chunk_size, codec, base)
+        method = ("delta" if base is not None else "upload") if uploaded else "dedup"
+        remember_digest(cache_path, src_path, st, digest)
+    if not uploaded:
+        BLOB_DEDUP.inc()
+    entry = filename + COMPRESSED_SUFFIX if blob.endswith(COMPRESSED_SUFFIX) else filename
+
+    blob_signature = None
+    if delta and entry == filename and st.st_size >= DELTA_MIN_SIZE:
+        # signature de la version reçue, pour le prochain envoi : une par
+        # blob (le blob n'est relu que s'il n'en a pas encore)
+        blob_signature = blob + SIGNATURE_SUFFIX
+        if signature is not None:
+            save_signature(blob, blob_signature, signature)
+        else:
+            load_signature(blob, blob_signature)
+
+    paths, links = {}, set()
+    for user in dest_users:
+        user_dir = os.path.join(downloads_dir, user)
+        make_dir(user_dir)
+        paths[user] = os.path.join(user_dir, entry)
+        links.add(link_blob(blob, paths[user]))
+        if blob_signature is not None:
+            save_signature_ref(paths[user], signature_path(downloads_dir, user, filename), blob_signature)
+
+    stats = transfer_stats(st.st_size * len(paths), time.perf_counter() - start,
+                           method + "+" + "+".join(sorted(links)))
+    stats.update(written_bytes=uploaded, digest=digest, recipients=len(paths))
+    return filename, paths, stats
+
+
+# ---------------------- Ramasse-miettes ----------------------
+
+def gc(downloads_dir, grace_s=3600):
+    """
+    Supprime les blobs qui n'ont plus aucun lien (st_nlink == 1) depuis
+    plus de grace_s secondes (avec leur signature), les écritures
+    temporaires abandonnées et les signatures (delta.py) de fichiers qui
+    n'existent plus.
+    Les destinataires servis par clone ou copie ne retiennent pas le blob.
+    Retourne (blobs_supprimés, octets_libérés).
+    """
+    removed, freed = 0, 0
+    root = blobs_dir(downloads_dir)
+    now = time.time()
+    try:
+        folders = list(os.scandir(root))
+    except OSError:
+        return 0, 0
+    for folder in folders:
+        if not folder.is_dir():
+            continue
+        try:
+            entries = list(os.scandir(folder.path))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.endswith(SIGNATURE_SUFFIX) and folder.name != "tmp":
+                if not os.path.exists(entry.path[:-len(SIGNATURE_SUFFIX)]):
+                    _remove_quietly(entry.path)
+                continue
+            try:
+                st = os.stat(entry.path)   # DirEntry.stat() : st_nlink à 0 sous Windows
+            except OSError:
+                continue
+            unused = st.st_nlink <= 1 or folder.name == "tmp"
+            if unused and now - st.st_mtime > grace_s and now - st.st_ctime > grace_s:
+                try:
+                    os.chmod(entry.path, 0o644)   # Windows : lecture seule empêche la suppression
+                    os.remove(entry.path)
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        metrics.log.warning("Blob non supprimé %s : %s", entry.path, e)
+                    continue
+                removed += 1
+                freed += st.st_size
+                _remove_quietly(entry.path + SIGNATURE_SUFFIX)
+    _gc_signatures(downloads_dir)
+    return removed, freed
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _gc_signatures(downloads_dir):
+    root = os.path.join(downloads_dir, SIGNATURES_DIR)
+    try:
+        users = [entry.name for entry in os.scandir(root) if entry.is_dir()]
+    except OSError:
+        return
+    for user in users:
+        try:
+            names = os.listdir(os.path.join(root, user))
+        except OSError:
+            continue
+        for name in names:
+            target = os.path.join(downloads_dir, user, name[:-len(SIGNATURE_SUFFIX)])
+            if name.endswith(SIGNATURE_SUFFIX) and not os.path.exists(target):
+                try:
+                    os.remove(os.path.join(root, user, name))
+                except OSError:
+                    pass
+
+
+def main():
+    from config import get_config
+
+    if len(sys.argv) < 2 or sys.argv[1] != "gc":
+        print("Usage : python blobs.py gc [heures]")
+        return 1
+    config = get_config()
+    hours = float(sys.argv[2]) if len(sys.argv) > 2 else float(config["blob_gc_grace_h"])
+    removed, freed = gc(config["downloads_dir"], hours * 3600)
+    print(f"[OK] {removed} blob(s) supprimé(s), {freed / 1e6:.1f} Mo libérés")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Salons et messages privés : chaque salon a son propre journal et chaque
+# utilisateur une boîte de réception, pour qu'un client ne lise que ce à
+# quoi il est abonné.
+#   general   -> shared_file (le journal historique)
+#   dev       -> <dossier du journal>/channels/dev.log
+#   @bob      -> <dossier du journal>/inbox/bob.log (messages privés de bob)
+#   !bob      -> <dossier du journal>/control/bob.log (demandes adressées à
+#                bob : @exec, [FILE] ; lu par ses clients, jamais affiché)
+# Un nom d'utilisateur quelconque ("Élodie", "jean dupont") reste tel quel
+# dans les messages ; ses journaux utilisent user_slug() ("lodie-1a2b3c4d").
+import os
+import re
+import time
+import hashlib
+from collections import OrderedDict
+
+from writer import make_writer
+from journal import writer_path
+
+GENERAL = "general"
+CHANNELS_DIR = "channels"
+INBOX_DIR = "inbox"
+CONTROL_DIR = "control"
+PRESENCE = ".presence"   # battements de cœur (presence.py) : hors des noms de salon, jamais affiché
+NAME_RE = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9_.-]{0,63}$")
+TRANSIENT_MAX = 8        # journaux de boîtes / contrôle gardés ouverts au plus
+TRANSIENT_IDLE = 30.0    # secondes sans écriture avant fermeture
+
+
+def channel_name(text):
+    """
+    Normalise un nom de salon ("#dev" ou "dev" -> "dev").
+    Lève ValueError si le nom n'est pas valide.
+    """
+    name = text.strip().lstrip("#")
+    if not NAME_RE.match(name):
+        raise ValueError(f"Nom de salon invalide : {text}")
+    return name
+
+
+def user_slug(username):
+    """
+    Nom de fichier sûr pour username : lui-même s'il est déjà valide,
+    sinon ses caractères autorisés suivis d'une empreinte du nom complet.
+    Lève ValueError si le nom est vide.
+    """
+    if not username or not username.strip():
+        raise ValueError("Nom d'utilisateur vide.")
+    if NAME_RE.match(username):
+        return username
+    digest = hashlib.sha1(username.encode("utf-8")).hexdigest()[:8]
+    kept = re.sub(r"[^A-Za-z0-9_.-]+", "-", username).strip("-.")[:48]
+    return f"{kept}-{digest}" if kept else f"u-{digest}"
+
+
+def inbox(username):
+    """
+    Salon de la boîte de réception de username.
+    """
+    return "@" + user_slug(username)
+
+
+def is_inbox(channel):
+    return channel.startswith("@")
+
+
+def control(username):
+    """
+    Journal de contrôle de username : copie des messages qui lui demandent
+    d'agir, pour ne pas chercher ces demandes dans tout le trafic.
+    """
+    return "!" + user_slug(username)
+
+
+def is_control(channel):
+    return channel.startswith("!")
+
+
+def valid_channel(channel):
+    if channel == PRESENCE:
+        return True
+    return bool(NAME_RE.match(channel[1:] if is_inbox(channel) or is_control(channel) else channel))
+
+
+def channel_path(shared_file, channel):
+    """
+    Journal du salon channel.
+    """
+    if channel == GENERAL:
+        return shared_file
+    folder = os.path.dirname(shared_file)
+    ext = os.path.splitext(shared_file)[1] or ".log"
+    if is_inbox(channel):
+        return os.path.join(folder, INBOX_DIR, channel[1:] + ext)
+    if is_control(channel):
+        return os.path.join(folder, CONTROL_DIR, channel[1:] + ext)
+    return os.path.join(folder, CHANNELS_DIR, channel + ext)
+
+
+def channel_dirs(shared_file):
+    """
+    Dossiers qui contiennent les journaux des salons.
+    """
+    folder = os.path.dirname(os.path.abspath(shared_file))
+    return [folder, os.path.join(folder, CHANNELS_DIR), os.path.join(folder, INBOX_DIR),
+            os.path.join(folder, CONTROL_DIR)]
+
+
+def channel_label(channel):
+    """
+    Préfixe d'affichage des lignes du salon ("" pour general et les
+    messages privés, qui portent déjà [DM <destinataire>]).
+    """
+    if channel == GENERAL or is_inbox(channel):
+        return ""
+    return f"[#{channel}] "
+
+
+def dm_text(dest_user, text):
+    return f"[DM {dest_user}] {text}"
+
+
+class ChannelWriter:
+    """
+    Un écrivain (writer.LogWriter) par salon, ouvert à la première
+    écriture dans ce salon (par salon et par utilisateur en mode
+    "journal_mode": "per_writer", voir journal.py).
+    Les boîtes de réception et journaux de contrôle (un par destinataire)
+    ne restent pas tous ouverts : au-delà de TRANSIENT_MAX, ou après
+    TRANSIENT_IDLE secondes sans écriture, leur écrivain est fermé.
+    """
+
+    def __init__(self, shared_file, config):
+        self.shared_file = shared_file
+        self.config = config
+        self._writers = {}
+        self._transient = OrderedDict()   # (salon, utilisateur) -> dernière écriture
+
+    def post(self, username, text, channel=GENERAL, timestamp=None):
+        key = (channel, username)
+        writer = self._writers.get(key)
+        if writer is None:
+            path = writer_path(channel_path(self.shared_file, channel), self.config, username)
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            writer = self._writers[key] = make_writer(path, self.config)
+        if is_inbox(channel) or is_control(channel):
+            self._transient[key] = time.monotonic()
+            self._transient.move_to_end(key)
+            self._prune(key)
+        writer.post(username, text, timestamp)
+
+    def _prune(self, keep):
+        now = time.monotonic()
+        for key, used in list(self._transient.items()):
+            if key != keep and (len(self._transient) > TRANSIENT_MAX or now - used > TRANSIENT_IDLE):
+                del self._transient[key]
+                self._writers.pop(key).close()   # close() écrit d'abord le lot en attente
+
+    def flush(self):
+        for writer in self._writers.values():
+            writer.flush()
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+        self._transient.clear()
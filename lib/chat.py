@@ -1,69 +1,173 @@
 # KALANGOSO KANGELA - RAYANE BADKOUF
+# Client en ligne de commande : envoi et réception dans le même processus
+# (moteur client.ChatClient).
+import asyncio
+from collections import deque
+
 from config import get_config
-from format import format_msg
-from file_transfer import send_file
+from file_transfer import format_stats
+from search import format_hit
+from presence import format_roster
+from client import (
+    ChatClient, ainput, EVENT_LINES, EVENT_EXEC, EVENT_FILE, EVENT_FILE_REMOVED, EVENT_STATUS,
+)
+
+YES = ("y", "yes", "o", "oui")
+NO = ("n", "no", "non")
+
+
+async def show_events(client, pending_exec):
+    """
+    Affiche les messages reçus ; les demandes @exec attendent la réponse
+    de l'utilisateur (y ou n, les autres lignes sont envoyées normalement).
+    """
+    async for event in client.events():
+        if event.kind == EVENT_LINES:
+            for _, line in event.data:
+                print(line)
+        elif event.kind == EVENT_EXEC:
+            msg = event.data
+            pending_exec.append(msg)
+            print(f"[EXEC] {msg.sender} veut exécuter : {msg.arg}")
+            print("Accepter ? (y/n) : ", end="", flush=True)
+        elif event.kind == EVENT_FILE:
+            print(f"[INFO] Nouveau fichier reçu : {event.data}")
+        elif event.kind == EVENT_FILE_REMOVED:
+            print(f"[INFO] Fichier supprimé : {event.data}")
+        elif event.kind == EVENT_STATUS:
+            print(f"[INFO] {event.data}")
+
+
+async def main():
+    # Charger la configuration
+    config = get_config()
+
+    # Demander le nom d'utilisateur
+    username = ((await ainput("Entrez votre nom d'utilisateur : ")) or "").strip()
+    if not username:
+        return
+
+    # Message de connexion envoyé par start()
+    client = ChatClient(config, username, "chat")
+    await client.start()
+    pending_exec = deque()
+    receiver = asyncio.create_task(show_events(client, pending_exec))
 
-# Charger la configuration
-config = get_config()
-shared_file = config["shared_file"]
-downloads_dir = config["downloads_dir"]
+    print("Vous pouvez maintenant écrire des messages.")
+    print("Commandes : @exit, @send <fichier> <user> [user...], @exec <user> <commande>,")
+    print("            @join #salon, @leave #salon, @dm <user> <message>, @who,")
+    print("            @search <mots> [from:<user>] [kind:file|exec|result|join|leave] [in:#salon]")
 
-# Demander le nom d'utilisateur
-username = input("Entrez votre nom d'utilisateur : ").strip()
+    # Boucle principale
+    try:
+        while True:
+            text = await ainput()
 
-# Message de connexion
-with open(shared_file, 'a', encoding='utf-8') as f:
-    f.write(format_msg(username, f"{username} joined the chat"))
+            # Quitter
+            if text is None or text.strip() == "@exit":
+                break
 
-print("Vous pouvez maintenant écrire des messages.")
-print("Commandes : @exit, @send <fichier> <user>, @exec <user> <commande>")
+            # Réponse à une demande @exec : seulement y ou n, toute autre
+            # ligne est traitée normalement et la question reposée
+            if pending_exec:
+                answer = text.strip().lower()
+                if answer in YES or answer in NO:
+                    msg = pending_exec.popleft()
+                    try:
+                        await client.answer_exec(msg, answer in YES)
+                    except OSError as e:
+                        print(f"[ERREUR] Réponse non envoyée : {e}")
+                    if pending_exec:
+                        print(f"[EXEC] {pending_exec[0].sender} veut exécuter : {pending_exec[0].arg}")
+                        print("Accepter ? (y/n) : ", end="", flush=True)
+                    continue
 
-# Boucle principale
-while True:
-    text = input()
+            # Envoi de fichier
+            if text.startswith("@send "):
+                parts = text.split()
+                if len(parts) < 3:
+                    print("[ERREUR] Format : @send <fichier> <destinataire> [destinataire...]")
+                    continue
 
-    # Quitter
-    if text.strip() == "@exit":
-        with open(shared_file, 'a', encoding='utf-8') as f:
-            f.write(format_msg(username, f"{username} left the chat"))
-        break
+                filepath = parts[1]
+                dest_users = [name for part in parts[2:] for name in part.split(",") if name]
 
-    # Envoi de fichier
-    elif text.startswith("@send "):
-        parts = text.split(maxsplit=2)
-        if len(parts) < 3:
-            print("[ERREUR] Format : @send <fichier> <destinataire>")
-            continue
+                try:
+                    _, stats = await client.send_file(filepath, dest_users)
+                    print(f"[OK] Fichier envoyé vers {', '.join(dest_users)} : {format_stats(stats)}")
+                except Exception as e:
+                    print(f"[ERREUR] Impossible d'envoyer le fichier : {e}")
 
-        filepath = parts[1]
-        dest_user = parts[2]
+            # Salons : rejoindre (devient le salon courant) ou quitter
+            elif text.startswith("@join ") or text.startswith("@leave "):
+                command, _, name = text.partition(" ")
+                try:
+                    if command == "@join":
+                        await client.join(name)
+                    else:
+                        await client.leave(name)
+                except (ValueError, OSError) as e:
+                    print(f"[ERREUR] {e}")
 
+            # Message privé
+            elif text.startswith("@dm "):
+                parts = text.split(maxsplit=2)
+                if len(parts) < 3:
+                    print("[ERREUR] Format : @dm <user> <message>")
+                    continue
+                try:
+                    await client.send_dm(parts[1], parts[2])
+                except (ValueError, OSError) as e:
+                    print(f"[ERREUR] {e}")
+
+            # Qui est connecté
+            elif text.strip() == "@who":
+                print(format_roster(client.who()))
+
+            # Recherche dans l'historique
+            elif text.startswith("@search "):
+                try:
+                    hits = await client.search(text[8:])
+                except ValueError as e:
+                    print(f"[ERREUR] {e}")
+                    continue
+                for hit in reversed(hits):
+                    print(f"  {format_hit(hit)}")
+                print(f"[INFO] {len(hits)} résultat(s)")
+
+            # Commande @exec
+            elif text.startswith("@exec "):
+                parts = text.split(maxsplit=2)
+                if len(parts) < 3:
+                    print("[ERREUR] Format : @exec <user> <commande>")
+                    continue
+
+                try:
+                    await client.request_exec(parts[1], parts[2])
+                    print(f"[OK] Demande d'exécution envoyée à {parts[1]}")
+                except OSError as e:
+                    print(f"[ERREUR] Demande non envoyée : {e}")
+
+            # Message normal
+            else:
+                try:
+                    await client.send(text)
+                except OSError as e:
+                    print(f"[ERREUR] Message non envoyé : {e}")
+
+            if pending_exec:
+                print(f"[INFO] Demande @exec de {pending_exec[0].sender} en attente : répondez y ou n")
+    finally:
+        # Message de départ envoyé par close()
         try:
-            filename, saved_path = send_file(filepath, dest_user, downloads_dir)
-            with open(shared_file, 'a', encoding='utf-8') as f:
-                f.write(format_msg(username, f"[FILE] Sent {filename} to {dest_user}"))
-            print(f"[OK] Fichier envoyé vers {dest_user}")
-
-        except Exception as e:
-            print(f"[ERREUR] Impossible d'envoyer le fichier : {e}")
-
-    # Commande @exec
-    elif text.startswith("@exec "):
-        parts = text.split(maxsplit=2)
-        if len(parts) < 3:
-            print("[ERREUR] Format : @exec <user> <commande>")
-            continue
-        
-        dest_user = parts[1]
-        command = parts[2]
-
-        with open(shared_file, 'a', encoding='utf-8') as f:
-            f.write(format_msg(username, f"@exec {dest_user} {command}"))
-
-        print(f"[OK] Demande d'exécution envoyée à {dest_user}")
-
-
-    # Message normal
-    else:
-        with open(shared_file, 'a', encoding='utf-8') as f:
-            f.write(format_msg(username, text))
\ No newline at end of file
+            await client.close()
+        except OSError as e:
+            print(f"[ERREUR] Message de départ non envoyé : {e}")
+        await receiver
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -3,17 +3,22 @@
 # KALANGOSO KANGELA - RAYANE BADKOUF
 import os
 import sys
-import json
-import re
-import time
-import subprocess
-from datetime import datetime
+import asyncio
+import threading
+from collections import deque
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QTextEdit, QLineEdit, QPushButton, QMessageBox, QLabel, QInputDialog, QFileDialog
+    QListView, QListWidget, QLineEdit, QPushButton, QMessageBox, QLabel, QInputDialog, QFileDialog
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, pyqtSlot
+from PyQt6.QtCore import Qt, QThread, QTimer, QAbstractListModel, QModelIndex, pyqtSignal, pyqtSlot
+
+from config import get_config
+from journal import read_history
+from file_transfer import format_stats
+from search import format_hit
+from presence import ONLINE
+from client import ChatClient, EVENT_LINES, EVENT_EXEC, EVENT_FILE, EVENT_STATUS, EVENT_PRESENCE
 
 # -------------------------
 # Config loader (JSON)
@@ -21,167 +26,200 @@ from PyQt6.QtCore import Qt, QThread, pyqtSignal, pyqtSlot
 def load_config(path="chat.json"):
     if not os.path.isfile(path):
         raise FileNotFoundError(f"Configuration file not found: {path}")
-    with open(path, "r", encoding="utf-8") as f:
-        cfg = json.load(f)
-    cfg.setdefault("shared_file", "shared_chat.log")
-    cfg.setdefault("downloads_dir", "file")
-    cfg.setdefault("poll_interval", 0.5)
+    # same defaults as the CLI clients, plus the GUI-only keys
+    cfg = get_config(path)
+    cfg.setdefault("max_rows", 5000)
+    cfg.setdefault("history_page", 200)
+    cfg.setdefault("ui_frame_ms", 33)
     return cfg
 
 # -------------------------
-# Utilitaires (format, dirs)
+# MessageBuffer : lignes lues en attente d'affichage
 # -------------------------
-def now_timestamp():
-    return datetime.now().isoformat(sep=' ', timespec='microseconds')
+class MessageBuffer:
+    """
+    Filled by the ClientThread, drained by the UI at most once per frame.
+    Holds at most capacity rows: when the UI falls behind, the oldest are
+    dropped (they stay on disk, the history pager can still reach them).
+    """
 
-def format_msg(username, text):
-    # use simple dash '-' for robustness
-    return f"{now_timestamp()} - {username} : {text}\n"
+    def __init__(self, capacity=5000):
+        self._rows = deque(maxlen=capacity)
+        self._dropped = 0
+        self._lock = threading.Lock()
 
-def ensure_dir(path):
-    os.makedirs(path, exist_ok=True)
+    def push(self, rows):
+        with self._lock:
+            overflow = len(self._rows) + len(rows) - self._rows.maxlen
+            if overflow > 0:
+                self._dropped += overflow
+            self._rows.extend(rows)
+
+    def drain(self):
+        """
+        Returns (rows, dropped) and empties the buffer.
+        """
+        with self._lock:
+            if not self._rows and not self._dropped:
+                return [], 0
+            rows, dropped = list(self._rows), self._dropped
+            self._rows.clear()
+            self._dropped = 0
+        return rows, dropped
 
 # -------------------------
-# File transfer utilities (copy in chunks)
+# ClientThread : moteur client asyncio (client.ChatClient) dans un seul thread
 # -------------------------
-CHUNK_SIZE = 8192
-
-def send_file_binary(src_path, dest_user, downloads_dir):
+class ClientThread(QThread):
     """
-    Copy src_path into downloads_dir/<dest_user>/ keeping filename.
-    Returns filename, dest_path
+    Runs the shared asyncio client engine. Incoming lines go to the
+    MessageBuffer, other events become signals; the UI runs the engine's
+    coroutines (send, send_file, answer_exec...) through submit().
     """
-    if not os.path.isfile(src_path):
-        raise FileNotFoundError(f"File not found: {src_path}")
-
-    filename = os.path.basename(src_path)
-    user_dir = os.path.join(downloads_dir, dest_user)
-    ensure_dir(user_dir)
-    dest_path = os.path.join(user_dir, filename)
-
-    with open(src_path, "rb") as src, open(dest_path, "wb") as dst:
-        while True:
-            chunk = src.read(CHUNK_SIZE)
-            if not chunk:
-                break
-            dst.write(chunk)
-            dst.flush()
-
-    return filename, dest_path
-
-def list_user_files(username, downloads_dir):
-    user_dir = os.path.join(downloads_dir, username)
-    if not os.path.isdir(user_dir):
-        return []
-    return os.listdir(user_dir)
-
-def check_new_files(username, downloads_dir, known_files):
-    current = set(list_user_files(username, downloads_dir))
-    new = current - set(known_files)
-    return list(new), list(current)
-
-# -------------------------
-# ReaderThread : lit shared_file, émet new_message et exec_request
-# -------------------------
-class ReaderThread(QThread):
-    new_message = pyqtSignal(str)          # line text
-    exec_request = pyqtSignal(str, str)    # sender, command
+    exec_request = pyqtSignal(object)      # message.Message (@exec for us)
     new_file = pyqtSignal(str)             # filename
+    notice = pyqtSignal(str)               # text to show in the chat view
+    search_results = pyqtSignal(list)      # search.Hit list (most recent first)
+    presence = pyqtSignal(list)            # roster (see presence.Roster.roster)
 
-    def __init__(self, shared_file, downloads_dir, current_user, poll_interval=0.5):
+    def __init__(self, cfg, username, buffer):
         super().__init__()
-        self.shared_file = shared_file
-        self.downloads_dir = downloads_dir
-        self.current_user = current_user
-        self.poll_interval = float(poll_interval)
-        self._running = True
+        self.client = ChatClient(cfg, username, "gui")
+        self.buffer = buffer
+        self.loop = None
+        self._ready = threading.Event()
 
-    def stop(self):
-        self._running = False
+    def run(self):
+        asyncio.run(self._main())
 
-    def parse_line_for_exec(self, line):
+    async def _main(self):
+        try:
+            await self.client.start()
+            self.loop = asyncio.get_running_loop()
+        except Exception as e:
+            self.notice.emit(f"[ERROR] Démarrage du client: {e}")
+            await self.client.close()
+            return
+        finally:
+            self._ready.set()
+        async for event in self.client.events():
+            if event.kind == EVENT_LINES:
+                self.buffer.push(event.data)   # no signal per batch: the UI polls each frame
+            elif event.kind == EVENT_EXEC:
+                self.exec_request.emit(event.data)   # don't execute here; ask GUI
+            elif event.kind == EVENT_FILE:
+                self.new_file.emit(event.data)
+            elif event.kind == EVENT_STATUS:
+                self.buffer.push([(None, f"[SYSTEM] {event.data}")])
+            elif event.kind == EVENT_PRESENCE:
+                self.presence.emit(event.data)
+
+    def submit(self, coro, error_prefix="[ERROR]", done=None):
         """
-        Robust parsing: lines form:
-        YYYY-MM-DD hh:mm:ss.micro - sender : message
-        Accepts '-' or '–' in separator.
+        Schedule coro on the engine loop. done(result) is called from the
+        engine thread (only emit signals there); errors go to notice.
         """
-        pattern = r"^(\d{4}-\d{2}-\d{2} .*?) ?[–-] (.*?) : (.*)$"
-        m = re.match(pattern, line)
-        if not m:
-            return
-        sender = m.group(2).strip()
-        content = m.group(3).strip()
-
-        # detect @exec
-        if content.startswith("@exec"):
-            parts = content.split(maxsplit=2)
-            if len(parts) >= 3:
-                _, dest, cmd = parts
-                if dest == self.current_user:
-                    # don't execute here; ask GUI
-                    self.exec_request.emit(sender, cmd)
+        self._ready.wait(5)
+        if self.loop is None or self.loop.is_closed():
+            coro.close()
+            self.notice.emit(f"{error_prefix}: client non démarré")
+            return None
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+        def finished(f):
+            if f.cancelled():
+                return
+            try:
+                result = f.result()
+            except Exception as e:
+                self.notice.emit(f"{error_prefix}: {e}")
+                return
+            if done:
+                done(result)
 
-    def run(self):
-        # ensure path exists
-        if not os.path.isfile(self.shared_file):
-            open(self.shared_file, "w", encoding="utf-8").close()
-        ensure_dir(self.downloads_dir)
-        ensure_dir(os.path.join(self.downloads_dir, self.current_user))
-
-        # open and tail
-        with open(self.shared_file, "r", encoding="utf-8") as f:
-            f.seek(0, os.SEEK_END)
-            # known files
-            known_files = list_user_files(self.current_user, self.downloads_dir)
-
-            while self._running:
-                line = f.readline()
-                if line:
-                    clean = line.rstrip("\n")
-                    self.new_message.emit(clean)
-                    # detect exec
-                    try:
-                        self.parse_line_for_exec(clean)
-                    except Exception:
-                        pass
-                # check files
-                try:
-                    new_files, known_files = check_new_files(self.current_user, self.downloads_dir, known_files)
-                    for fname in new_files:
-                        self.new_file.emit(fname)
-                except Exception:
-                    pass
-
-                time_ms = int(max(10, self.poll_interval * 1000))
-                self.msleep(time_ms)
+        future.add_done_callback(finished)
+        return future
+
+    def stop(self):
+        # close() writes "left", saves the cursor and ends events()
+        future = self.submit(self.client.close())
+        if future is not None:
+            try:
+                future.result(5)
+            except Exception:
+                pass
+        self.wait(2000)
 
 # -------------------------
-# ExecWorker : exécute commandes en arrière-plan
+# ChatModel : bounded list of chat rows for the QListView
 # -------------------------
-class ExecWorker(QThread):
-    exec_finished = pyqtSignal(str, bool, str)  # cmd, ok, message
-
-    def __init__(self):
-        super().__init__()
-        self._queue = []
-        self._running = True
-
-    def enqueue(self, cmd):
-        self._queue.append(cmd)
-        if not self.isRunning():
-            self.start()
-
-    def run(self):
-        while self._running and self._queue:
-            cmd = self._queue.pop(0)
-            try:
-                subprocess.Popen(cmd, shell=True)
-                self.exec_finished.emit(cmd, True, "")
-            except Exception as e:
-                self.exec_finished.emit(cmd, False, str(e))
+class ChatModel(QAbstractListModel):
+    """
+    Rows are (position, text): position is the (segment, offset) of the line
+    in the shared log, None for local lines. At most max_rows are kept; the
+    view only renders the visible ones.
+    """
 
-    def stop(self):
-        self._running = False
+    def __init__(self, max_rows=5000, parent=None):
+        super().__init__(parent)
+        self.max_rows = max_rows
+        self._rows = deque()
+        self.detached = False   # older history paged in, live tail no longer kept
+        self.missed = 0         # live rows skipped while detached
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and index.isValid():
+            # one line per row (uniform item sizes)
+            return self._rows[index.row()][1].replace("\n", " \u21b5 ")
+        return None
+
+    def oldest_position(self):
+        for position, _ in self._rows:
+            if position is not None:
+                return position
+        return None
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        if self.detached:
+            self.missed += len(rows)
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+        excess = len(self._rows) - self.max_rows
+        if excess > 0:
+            self.beginRemoveRows(QModelIndex(), 0, excess - 1)
+            for _ in range(excess):
+                self._rows.popleft()
+            self.endRemoveRows()
+
+    def prepend_rows(self, rows):
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+        self._rows.extendleft(reversed(rows))
+        self.endInsertRows()
+        excess = len(self._rows) - self.max_rows
+        if excess > 0:
+            count = len(self._rows)
+            self.beginRemoveRows(QModelIndex(), count - excess, count - 1)
+            for _ in range(excess):
+                self._rows.pop()
+            self.endRemoveRows()
+            self.detached = True
+
+    def reset_rows(self, rows):
+        self.beginResetModel()
+        self._rows = deque(rows[-self.max_rows:])
+        self.detached = False
+        self.missed = 0
+        self.endResetModel()
 
 # -------------------------
 # Main Window (UI)
@@ -192,7 +230,6 @@ class ChatWindow(QMainWindow):
         self.cfg = cfg
         self.shared_file = cfg["shared_file"]
         self.downloads_dir = cfg["downloads_dir"]
-        self.poll_interval = cfg.get("poll_interval", 0.5)
         self.username = username
 
         self.setWindowTitle("Messagerie PyQt6")
@@ -204,11 +241,20 @@ class ChatWindow(QMainWindow):
         root.setLayout(root_layout)
         self.setCentralWidget(root)
 
-        # left: chat view + input
+        # left: history button + chat view (model/view, bounded) + input
         left = QVBoxLayout()
-        self.chat_view = QTextEdit()
-        self.chat_view.setReadOnly(True)
-        self.chat_view.setPlaceholderText("Aucun message pour le moment")
+        self.history_page = int(cfg["history_page"])
+        history_btn = QPushButton("\u25b2 Historique")
+        history_btn.clicked.connect(self.load_older)
+        left.addWidget(history_btn)
+
+        self.chat_model = ChatModel(int(cfg["max_rows"]), self)
+        self.chat_view = QListView()
+        self.chat_view.setModel(self.chat_model)
+        self.chat_view.setUniformItemSizes(True)
+        self.chat_view.setWordWrap(False)
+        self.chat_view.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self.chat_view.verticalScrollBar().valueChanged.connect(self.on_scroll)
         left.addWidget(self.chat_view)
 
         input_layout = QHBoxLayout()
@@ -227,6 +273,12 @@ class ChatWindow(QMainWindow):
         title.setAlignment(Qt.AlignmentFlag.AlignCenter)
         right.addWidget(title)
 
+        # who is online (heartbeats and join/leave, see presence.py)
+        right.addWidget(QLabel("Utilisateurs"))
+        self.roster_list = QListWidget()
+        self.roster_list.setMaximumHeight(160)
+        right.addWidget(self.roster_list)
+
         btn_sendfile = QPushButton("@send (Fichier)")
         btn_sendfile.clicked.connect(self.on_send_file_clicked)
         right.addWidget(btn_sendfile)
@@ -235,40 +287,57 @@ class ChatWindow(QMainWindow):
         btn_exec.clicked.connect(self.on_exec_clicked)
         right.addWidget(btn_exec)
 
+        btn_join = QPushButton("@join (Salon)")
+        btn_join.clicked.connect(self.on_join_clicked)
+        right.addWidget(btn_join)
+
+        btn_leave = QPushButton("@leave (Quitter le salon)")
+        btn_leave.clicked.connect(self.on_leave_clicked)
+        right.addWidget(btn_leave)
+
+        btn_dm = QPushButton("@dm (Message privé)")
+        btn_dm.clicked.connect(self.on_dm_clicked)
+        right.addWidget(btn_dm)
+
+        # search over the whole history (local inverted index, see search.py)
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Rechercher (from:, kind:, in:#)")
+        self.search_box.returnPressed.connect(self.on_search)
+        right.addWidget(self.search_box)
+        self.search_list = QListWidget()
+        right.addWidget(self.search_list, 1)
+
         right.addStretch()
 
         root_layout.addLayout(left, 4)
         root_layout.addLayout(right, 1)
 
-        # workers
-        self.reader = ReaderThread(self.shared_file, self.downloads_dir, self.username, poll_interval=self.poll_interval)
-        self.reader.new_message.connect(self.append_message)
-        self.reader.exec_request.connect(self.on_exec_request_received)
-        self.reader.new_file.connect(self.on_new_file_received)
-        self.reader.start()
+        # client engine (reading, writing, received files, @exec) in one worker thread
+        self.buffer = MessageBuffer(int(cfg["max_rows"]))
+        self.client_thread = ClientThread(cfg, self.username, self.buffer)
+        self.client = self.client_thread.client
+        self.client_thread.exec_request.connect(self.on_exec_request_received)
+        self.client_thread.new_file.connect(self.on_new_file_received)
+        self.client_thread.notice.connect(self.append_message)
+        self.client_thread.search_results.connect(self.show_search_results)
+        self.client_thread.presence.connect(self.show_roster)
+        self.client_thread.start()   # start() writes the joined message
+
+        # frame timer: incoming lines are rendered in one insert per frame
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setInterval(int(cfg["ui_frame_ms"]))
+        self.frame_timer.timeout.connect(self.flush_buffer)
+        self.frame_timer.start()
 
-        self.exec_worker = ExecWorker()
-        self.exec_worker.exec_finished.connect(self.on_exec_finished)
-
-        # write joined message
         self.append_message(f"[SYSTEM] {self.username} joined the chat")
-        self._write_shared(format_msg(self.username, f"{self.username} joined the chat"))
 
     def closeEvent(self, event):
-        # stop threads and log left
+        # stop the engine (writes left, saves the cursor)
         try:
-            if self.reader:
-                self.reader.stop()
-                self.reader.wait(1000)
+            self.frame_timer.stop()
+            self.client_thread.stop()
         except Exception:
             pass
-        try:
-            if self.exec_worker:
-                self.exec_worker.stop()
-        except Exception:
-            pass
-
-        self._write_shared(format_msg(self.username, f"{self.username} left the chat"))
         event.accept()
 
     # ----------------------------------------
@@ -279,13 +348,66 @@ class ChatWindow(QMainWindow):
         text = self.input_box.text().strip()
         if not text:
             return
-        self._write_shared(format_msg(self.username, text))
+        self._write_shared(text)
         self.input_box.clear()
 
     @pyqtSlot(str)
     def append_message(self, text):
-        self.chat_view.append(text)
-        self.chat_view.ensureCursorVisible()
+        self.append_messages([(None, text)])
+
+    @pyqtSlot()
+    def flush_buffer(self):
+        rows, dropped = self.buffer.drain()
+        if dropped:
+            rows.insert(0, (None, f"[SYSTEM] {dropped} messages non affichés (affichage en retard)"))
+        if rows:
+            self.append_messages(rows)
+
+    @pyqtSlot(list)
+    def append_messages(self, rows):
+        # batch of (position, text): one insert, one scroll
+        bar = self.chat_view.verticalScrollBar()
+        at_bottom = bar.value() >= bar.maximum()
+        self.chat_model.append_rows(rows)
+        if self.chat_model.detached:
+            # live rows are not kept while older history is shown
+            if self.chat_model.missed:
+                self.statusBar().showMessage(
+                    f"{self.chat_model.missed} nouveaux messages (revenir en bas pour les voir)")
+        elif at_bottom:
+            self.chat_view.scrollToBottom()
+
+    # ----------------------------------------
+    # History paging (older lines read from disk on demand)
+    # ----------------------------------------
+    @pyqtSlot()
+    def load_older(self):
+        try:
+            rows = read_history(self.shared_file, self.cfg, self.chat_model.oldest_position(), self.history_page)
+        except Exception as e:
+            # status bar: a detached model drops appended rows
+            self.statusBar().showMessage(f"[ERROR] Lecture de l'historique: {e}")
+            return
+        if rows:
+            self.chat_model.prepend_rows(rows)
+            # keep the rows that were on screen in place
+            self.chat_view.verticalScrollBar().setValue(len(rows))
+
+    @pyqtSlot(int)
+    def on_scroll(self, value):
+        bar = self.chat_view.verticalScrollBar()
+        if value == bar.minimum() and bar.maximum() > bar.minimum():
+            self.load_older()
+        elif value == bar.maximum() and self.chat_model.detached:
+            # back at the bottom: reload the latest lines instead of the skipped live ones
+            try:
+                rows = read_history(self.shared_file, self.cfg, None, self.history_page)
+            except OSError as e:
+                self.statusBar().showMessage(f"[ERROR] Lecture de l'historique: {e}")
+                return
+            self.chat_model.reset_rows(rows)
+            self.statusBar().clearMessage()
+            self.chat_view.scrollToBottom()
 
     # ----------------------------------------
     # @send (file) flow
@@ -295,17 +417,17 @@ class ChatWindow(QMainWindow):
         path, _ = QFileDialog.getOpenFileName(self, "Choisir un fichier à envoyer")
         if not path:
             return
-        dest, ok = QInputDialog.getText(self, "Destinataire", "Nom du destinataire (username) :")
-        if not ok or not dest.strip():
+        dest, ok = QInputDialog.getText(self, "Destinataire",
+                                        "Destinataire(s) (username, séparés par des virgules) :")
+        # several recipients share one copy when blob_store is on
+        dests = [name.strip() for name in dest.replace(" ", ",").split(",") if name.strip()]
+        if not ok or not dests:
             return
-        dest = dest.strip()
-        try:
-            filename, dest_path = send_file_binary(path, dest, self.downloads_dir)
-            # notify in chat
-            self._write_shared(format_msg(self.username, f"[FILE] Sent {filename} to {dest}"))
-            self.append_message(f"[OK] Fichier envoyé: {filename} -> {dest}")
-        except Exception as e:
-            self.append_message(f"[ERROR] Envoi fichier: {e}")
+        # copy in the engine (not the UI thread), then notify in chat
+        self.client_thread.submit(
+            self.client.send_file(path, dests), "[ERROR] Envoi fichier",
+            lambda result: self.client_thread.notice.emit(
+                f"[OK] Fichier envoyé: {result[0]} -> {', '.join(dests)} ({format_stats(result[1])})"))
 
     # when a new file appears in Downloads/<user>
     @pyqtSlot(str)
@@ -324,48 +446,95 @@ class ChatWindow(QMainWindow):
             return
         dest = dest.strip()
         cmd = cmd.strip()
-        self._write_shared(format_msg(self.username, f"@exec {dest} {cmd}"))
+        self.client_thread.submit(self.client.request_exec(dest, cmd), "[ERROR] Envoi @exec")
         self.append_message(f"[SENT] @exec {dest} {cmd}")
 
     # ----------------------------------------
     # @exec flow (receiving)
     # ----------------------------------------
-    @pyqtSlot(str, str)
-    def on_exec_request_received(self, sender, command):
+    @pyqtSlot(object)
+    def on_exec_request_received(self, msg):
+        sender, command = msg.sender, msg.arg
         # show modal question (UI thread) - blocking is fine for modal dialog
         reply = QMessageBox.question(self, "Demande d'exécution",
                                      f"{sender} demande d'exécuter :\n\n{command}\n\nAccepter ?",
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-        if reply == QMessageBox.StandardButton.Yes:
-            self._write_shared(format_msg(self.username, f"[EXEC] Accepted command from {sender}: {command}"))
-            # run in worker
-            self.exec_worker.enqueue(command)
-            self.append_message(f"[EXEC] Accepted and executing: {command}")
+        accepted = reply == QMessageBox.StandardButton.Yes
+        # the engine writes the answer and queues the command; the result is posted to the chat
+        done = None
+        if accepted:
+            done = lambda ok: self.client_thread.notice.emit(self.exec_result(command, ok))
+        self.client_thread.submit(self.client.answer_exec(msg, accepted), f"[EXEC] Execution error: {command}", done)
+        if accepted:
+            self.append_message(f"[EXEC] Accepted: {command}")
         else:
-            self._write_shared(format_msg(self.username, f"[EXEC] Refused command from {sender}: {command}"))
             self.append_message(f"[EXEC] Refused: {command} (from {sender})")
 
-    @pyqtSlot(str, bool, str)
-    def on_exec_finished(self, cmd, ok, msg):
+    @staticmethod
+    def exec_result(cmd, ok):
         if ok:
-            self.append_message(f"[EXEC] Execution launched: {cmd}")
-        else:
-            self.append_message(f"[EXEC] Execution error: {cmd} ({msg})")
+            return f"[EXEC] Queued: {cmd}"
+        return f"[EXEC] Not queued (queue full): {cmd}"
 
     # ----------------------------------------
-    # Utility: write to shared file with fsync
+    # Search
     # ----------------------------------------
-    def _write_shared(self, content):
-        try:
-            with open(self.shared_file, "a", encoding="utf-8") as f:
-                f.write(content)
-                f.flush()
-                try:
-                    os.fsync(f.fileno())
-                except Exception:
-                    pass
-        except Exception as e:
-            self.append_message(f"[ERROR] Impossible d'écrire dans le fichier partagé: {e}")
+    def on_search(self):
+        query = self.search_box.text().strip()
+        if not query:
+            self.search_list.clear()
+            return
+        self.client_thread.submit(self.client.search(query), "[ERROR] Recherche",
+                                  self.client_thread.search_results.emit)
+
+    @pyqtSlot(list)
+    def show_search_results(self, hits):
+        self.search_list.clear()
+        if not hits:
+            self.search_list.addItem("Aucun résultat")
+            return
+        self.search_list.addItems([format_hit(hit) for hit in hits])
+
+    # ----------------------------------------
+    # Presence
+    # ----------------------------------------
+    @pyqtSlot(list)
+    def show_roster(self, roster):
+        self.roster_list.clear()
+        for name, status, _ in roster:
+            self.roster_list.addItem(f"● {name}" if status == ONLINE else f"○ {name}")
+
+    # ----------------------------------------
+    # Channels and direct messages
+    # ----------------------------------------
+    def on_join_clicked(self):
+        name, ok = QInputDialog.getText(self, "Salon", "Salon à rejoindre (#nom) :")
+        if not ok or not name.strip():
+            return
+        # the engine announces the new current channel
+        self.client_thread.submit(self.client.join(name.strip()), "[ERROR] @join")
+
+    def on_leave_clicked(self):
+        name, ok = QInputDialog.getText(self, "Salon", "Salon à quitter (#nom) :",
+                                        text=f"#{self.client.current}")
+        if not ok or not name.strip():
+            return
+        self.client_thread.submit(self.client.leave(name.strip()), "[ERROR] @leave")
+
+    def on_dm_clicked(self):
+        dest, ok1 = QInputDialog.getText(self, "Destinataire", "Destinataire (username) :")
+        if not ok1 or not dest.strip():
+            return
+        text, ok2 = QInputDialog.getText(self, "Message privé", f"Message pour {dest.strip()} :")
+        if not ok2 or not text.strip():
+            return
+        self.client_thread.submit(self.client.send_dm(dest.strip(), text.strip()), "[ERROR] @dm")
+
+    # ----------------------------------------
+    # Utility: send a chat message through the engine (file or relay transport)
+    # ----------------------------------------
+    def _write_shared(self, text):
+        self.client_thread.submit(self.client.send(text), "[ERROR] Impossible d'écrire dans le fichier partagé")
 
 
 # -------------------------
@@ -0,0 +1,501 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Moteur client commun à chat.py, read.py et chat_gui.py (asyncio).
+# Il possède la lecture (journal ou relais), l'écriture, le dossier de
+# réception et les demandes @exec ; les interfaces consomment
+# events() et appellent les coroutines send*, sans thread de sondage.
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import namedtuple
+
+import metrics
+from format import make_dir, make_writable, parse_timestamp
+from relay import connect
+from segments import line_timestamp
+from journal import make_tail, read_history, per_writer, journal_dir
+from channels import (
+    GENERAL, ChannelWriter, channel_name, channel_path, channel_dirs, channel_label,
+    inbox, control, valid_channel, dm_text, PRESENCE,
+)
+from cursor import ReaderCursor, cursor_path
+from downloads import DownloadsWatcher
+from notify import AsyncWatcher
+from message import parse_lines, KIND_EXEC
+from file_transfer import send_file, transfer_stats, PART_SUFFIX
+from compression import expand_file, COMPRESSED_SUFFIX
+from blobs import send_blob, hash_cache_path
+from commande import ExecEngine, format_result, write_result_file
+from search import Indexer
+from presence import Roster, HEARTBEAT, BOOTSTRAP
+
+Event = namedtuple("Event", "kind data")
+
+EVENT_LINES = "lines"          # data : liste de ((segment, position), ligne)
+EVENT_EXEC = "exec"            # data : Message @exec adressé à l'utilisateur
+EVENT_FILE = "file"            # data : nom d'un fichier reçu (complet)
+EVENT_FILE_REMOVED = "file_removed"
+EVENT_STATUS = "status"        # data : texte informatif
+EVENT_PRESENCE = "presence"    # data : liste des utilisateurs (presence.Roster.roster)
+
+DELIVERY_LAG = metrics.histogram("delivery_lag_seconds", "Horodatage du message -> remise à l'interface",
+                                 metrics.LAG_BUCKETS)
+
+
+async def ainput(prompt=""):
+    """
+    input() sans bloquer la boucle : stdin est lu dans un thread démon
+    (qui ne retient pas la sortie du programme). Retourne None en fin
+    d'entrée.
+    """
+    if prompt:
+        print(prompt, end="", flush=True)
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def deliver(line):
+        if not future.done():
+            future.set_result(line)
+
+    def read():
+        line = sys.stdin.readline()
+        try:
+            loop.call_soon_threadsafe(deliver, line)
+        except RuntimeError:
+            pass  # boucle fermée entre-temps
+
+    threading.Thread(target=read, name="stdin", daemon=True).start()
+    line = await future
+    return line.rstrip("\r\n") if line else None
+
+
+class ChatClient:
+    """
+    Client du chat pour username. start() ouvre le transport choisi dans
+    config ("file" ou "relay"), events() produit les Event reçus jusqu'à
+    close(). client_name distingue les points de reprise ("chat", "read",
+    "gui"). Avec announce, l'arrivée et le départ sont écrits dans le chat.
+    Le client lit general, sa boîte de réception et les salons rejoints
+    (join) ; send() écrit dans le salon courant. Les demandes qui lui
+    sont adressées (@exec, [FILE]) sont aussi copiées dans son journal de
+    contrôle (channels.control) : lui seul le lit, les autres salons ne
+    servent qu'à l'affichage.
+    """
+
+    def __init__(self, config, username, client_name="chat", announce=True):
+        self.config = config
+        self.username = username
+        self.client_name = client_name
+        self.announce = announce
+        self.shared_file = config["shared_file"]
+        self.downloads_dir = config["downloads_dir"]
+        self.user_dir = os.path.join(self.downloads_dir, username)
+        self.relay = config.get("transport", "file") == "relay"
+        self.cursor = ReaderCursor(cursor_path(config["state_dir"], username, client_name),
+                                   float(config["cursor_interval"]))
+        self.inbox = inbox(username)
+        self.control = control(username)
+        self.current = GENERAL
+        self.tails = {}      # salon -> LogTail / journal.MergedTail (transport "file") ou None (relais)
+        self.writer = None
+        self.link = None     # RelayClient (transport "relay")
+        self._link_up = True
+        self.downloads = None
+        self._expanded = set()   # fichiers .cz remplacés par leur contenu
+        self.roster = Roster(float(config["presence_timeout_s"]))
+        self._online = frozenset()
+        self._heartbeat = None
+        self.watcher = None
+        self.metrics = None  # metrics.MetricsExporter si "metrics_file"
+        self.indexer = None  # search.Indexer si "search_index"
+        self.exec = ExecEngine(self._exec_done, int(config["exec_max_jobs"]), float(config["exec_timeout_s"]),
+                               int(config["exec_max_queue"]), int(config["exec_output_kb"] * 1024))
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._closed = False
+
+    async def start(self):
+        config = self.config
+        self.metrics = metrics.setup(config, self.username, self.client_name)
+        make_dir(self.user_dir)
+        for folder in channel_dirs(self.shared_file)[1:]:
+            make_dir(folder)
+        self.watcher = AsyncWatcher(
+            channel_dirs(self.shared_file) + [self.user_dir],
+            config["watch"], float(config["min_interval"]), float(config["max_interval"]))
+        state = self.cursor.load() or {}
+        saved = state.get("channels")
+        if saved is None:
+            # ancien point de reprise : une seule position, celle de general
+            saved = {GENERAL: state} if "offset" in state else {}
+        channels = [GENERAL, self.inbox, self.control, PRESENCE]
+        channels += [c for c in map(channel_name, config["channels"]) if c not in channels]
+        channels += [c for c in saved if c not in channels and valid_channel(c)]
+        if self.relay:
+            # une seule connexion : messages poussés par le serveur et envoi
+            self.link = self.writer = connect(config, channels, on_message=self.watcher.wake)
+            self.tails = dict.fromkeys(channels)
+        else:
+            self.writer = ChannelWriter(self.shared_file, config)
+            for channel in channels:
+                self._watch(channel_path(self.shared_file, channel))
+                tail = make_tail(channel_path(self.shared_file, channel), config, saved.get(channel))
+                self.tails[channel] = tail
+                if channel in saved and channel == GENERAL:
+                    self._status(f"Reprise de la lecture ({tail.resume_status})")
+        if state.get("current") in self.tails:
+            self.current = state["current"]
+        if "presence" in state:
+            self.roster = Roster(self.roster.timeout, state["presence"])
+        elif not self.relay:
+            self._bootstrap_presence()
+        self.downloads = DownloadsWatcher(self.user_dir, state.get("known_files"),
+                                          float(config["download_settle_s"]), config["watch"])
+        if config["search_index"]:
+            self.indexer = Indexer(config, self.username)
+            self.indexer.start()
+        self._task = asyncio.create_task(self._run())
+        if self.announce:
+            await self.send(f"{self.username} joined the chat", GENERAL)
+            if float(config["presence_heartbeat_s"]) > 0:
+                self._heartbeat = asyncio.create_task(self._beat(float(config["presence_heartbeat_s"])))
+
+    async def events(self):
+        """
+        Itérateur asynchrone des Event, jusqu'à close().
+        """
+        while True:
+            event = await self._queue.get()
+            if event is None:
+                return
+            yield event
+
+    def _watch(self, path):
+        # journaux par écrivain : ils sont dans leur propre dossier
+        if per_writer(self.config):
+            folder = journal_dir(path)
+            make_dir(folder)
+            self.watcher.add_path(folder)
+
+    def _bootstrap_presence(self):
+        """
+        Sans point de reprise : présence d'après les derniers messages de
+        general et les derniers battements de cœur (pas tout l'historique).
+        """
+        lines = []
+        for channel in (GENERAL, PRESENCE):
+            try:
+                lines += [line for _, line in read_history(channel_path(self.shared_file, channel),
+                                                           self.config, None, BOOTSTRAP)]
+            except OSError:
+                pass
+        lines.sort(key=line_timestamp)
+        self.roster.observe_lines(lines)
+
+    async def _beat(self, interval):
+        while not self._closed:
+            await asyncio.sleep(interval)
+            try:
+                await self.send(HEARTBEAT, PRESENCE)
+            except OSError as e:
+                metrics.log.warning("Battement de cœur non écrit : %s", e)
+
+    def who(self):
+        """
+        Présence des utilisateurs (voir presence.Roster.roster).
+        """
+        return self.roster.roster()
+
+    def _status(self, text):
+        self._queue.put_nowait(Event(EVENT_STATUS, text))
+
+    def _read_channels(self):
+        """
+        Nouvelles lignes des salons suivis : liste de (salon, position, ligne).
+        """
+        if self.relay:
+            if self.link.connected != self._link_up:
+                self._link_up = self.link.connected
+                self._status("Relais de nouveau joignable" if self._link_up
+                             else "Connexion au relais perdue, reconnexion en cours...")
+            return [(channel, None, line) for channel, line in self.link.read_messages()]
+        found = []
+        for channel, tail in self.tails.items():
+            for position, line in tail.read_entries():
+                found.append((channel, position, line))
+        return found
+
+    async def _run(self):
+        put = self._queue.put_nowait
+        while not self._closed:
+            try:
+                found = self._read_channels()
+                for _, _, line in found:
+                    self.roster.observe(line)
+                requests = [line for channel, _, line in found if channel == self.control]
+                found = [item for item in found if item[0] != PRESENCE and item[0] != self.control]
+                # demandes lues dans le journal de contrôle seulement : rien
+                # à analyser dans le trafic du chat ([FILE] ne fait que
+                # réveiller la boucle, le fichier est vu par self.downloads)
+                for msg in parse_lines(requests, kinds={KIND_EXEC}):
+                    if msg.target == self.username:
+                        metrics.log.debug("@exec reçu de %s : %s", msg.sender, msg.arg)
+                        put(Event(EVENT_EXEC, msg))
+                if found:
+                    self.watcher.activity()
+                    if self.indexer is not None:
+                        self.indexer.wake()
+                    if metrics.exporting():
+                        self._observe_lag(found)
+                    # general garde ses positions (pagination de l'historique)
+                    put(Event(EVENT_LINES, [
+                        (position, line) if channel == GENERAL else (None, channel_label(channel) + line)
+                        for channel, position, line in found]))
+                changes = self.downloads.poll()
+                for name in changes.completed:
+                    if name.endswith(COMPRESSED_SUFFIX) and self.config["receive_expand"]:
+                        # le fichier décompressé sera signalé à son arrivée
+                        await self._expand(name)
+                    else:
+                        put(Event(EVENT_FILE, name))
+                for name in changes.removed:
+                    if name not in self._expanded:
+                        put(Event(EVENT_FILE_REMOVED, name))
+                    self._expanded.discard(name)
+                online = self.roster.online()
+                if online != self._online:
+                    self._online = online
+                    put(Event(EVENT_PRESENCE, self.roster.roster()))
+                self.cursor.save(self._state())
+            except OSError as e:
+                put(Event(EVENT_STATUS, f"Erreur de lecture : {e}"))
+            await self.watcher.wait(self._next_check())
+
+    async def _expand(self, name):
+        """
+        Remplace Downloads/<user>/<fichier>.cz par <fichier> décompressé
+        (écrit dans <fichier>.part puis renommé).
+        """
+        path = os.path.join(self.user_dir, name)
+        dest = path[:-len(COMPRESSED_SUFFIX)]
+        try:
+            await asyncio.to_thread(expand_file, path, dest + PART_SUFFIX)
+            make_writable(dest)
+            os.replace(dest + PART_SUFFIX, dest)
+            make_writable(path)   # lien vers un blob en lecture seule
+            os.remove(path)
+            self._expanded.add(name)
+        except (OSError, ValueError) as e:
+            self._status(f"Décompression de {name} impossible : {e}")
+            self._queue.put_nowait(Event(EVENT_FILE, name))
+
+    def _next_check(self):
+        """
+        Délai maximal avant le prochain tour sans événement : fichier en
+        cours d'arrivée (peut-être complet après settle), messages en
+        attente de fusion (journaux par écrivain).
+        """
+        delays = [self.downloads.settle] if self.downloads.pending() else []
+        expiry = self.roster.next_expiry()
+        if expiry is not None:
+            delays.append(expiry)
+        for tail in self.tails.values():
+            delay = getattr(tail, "pending_delay", None)
+            if delay is not None and delay() is not None:
+                delays.append(delay())
+        return min(delays) if delays else None
+
+    @staticmethod
+    def _observe_lag(found):
+        now = time.time()
+        for _, _, line in found:
+            sent = parse_timestamp(line_timestamp(line))
+            if sent is not None:
+                DELIVERY_LAG.observe(max(0.0, now - sent))
+
+    def _state(self):
+        channels = {channel: tail.state() if tail is not None else {}
+                    for channel, tail in self.tails.items()}
+        return {"channels": channels, "current": self.current,
+                "known_files": self.downloads.known_files(), "presence": self.roster.snapshot()}
+
+    async def join(self, name, history=20):
+        """
+        Rejoint le salon name ("#dev" ou "dev") et en fait le salon
+        courant ; les history derniers messages sont affichés.
+        """
+        channel = channel_name(name)
+        if channel not in self.tails:
+            if self.relay:
+                self.link.subscribe([channel])
+                self.tails[channel] = None
+            else:
+                path = channel_path(self.shared_file, channel)
+                self._watch(path)
+                tail = self.tails[channel] = make_tail(path, self.config)
+                recent = read_history(path, self.config, tail.position(), history)
+                if recent:
+                    label = channel_label(channel)
+                    self._queue.put_nowait(Event(EVENT_LINES, [(None, label + line) for _, line in recent]))
+        self.current = channel
+        self._status(f"Salon courant : #{channel}")
+        return channel
+
+    async def leave(self, name):
+        """
+        Quitte le salon name (general et la boîte de réception restent suivis).
+        """
+        channel = channel_name(name)
+        if channel == GENERAL or channel not in self.tails:
+            return
+        tail = self.tails.pop(channel)
+        if self.relay:
+            self.link.unsubscribe([channel])
+        else:
+            tail.close()
+        if self.current == channel:
+            self.current = GENERAL
+        self._status(f"Salon #{channel} quitté, salon courant : #{self.current}")
+
+    async def send(self, text, channel=None):
+        """
+        Envoie un message dans channel (par défaut le salon courant).
+        Lève OSError si le journal ou le relais est inaccessible.
+        """
+        self.writer.post(self.username, text, channel or self.current)
+
+    async def send_dm(self, dest_user, text):
+        """
+        Message privé : écrit dans la boîte de réception de dest_user et
+        dans la sienne (pour garder la conversation).
+        """
+        body = dm_text(dest_user, text)
+        self.writer.post(self.username, body, inbox(dest_user))
+        if dest_user != self.username:
+            self.writer.post(self.username, body, self.inbox)
+
+    async def send_file(self, path, dest_users):
+        """
+        Copie path dans Downloads/<user> de chaque destinataire (dans un
+        thread) puis l'annonce. dest_users : un nom ou une liste de noms.
+        Avec "blob_store", le contenu n'est écrit qu'une fois (blobs.py) ;
+        avec "transfer_compression", il arrive compressé (compression.py) ;
+        avec "transfer_delta", seuls les blocs modifiés d'une version déjà
+        reçue sont écrits (delta.py).
+        Retourne (nom_du_fichier, statistiques).
+        """
+        config = self.config
+        if isinstance(dest_users, str):
+            dest_users = [dest_users]
+        dest_users = list(dict.fromkeys(dest_users))
+        if not dest_users:
+            raise ValueError("Aucun destinataire.")
+        if config["blob_store"]:
+            filename, _, stats = await asyncio.to_thread(
+                send_blob, path, dest_users, self.downloads_dir, hash_cache_path(config),
+                compression=config["transfer_compression"], delta=config["transfer_delta"])
+        else:
+            stats = None
+            for dest_user in dest_users:
+                filename, _, one = await asyncio.to_thread(
+                    send_file, path, dest_user, self.downloads_dir,
+                    int(config["transfer_chunk_mb"] * 1024 * 1024), int(config["transfer_workers"]),
+                    config["transfer_compression"], config["transfer_delta"])
+                if stats is not None:
+                    written = stats.get("written_bytes", stats["bytes"]) + one.get("written_bytes", one["bytes"])
+                    one = transfer_stats(stats["bytes"] + one["bytes"], stats["seconds"] + one["seconds"],
+                                         one["method"])
+                    one["written_bytes"] = written
+                stats = one
+        for dest_user in dest_users:
+            await self._send_to(dest_user, f"[FILE] Sent {filename} to {dest_user}")
+        return filename, stats
+
+    async def request_exec(self, dest_user, command):
+        await self._send_to(dest_user, f"@exec {dest_user} {command}")
+
+    async def _send_to(self, dest_user, text):
+        """
+        Message adressé à dest_user : dans general (affichage) et dans son
+        journal de contrôle (c'est là que son client le traite).
+        """
+        await self.send(text, GENERAL)
+        try:
+            target = control(dest_user)
+        except ValueError:
+            return  # nom qui ne peut pas avoir de client : affiché seulement
+        self.writer.post(self.username, text, target)
+
+    async def answer_exec(self, msg, accepted):
+        """
+        Répond à une demande @exec (Message) et met la commande dans la
+        file d'exécution si elle est acceptée. Retourne True si elle y est
+        (le résultat est écrit dans le chat à la fin, voir _exec_done).
+        """
+        if not accepted:
+            await self.send(f"[EXEC] Refused command from {msg.sender}: {msg.arg}", GENERAL)
+            return False
+        if not self.exec.submit(msg.arg, msg.sender):
+            await self.send(f"[EXEC] Refused command from {msg.sender}: {msg.arg} (queue full)", GENERAL)
+            return False
+        await self.send(f"[EXEC] Accepted command from {msg.sender}: {msg.arg}", GENERAL)
+        return True
+
+    def _exec_done(self, result):
+        """
+        Fin d'une commande : sorties complètes dans Downloads/<demandeur>
+        (exec_result_file), résumé dans le chat.
+        """
+        result_file = None
+        if self.config["exec_result_file"] and (result.stdout or result.stderr):
+            try:
+                result_file = write_result_file(os.path.join(self.downloads_dir, result.sender),
+                                                self.username, result)
+            except OSError as e:
+                self._status(f"Résultat @exec non écrit : {e}")
+        try:
+            self.writer.post(self.username, format_result(result, result_file), GENERAL)
+        except OSError as e:
+            self._status(f"Résultat @exec non envoyé : {e}")
+
+    async def search(self, query, limit=50):
+        """
+        Recherche dans l'historique (voir search.parse_query) : liste de
+        search.Hit, du plus récent au plus ancien. Lève ValueError si la
+        requête est invalide ou la recherche désactivée.
+        """
+        if self.indexer is None:
+            raise ValueError("Recherche désactivée (search_index)")
+        return await asyncio.to_thread(self.indexer.search, query, limit)
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for task in (self._task, self._heartbeat):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        # commandes en cours : leur résultat est encore écrit, sinon tuées
+        await self.exec.shutdown(float(self.config["exec_shutdown_s"]))
+        try:
+            if self.downloads is not None:
+                self.cursor.save(self._state(), force=True)
+            if self.announce and self.writer is not None:
+                self.writer.post(self.username, f"{self.username} left the chat", GENERAL)
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+            for tail in self.tails.values():
+                if tail is not None:
+                    tail.close()
+            if self.downloads is not None:
+                self.downloads.close()
+            if self.watcher is not None:
+                self.watcher.close()
+            if self.indexer is not None:
+                self.indexer.close()
+            if self.metrics is not None:
+                self.metrics.close()
+            self._queue.put_nowait(None)
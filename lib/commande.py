@@ -1,45 +1,182 @@
 # KALANGOSO KANGELA - RAYANE BADKOUF
-import subprocess
-from format import format_msg
+# Exécution des commandes @exec acceptées.
+# Les commandes attendent dans une file (deque) et au plus max_jobs
+# tournent en même temps ; chacune a un délai maximal au-delà duquel elle
+# est tuée (avec ses processus fils). Code de sortie, durée et sorties
+# sont récupérés sans bloquer et remis à on_result.
+import os
+import sys
 import time
+import signal
+import asyncio
+import subprocess
+from collections import deque, namedtuple
+
+from metrics import log, counter, histogram
+
+EXEC_SECONDS = histogram("exec_seconds", "Durée des commandes @exec", (0.1, 0.5, 1, 5, 10, 30, 60, 300))
+EXEC_TIMEOUTS = counter("exec_timeouts_total", "Commandes @exec tuées (délai dépassé)")
+
+ExecResult = namedtuple("ExecResult", "command sender returncode duration stdout stderr timed_out")
+
 
-def ask_exec_permission(sender, command):
+def _kill(proc):
     """
-    Demande à l'utilisateur s'il accepte d'exécuter la commande reçue.
+    Tue le processus et ses fils (shell=True lance un shell intermédiaire).
     """
-    print("[DEBUG] ask_exec_permission CALLED")
-    time.sleep(0.05)
-    print(f"[EXEC] {sender} veut exécuter : {command}")
-    resp = input("Accepter ? (y/N) : ").strip().lower()
-    return resp == 'y'
+    try:
+        if sys.platform == "win32":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (OSError, ProcessLookupError):
+        pass
+    try:
+        proc.kill()
+    except ProcessLookupError:
+        pass
 
 
-def execute_command(command):
+def _decode(data, limit):
+    text = data[:limit].decode("utf-8", errors="replace")
+    if len(data) > limit:
+        text += f"\n[... {len(data) - limit} octets tronqués]"
+    return text
+
+
+class ExecEngine:
     """
-    Exécute la commande système demandée sur le PC du destinataire.
+    File d'exécution des commandes acceptées (à utiliser depuis une
+    boucle asyncio). on_result(ExecResult) est appelé à la fin de chaque
+    commande, y compris en cas d'échec au lancement (returncode None).
     """
-    try:
-        subprocess.Popen(command, shell=True)
+
+    def __init__(self, on_result=None, max_jobs=2, timeout=60.0, max_queue=100, max_output=64 * 1024):
+        self.on_result = on_result
+        self.max_jobs = max(1, int(max_jobs))
+        self.timeout = float(timeout)
+        self.max_queue = int(max_queue)
+        self.max_output = int(max_output)
+        self._pending = deque()
+        self._running = set()
+        self._closing = False
+
+    def submit(self, command, sender=None):
+        """
+        Met la commande en file. Retourne False si la file est pleine ou
+        si le moteur s'arrête.
+        """
+        if self._closing or len(self._pending) >= self.max_queue:
+            return False
+        self._pending.append((command, sender))
+        self._pump()
         return True
-    except Exception as e:
-        print(f"[ERREUR EXEC] {e}")
-        return False
 
+    def pending(self):
+        return len(self._pending)
+
+    def running(self):
+        return len(self._running)
+
+    def _pump(self):
+        while self._pending and len(self._running) < self.max_jobs and not self._closing:
+            command, sender = self._pending.popleft()
+            task = asyncio.get_running_loop().create_task(self._run(command, sender))
+            self._running.add(task)
+            task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self._running.discard(task)
+        self._pump()
+
+    async def _run(self, command, sender):
+        start = time.monotonic()
+        options = {}
+        if sys.platform != "win32":
+            options["start_new_session"] = True   # groupe de processus pour _kill
+        try:
+            proc = await asyncio.create_subprocess_shell(
+                command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **options)
+        except OSError as e:
+            log.error("@exec impossible à lancer : %s (%s)", command, e)
+            self._report(ExecResult(command, sender, None, 0.0, "", str(e), False))
+            return
+        log.debug("@exec lancé (pid %s) : %s", proc.pid, command)
+        timed_out = False
+        communicate = asyncio.ensure_future(proc.communicate())
+        try:
+            done, _ = await asyncio.wait({communicate}, timeout=self.timeout)
+            if not done:
+                timed_out = True
+                EXEC_TIMEOUTS.inc()
+                log.warning("@exec tué après %s s : %s", self.timeout, command)
+                _kill(proc)
+            stdout, stderr = await communicate
+        except asyncio.CancelledError:
+            _kill(proc)
+            communicate.cancel()
+            raise
+        EXEC_SECONDS.observe(time.monotonic() - start)
+        self._report(ExecResult(command, sender, proc.returncode, time.monotonic() - start,
+                                _decode(stdout, self.max_output), _decode(stderr, self.max_output),
+                                timed_out))
 
-def exec_request(sender, dest_user, current_user, command, shared_file):
+    def _report(self, result):
+        if self.on_result is not None:
+            try:
+                self.on_result(result)
+            except Exception:
+                log.exception("Résultat @exec non transmis : %s", result.command)
+
+    async def shutdown(self, timeout=3.0):
+        """
+        Vide la file, attend au plus timeout secondes les commandes en
+        cours puis tue celles qui tournent encore.
+        """
+        self._closing = True
+        self._pending.clear()
+        if not self._running:
+            return
+        _, still = await asyncio.wait(set(self._running), timeout=timeout)
+        for task in still:
+            task.cancel()
+        if still:
+            await asyncio.wait(still)
+
+
+def format_result(result, result_file=None):
     """
-    Gère une demande @exec envoyée dans le chat.
+    Résumé d'une exécution pour le chat.
     """
-    print("[DEBUG] ask_exec_permission CALLED")
-    # Ce n'est pas pour cet utilisateur
-    if dest_user != current_user:
-        return
+    if result.returncode is None:
+        status = f"échec du lancement : {result.stderr}"
+    elif result.timed_out:
+        status = f"tuée après {result.duration:.1f} s"
+    else:
+        status = f"code {result.returncode}, {result.duration:.2f} s"
+    summary = f"[EXEC] Result of command from {result.sender}: {result.command} ({status})"
+    if result_file:
+        summary += f" -> {result_file}"
+    return summary
 
-    allowed = ask_exec_permission(sender, command)
 
-    with open(shared_file, 'a', encoding='utf-8') as f:
-        if allowed:
-            f.write(format_msg(current_user, f"[EXEC] Accepted command from {sender}: {command}"))
-            execute_command(command)
-        else:
-            f.write(format_msg(current_user, f"[EXEC] Refused command from {sender}: {command}"))
\ No newline at end of file
+def write_result_file(folder, username, result):
+    """
+    Écrit les sorties complètes dans folder (Downloads/<demandeur>) et
+    retourne le nom du fichier (écriture atomique : le fichier n'apparaît
+    que complet).
+    """
+    name = f"exec-{username}-{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}.txt"
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    tmp_path = path + ".part"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(f"$ {result.command}\n")
+        f.write(f"# code={result.returncode} durée={result.duration:.3f}s tuée={result.timed_out}\n")
+        if result.stdout:
+            f.write("\n--- stdout ---\n" + result.stdout)
+        if result.stderr:
+            f.write("\n--- stderr ---\n" + result.stderr)
+    os.replace(tmp_path, path)
+    return name
@@ -0,0 +1,304 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Compression par blocs (zlib, lzma ou bz2 de la bibliothèque standard),
+# pour les transferts @send ("transfer_compression") et les anciens
+# segments du journal ("segment_compress").
+# Format d'un fichier compressé :
+#   en-tête  magic(2) version(1) codec(1) taille_de_bloc(4)
+#   blocs    compressés indépendamment (ou stockés tels quels s'ils ne
+#            gagnent rien)
+#   index    position(8) longueur(4) codec(1) par bloc
+#   fin      taille_décompressée(8) position_de_l'index(8) nb_blocs(4) "CZIX"
+# Chaque bloc se décompresse seul : open_read() rend un fichier en
+# lecture où seek() et les positions sont celles du contenu décompressé
+# (les positions des index .idx, des points de reprise et de l'index de
+# recherche restent valables après compression d'un segment).
+# Usage : python compression.py compress|expand <fichier> [codec]
+import os
+import sys
+import bz2
+import lzma
+import zlib
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+MAGIC = b"\xabZ"
+VERSION = 1
+HEADER = struct.Struct("<2sBBI")
+INDEX_ENTRY = struct.Struct("<QIB")
+TRAILER = struct.Struct("<QQI4s")
+TRAILER_MAGIC = b"CZIX"
+COMPRESSED_SUFFIX = ".cz"        # fichier reçu compressé (voir expand_file)
+
+BLOCK_SIZE = 1024 * 1024
+STORED = 0
+CODECS = {"zlib": 1, "lzma": 2, "bz2": 3}
+LEVELS = {"zlib": 6, "lzma": 1, "bz2": 9}
+COMPRESSION_MODES = ("off", "auto") + tuple(CODECS)
+SAMPLE_SIZE = 256 * 1024
+SAMPLE_RATIO = 0.9               # échantillon compressé à plus de 90 % : on n'insiste pas
+
+# Formats déjà compressés : les recompresser coûte du CPU sans rien gagner
+COMPRESSED_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".txz", ".lz", ".lz4", ".lzma", ".zst", ".7z", ".rar",
+    ".cab", ".jar", ".war", ".whl", ".apk", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".epub",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".avif",
+    ".mp3", ".aac", ".ogg", ".opus", ".flac", ".m4a",
+    ".mp4", ".m4v", ".mkv", ".avi", ".mov", ".webm", ".wmv",
+    COMPRESSED_SUFFIX,
+}
+
+COMPRESS_IN = metrics.counter("compress_in_bytes_total", "Octets avant compression")
+COMPRESS_OUT = metrics.counter("compress_out_bytes_total", "Octets après compression")
+
+_CODE_NAMES = {code: name for name, code in CODECS.items()}
+
+
+def _compress(codec, data):
+    if codec == "zlib":
+        return zlib.compress(data, LEVELS[codec])
+    if codec == "lzma":
+        return lzma.compress(data, preset=LEVELS[codec])
+    return bz2.compress(data, LEVELS[codec])
+
+
+def _decompress(code, data):
+    if code == STORED:
+        return data
+    if code == CODECS["zlib"]:
+        return zlib.decompress(data)
+    if code == CODECS["lzma"]:
+        return lzma.decompress(data)
+    if code == CODECS["bz2"]:
+        return bz2.decompress(data)
+    raise ValueError(f"Codec inconnu : {code}")
+
+
+def choose_codec(path, mode="auto"):
+    """
+    Codec à utiliser pour envoyer path selon mode ("off", "auto" ou un
+    codec), None si la compression ne vaut pas la peine : format déjà
+    compressé (extension) ou échantillon du début qui ne se compresse pas.
+    "auto" choisit zlib, assez rapide pour ne pas ralentir le partage.
+    """
+    if mode not in COMPRESSION_MODES:
+        raise ValueError(f"Compression inconnue : {mode}")
+    if mode == "off":
+        return None
+    if os.path.splitext(path)[1].lower() in COMPRESSED_EXTENSIONS:
+        return None
+    with open(path, 'rb') as f:
+        sample = f.read(SAMPLE_SIZE)
+    if not sample or len(zlib.compress(sample, 1)) > len(sample) * SAMPLE_RATIO:
+        return None
+    return "zlib" if mode == "auto" else mode
+
+
+def is_compressed(path):
+    """
+    Vrai si path est un fichier compressé par blocs.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def compress_file(src_path, dest_path, codec="zlib", block_size=BLOCK_SIZE, workers=4, digest=None):
+    """
+    Écrit dans dest_path la version compressée par blocs de src_path.
+    La lecture est séquentielle, les blocs sont compressés en parallèle
+    (zlib, lzma et bz2 libèrent le GIL) et écrits dans l'ordre.
+    digest (hashlib) reçoit au passage le contenu d'origine.
+    Retourne (octets_lus, octets_écrits).
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Codec inconnu : {codec}")
+    index = []
+    raw_size = 0
+
+    def pack(data):
+        packed = _compress(codec, data)
+        return (packed, CODECS[codec]) if len(packed) < len(data) else (bytes(data), STORED)
+
+    with open(src_path, 'rb') as src, open(dest_path, 'wb') as dst, \
+            ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        dst.write(HEADER.pack(MAGIC, VERSION, CODECS[codec], block_size))
+        offset = HEADER.size
+        running = deque()
+
+        def drain(limit):
+            nonlocal offset
+            while len(running) > limit:
+                packed, code = running.popleft().result()
+                dst.write(packed)
+                index.append(INDEX_ENTRY.pack(offset, len(packed), code))
+                offset += len(packed)
+
+        while True:
+            data = src.read(block_size)
+            if not data:
+                break
+            raw_size += len(data)
+            if digest is not None:
+                digest.update(data)
+            running.append(pool.submit(pack, data))
+            drain(2 * max(1, workers))
+        drain(0)
+        dst.write(b"".join(index))
+        dst.write(TRAILER.pack(raw_size, offset, len(index), TRAILER_MAGIC))
+        written = dst.tell()
+    COMPRESS_IN.inc(raw_size)
+    COMPRESS_OUT.inc(written)
+    return raw_size, written
+
+
+def expand_file(src_path, dest_path):
+    """
+    Écrit dans dest_path le contenu décompressé de src_path.
+    Retourne le nombre d'octets écrits.
+    """
+    with open_read(src_path) as src, open(dest_path, 'wb') as dst:
+        while True:
+            data = src.read(BLOCK_SIZE)
+            if not data:
+                break
+            dst.write(data)
+        return dst.tell()
+
+
+class BlockFile:
+    """
+    Fichier compressé par blocs en lecture (read, readline, seek, tell),
+    positions dans le contenu décompressé. Garde le dernier bloc lu.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        f.seek(0)
+        magic, version, code, self.block_size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{f.name} : fichier compressé illisible")
+        self.codec = _CODE_NAMES.get(code)
+        f.seek(-TRAILER.size, os.SEEK_END)
+        self.size, index_offset, count, tail = TRAILER.unpack(f.read(TRAILER.size))
+        if tail != TRAILER_MAGIC:
+            raise ValueError(f"{f.name} : fichier compressé incomplet")
+        f.seek(index_offset)
+        data = f.read(count * INDEX_ENTRY.size)
+        self.index = [INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size) for i in range(count)]
+        self.name = f.name
+        self.pos = 0
+        self._cached = (None, b"")
+        self._lock = threading.Lock()
+
+    def _block(self, number):
+        with self._lock:
+            if self._cached[0] == number:
+                return self._cached[1]
+            offset, length, code = self.index[number]
+            self.f.seek(offset)
+            data = _decompress(code, self.f.read(length))
+            self._cached = (number, data)
+            return data
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.size, self.pos + size)
+        parts = []
+        while self.pos < end:
+            number, start = divmod(self.pos, self.block_size)
+            block = self._block(number)
+            part = block[start:start + end - self.pos]
+            if not part:
+                break
+            parts.append(part)
+            self.pos += len(part)
+        return b"".join(parts)
+
+    def readline(self, size=-1):
+        parts = []
+        while self.pos < self.size:
+            number, start = divmod(self.pos, self.block_size)
+            block = self._block(number)
+            nl = block.find(b"\n", start)
+            part = block[start:] if nl < 0 else block[start:nl + 1]
+            if not part:
+                break
+            parts.append(part)
+            self.pos += len(part)
+            if nl >= 0:
+                break
+        return b"".join(parts)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.pos = max(0, offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_read(path):
+    """
+    Ouvre path en lecture binaire : fichier ordinaire, ou BlockFile s'il
+    est compressé par blocs (même interface pour la lecture).
+    """
+    f = open(path, 'rb')
+    try:
+        if f.read(len(MAGIC)) == MAGIC:
+            return BlockFile(f)
+        f.seek(0)
+        return f
+    except BaseException:
+        f.close()
+        raise
+
+
+def data_size(path):
+    """
+    Taille du contenu de path (décompressé s'il est compressé par blocs).
+    """
+    with open_read(path) as f:
+        return f.size if isinstance(f, BlockFile) else os.fstat(f.fileno()).st_size
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("compress", "expand"):
+        print("Usage : python compression.py compress|expand <fichier> [codec]")
+        return 1
+    path = sys.argv[2]
+    if sys.argv[1] == "compress":
+        dest = path + COMPRESSED_SUFFIX
+        raw, written = compress_file(path, dest + ".part", sys.argv[3] if len(sys.argv) > 3 else "zlib")
+        os.replace(dest + ".part", dest)
+        print(f"[OK] {dest} : {raw / 1e6:.1f} Mo -> {written / 1e6:.1f} Mo")
+    else:
+        dest = path[:-len(COMPRESSED_SUFFIX)] if path.endswith(COMPRESSED_SUFFIX) else path + ".out"
+        written = expand_file(path, dest + ".part")
+        os.replace(dest + ".part", dest)
+        print(f"[OK] {dest} : {written / 1e6:.1f} Mo")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,19 +19,60 @@ def read_config(path='chat.json'):
         return {}
 
 
-def get_config():
+def get_config(path='chat.json'):
     """
-    Récupère la configuration à partir de chat.json,
+    Récupère la configuration à partir de chat.json (ou path),
     en ajoutant des valeurs par défaut si certaines clés manquent.
     Retourne toujours un dictionnaire propre.
     """
-    config = read_config()
+    config = read_config(path)
 
     # valeurs par défaut
     defaults = {
         "shared_file": "//DESKTOP-LPSLR66/dossier_partage/shared_chat.log",
         "downloads_dir": "//DESKTOP-LPSLR66/dossier_partage/file",
-        "interval": 0.5
+        "watch": "auto",
+        "min_interval": 0.05,
+        "max_interval": 2.0,
+        "transfer_workers": 4,
+        "transfer_chunk_mb": 8,
+        "fsync": "interval",
+        "fsync_interval_ms": 200,
+        "group_window_ms": 2,
+        "segment_max_mb": 64,
+        "segment_max_age_h": 24,
+        "state_dir": "~/.messagerie",
+        "cursor_interval": 1.0,
+        "log_format": "text",
+        "download_settle_s": 1.0,
+        "transport": "file",
+        "relay_host": "127.0.0.1",
+        "relay_port": 8765,
+        "relay_persist": True,
+        "channels": ["general"],
+        "exec_max_jobs": 2,
+        "exec_timeout_s": 60,
+        "exec_max_queue": 100,
+        "exec_output_kb": 64,
+        "exec_result_file": True,
+        "exec_shutdown_s": 3.0,
+        "journal_mode": "shared",
+        "merge_window_ms": 250,
+        "search_index": True,
+        "blob_store": True,
+        "blob_gc_grace_h": 24,
+        "transfer_compression": "off",
+        "receive_expand": True,
+        "transfer_delta": True,
+        "presence_heartbeat_s": 60,
+        "presence_timeout_s": 180,
+        "segment_compress": "off",
+        "segment_compress_keep": 2,
+        "log_level": "off",
+        "log_file": "",
+        "metrics_file": "",
+        "metrics_interval_s": 10,
+        "metrics_format": "prometheus"
     }
 
     # appliquer les valeurs par défaut si absentes
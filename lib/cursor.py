@@ -0,0 +1,59 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Point de reprise d'un lecteur : au redémarrage, le moteur client (client.py)
+# reprend là où il s'était arrêté (segment, position, fichiers
+# déjà vus) au lieu de sauter à la fin du journal.
+import os
+import json
+import time
+
+
+def cursor_path(state_dir, username, client):
+    """
+    Fichier d'état du lecteur client ("read", "gui"...) de username.
+    """
+    return os.path.join(os.path.expanduser(state_dir), f"{username}.{client}.cursor.json")
+
+
+class ReaderCursor:
+    """
+    Sauvegarde l'état d'un lecteur dans un petit fichier JSON local,
+    au plus une fois toutes les min_interval secondes.
+    """
+
+    def __init__(self, path, min_interval=1.0):
+        self.path = path
+        self.min_interval = float(min_interval)
+        self._last_save = 0.0
+        self._last_state = None
+
+    def load(self):
+        """
+        Retourne l'état sauvegardé, ou None s'il n'y en a pas.
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._last_state = state
+        return state
+
+    def save(self, state, force=False):
+        """
+        Enregistre state si il a changé et si le dernier enregistrement
+        date d'au moins min_interval secondes (ou si force).
+        """
+        if state == self._last_state:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_save < self.min_interval:
+            return
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+        self._last_save = now
+        self._last_state = state
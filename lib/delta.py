@@ -0,0 +1,277 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Transfert différentiel (à la rsync) : quand le destinataire a déjà une
+# version du fichier, seuls les blocs modifiés traversent le partage.
+# 1. signature de l'ancienne version : par bloc, adler32 (somme faible,
+#    calculable en glissant octet par octet) et blake2b (somme forte) ;
+#    gardée dans downloads_dir/.signatures/<user>/<fichier>.sig pour ne
+#    pas relire l'ancienne version au prochain envoi (ou simple renvoi
+#    vers la signature d'un blob partagé, voir blobs.py).
+# 2. la nouvelle version (locale) est parcourue : un bloc déjà présent est
+#    recopié depuis l'ancienne version (copy_file_range : copie côté
+#    serveur quand le système le permet), le reste est écrit.
+# 3. le résultat est assemblé dans un fichier temporaire renommé à la fin.
+import os
+import json
+import mmap
+import zlib
+import hashlib
+from collections import namedtuple
+
+import metrics
+
+SIGNATURES_DIR = ".signatures"
+SIGNATURE_SUFFIX = ".sig"
+DELTA_BLOCK = 64 * 1024
+DELTA_MIN_SIZE = 1024 * 1024     # en dessous, une copie complète coûte aussi peu
+ROLL_BUDGET = 8 * 1024 * 1024    # octets parcourus octet par octet au plus (Python)
+ROLL_GIVE_UP = 8                 # recherches vaines de suite : contenu sans rapport, on arrête
+ADLER_MOD = 65521
+SIGNATURE_VERSION = 1
+
+Signature = namedtuple("Signature", "block_size size blocks")   # blocks : [(adler32, blake2b hex)]
+
+DELTA_WRITTEN = metrics.counter("delta_written_bytes_total", "Octets écrits par les transferts différentiels")
+DELTA_REUSED = metrics.counter("delta_reused_bytes_total", "Octets repris de l'ancienne version")
+
+
+def signature_path(downloads_dir, username, filename):
+    return os.path.join(downloads_dir, SIGNATURES_DIR, username, filename + SIGNATURE_SUFFIX)
+
+
+def delta_base(path):
+    """
+    Vrai si path (fichier déjà reçu) peut servir d'ancienne version.
+    """
+    try:
+        return os.path.isfile(path) and os.path.getsize(path) >= DELTA_MIN_SIZE
+    except OSError:
+        return False
+
+
+def _strong(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _map(f):
+    """
+    Contenu du fichier ouvert f (mmap, ou b"" s'il est vide).
+    """
+    if not os.fstat(f.fileno()).st_size:
+        return b""
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def make_signature(data, block_size=DELTA_BLOCK):
+    blocks = []
+    for offset in range(0, len(data), block_size):
+        block = data[offset:offset + block_size]
+        blocks.append((zlib.adler32(block), _strong(block)))
+    return Signature(block_size, len(data), blocks)
+
+
+def file_signature(path, block_size=DELTA_BLOCK):
+    with open(path, 'rb') as f:
+        data = _map(f)
+        try:
+            return make_signature(data, block_size)
+        finally:
+            if data:
+                data.close()
+
+
+def load_signature(path, sig_path, block_size=DELTA_BLOCK):
+    """
+    Signature de path : celle du fichier sig_path si elle correspond
+    encore à path (taille, date), sinon recalculée (path est relu) et
+    enregistrée dans sig_path.
+    """
+    st = os.stat(path)
+    try:
+        with open(sig_path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        if (saved.get("version") == SIGNATURE_VERSION and saved.get("size") == st.st_size
+                and saved.get("mtime_ns") == st.st_mtime_ns and saved.get("block_size") == block_size):
+            if "ref" in saved:
+                with open(os.path.join(os.path.dirname(sig_path), saved["ref"]), 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                if saved.get("size") != st.st_size or saved.get("block_size") != block_size:
+                    raise ValueError("signature de référence périmée")
+            return Signature(block_size, st.st_size, [tuple(b) for b in saved["blocks"]])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    signature = file_signature(path, block_size)
+    save_signature(path, sig_path, signature)
+    return signature
+
+
+def save_signature(path, sig_path, signature):
+    """
+    Enregistre signature pour path (qui doit déjà avoir son contenu final).
+    """
+    st = os.stat(path)
+    tmp_path = sig_path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(sig_path) or ".", exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": SIGNATURE_VERSION, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                       "block_size": signature.block_size, "blocks": signature.blocks}, f,
+                      separators=(",", ":"))
+        os.replace(tmp_path, sig_path)
+    except OSError as e:
+        metrics.log.warning("Signature non enregistrée %s : %s", sig_path, e)
+
+
+def save_signature_ref(path, sig_path, ref_path):
+    """
+    Enregistre pour path (même contenu que le fichier signé dans ref_path)
+    un renvoi vers ref_path plutôt qu'une copie de la signature.
+    """
+    st = os.stat(path)
+    tmp_path = sig_path + ".tmp"
+    try:
+        with open(ref_path, 'r', encoding='utf-8') as f:
+            block_size = json.load(f)["block_size"]
+        os.makedirs(os.path.dirname(sig_path) or ".", exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": SIGNATURE_VERSION, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                       "block_size": block_size,
+                       "ref": os.path.relpath(ref_path, os.path.dirname(sig_path))}, f,
+                      separators=(",", ":"))
+        os.replace(tmp_path, sig_path)
+    except (OSError, ValueError, KeyError) as e:
+        metrics.log.warning("Signature non enregistrée %s : %s", sig_path, e)
+
+
+def _roll(data, start, length, weak, blocks, budget):
+    """
+    Cherche à partir de start + 1 (et avant start + length) une fenêtre
+    de length octets présente dans l'ancienne version. Retourne
+    (position, bloc) ou (None, None), et le budget restant.
+    """
+    end = min(len(data) - length, start + length - 1)
+    if end <= start or budget <= 0:
+        return None, None, budget
+    end = min(end, start + budget)
+    window = zlib.adler32(data[start:start + length])
+    a, b = window & 0xffff, window >> 16
+    for pos in range(start + 1, end + 1):
+        out, new = data[pos - 1], data[pos + length - 1]
+        a = (a - out + new) % ADLER_MOD
+        b = (b - length * out + a - 1) % ADLER_MOD
+        candidates = weak.get((b << 16) | a)
+        if candidates:
+            digest = _strong(data[pos:pos + length])
+            for block in candidates:
+                if blocks[block][1] == digest:
+                    return pos, block, budget - (pos - start)
+    return None, None, budget - (end - start)
+
+
+def plan(data, signature):
+    """
+    Opérations pour reconstruire data à partir de l'ancienne version :
+    liste de ("copy", position_ancienne, longueur) et ("data", position,
+    longueur) dans data, consécutives et fusionnées.
+    """
+    size = signature.block_size
+    blocks = signature.blocks
+    strong = {}
+    weak = {}
+    for number, (adler, digest) in enumerate(blocks):
+        strong.setdefault(digest, number)
+        if (number + 1) * size <= signature.size:   # le dernier bloc incomplet ne glisse pas
+            weak.setdefault(adler, []).append(number)
+    ops = []
+
+    def emit(kind, offset, length):
+        if ops and ops[-1][0] == kind and ops[-1][1] + ops[-1][2] == offset:
+            ops[-1] = (kind, ops[-1][1], ops[-1][2] + length)
+        else:
+            ops.append((kind, offset, length))
+
+    budget, failed = ROLL_BUDGET, 0
+    pos, n = 0, len(data)
+    while pos < n:
+        end = min(pos + size, n)
+        block = strong.get(_strong(data[pos:end]))
+        if block is not None and min(size, signature.size - block * size) == end - pos:
+            emit("copy", block * size, end - pos)
+            pos = end
+            continue
+        found = None
+        # bloc suivant retrouvé tel quel : modification sur place, pas de
+        # décalage à rechercher octet par octet
+        if end - pos == size and _strong(data[end:end + size]) not in strong:
+            found, block, budget = _roll(data, pos, size, weak, blocks, budget)
+            failed = 0 if found is not None else failed + 1
+            if failed >= ROLL_GIVE_UP:
+                budget = 0
+        if found is None:
+            emit("data", pos, end - pos)
+            pos = end
+        else:
+            emit("data", pos, found - pos)
+            emit("copy", block * size, size)
+            pos = found + size
+    return ops
+
+
+def _copy_from(base, dst, src_offset, dst_offset, length):
+    if hasattr(os, "copy_file_range"):
+        try:
+            while length:
+                n = os.copy_file_range(base.fileno(), dst.fileno(), length, src_offset, dst_offset)
+                if not n:
+                    break
+                src_offset, dst_offset, length = src_offset + n, dst_offset + n, length - n
+            if not length:
+                return
+        except OSError:
+            pass
+    base.seek(src_offset)
+    dst.seek(dst_offset)
+    while length:
+        chunk = base.read(min(length, 1024 * 1024))
+        if not chunk:
+            raise IOError("L'ancienne version a changé pendant le transfert.")
+        dst.write(chunk)
+        length -= len(chunk)
+
+
+def delta_copy(src_path, base_path, dest_path, signature, digest=None):
+    """
+    Écrit dans dest_path le contenu de src_path en reprenant de base_path
+    (ancienne version, de signature signature) les blocs inchangés.
+    digest (hashlib) reçoit au passage le contenu de src_path.
+    Retourne (octets_écrits, octets_repris, signature_de_la_nouvelle_version).
+    """
+    written = reused = 0
+    with open(src_path, 'rb') as src, open(base_path, 'rb', buffering=0) as base, \
+            open(dest_path, 'wb', buffering=0) as dst:
+        data = _map(src)
+        try:
+            if digest is not None:
+                digest.update(data)
+            ops = plan(data, signature)
+            position = 0
+            for kind, offset, length in ops:
+                if kind == "copy":
+                    _copy_from(base, dst, offset, position, length)
+                    reused += length
+                else:
+                    dst.seek(position)
+                    view = memoryview(data)[offset:offset + length]
+                    done = 0
+                    while done < length:
+                        done += dst.write(view[done:])
+                    view.release()
+                    written += length
+                position += length
+            dst.truncate(position)
+            new_signature = make_signature(data, signature.block_size)
+        finally:
+            if data:
+                data.close()
+    DELTA_WRITTEN.inc(written)
+    DELTA_REUSED.inc(reused)
+    return written, reused, new_signature
@@ -0,0 +1,154 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Surveillance incrémentale du dossier de réception Downloads/<user>.
+# Au lieu de relister le dossier à chaque tour, on garde (taille, mtime)
+# de chaque fichier et on ne relit le dossier que s'il a changé :
+# événement inotify si le système de fichiers le permet, sinon mtime du
+# dossier. Les fichiers encore en train de grossir sont seuls re-stat.
+import os
+import time
+from collections import namedtuple
+
+from file_transfer import is_partial, PART_SUFFIX
+from notify import InotifyWatcher, supports_inotify
+import metrics
+
+SCAN_SECONDS = metrics.histogram("downloads_scan_seconds", "Relecture du dossier de réception")
+POLL_SECONDS = metrics.histogram("downloads_poll_seconds", "Vérification du dossier de réception (poll)")
+
+Changes = namedtuple("Changes", "added modified removed completed")
+
+
+class DownloadsWatcher:
+    """
+    Suit le dossier user_dir. poll() retourne les fichiers ajoutés,
+    modifiés, supprimés, et ceux qui ont fini d'arriver (completed :
+    taille et mtime stables depuis settle secondes, ou transfert .part
+    renommé). Les transferts en cours (.part) ne sont pas signalés.
+    known_files : fichiers déjà vus (point de reprise) ; sans lui, le
+    contenu actuel du dossier sert d'état initial.
+    """
+
+    def __init__(self, user_dir, known_files=None, settle=1.0, watch="auto"):
+        self.user_dir = user_dir
+        self.settle = float(settle)
+        self._entries = {}       # nom -> (taille, mtime_ns)
+        self._partials = set()   # transferts en cours au dernier scan
+        self._growing = set()    # fichiers pas encore complets
+        self._dir_mtime = None
+        self._notify = None
+        if watch != "poll" and supports_inotify([user_dir]):
+            try:
+                self._notify = InotifyWatcher([user_dir], max_wait=0)
+            except (OSError, AttributeError):
+                self._notify = None
+        self._known = None if known_files is None else set(known_files)
+        if known_files is None:
+            self._changed()
+            self._scan()
+
+    def known_files(self):
+        """
+        Fichiers complets ou en cours connus (pour le point de reprise).
+        """
+        return list(self._entries)
+
+    def pending(self):
+        """
+        Vrai si des fichiers sont encore en train d'arriver.
+        """
+        return bool(self._growing)
+
+    def poll(self):
+        start = time.perf_counter()
+        changes = Changes([], [], [], [])
+        if self._changed():
+            changes = self._scan()
+            SCAN_SECONDS.observe(time.perf_counter() - start)
+        if self._growing:
+            self._check_growing(changes.completed)
+        POLL_SECONDS.observe(time.perf_counter() - start)
+        return changes
+
+    def close(self):
+        if self._notify is not None:
+            self._notify.close()
+            self._notify = None
+
+    def _changed(self):
+        """
+        Vrai si le dossier a pu changer depuis le dernier scan.
+        """
+        if self._notify is not None:
+            first = self._dir_mtime is None
+            self._dir_mtime = 0
+            return self._notify.wait(0) or first
+        try:
+            st = os.stat(self.user_dir)
+        except OSError:
+            return bool(self._entries)
+        if st.st_mtime_ns != self._dir_mtime:
+            self._dir_mtime = st.st_mtime_ns
+            return True
+        # mtime trop récent : un changement dans la même unité de temps
+        # du système de fichiers ne modifierait pas le mtime
+        return time.time() - st.st_mtime < self.settle
+
+    def _stable(self, sig, now):
+        return now - sig[1] / 1e9 >= self.settle
+
+    def _scan(self):
+        current = {}
+        partials = set()
+        try:
+            with os.scandir(self.user_dir) as it:
+                for entry in it:
+                    name = entry.name
+                    if is_partial(name):
+                        partials.add(name)
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    current[name] = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+
+        changes = Changes([], [], [], [])
+        now = time.time()
+        for name, sig in current.items():
+            old = self._entries.get(name)
+            if old is None:
+                if self._known is None or name in self._known:
+                    continue  # état initial : rien à signaler
+                changes.added.append(name)
+                if name + PART_SUFFIX in self._partials or self._stable(sig, now):
+                    changes.completed.append(name)
+                else:
+                    self._growing.add(name)
+            elif old != sig and name not in self._growing:
+                changes.modified.append(name)
+                self._growing.add(name)
+        changes.removed.extend(name for name in self._entries if name not in current)
+        self._growing.difference_update(changes.removed)
+        self._entries = current
+        self._partials = partials
+        self._known = set()
+        return changes
+
+    def _check_growing(self, completed):
+        now = time.time()
+        for name in list(self._growing):
+            try:
+                st = os.stat(os.path.join(self.user_dir, name))
+            except OSError:
+                self._growing.discard(name)
+                continue
+            sig = (st.st_size, st.st_mtime_ns)
+            if sig != self._entries.get(name):
+                self._entries[name] = sig  # grossit encore
+            elif self._stable(sig, now):
+                self._growing.discard(name)
+                completed.append(name)
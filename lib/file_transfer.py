@@ -1,13 +1,222 @@
 # KALANGOSO KANGELA - RAYANE BADKOUF
 import os
-from format import make_dir
+import json
+import time
+import errno
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from format import make_dir, make_writable
+from compression import choose_codec, compress_file, COMPRESSED_SUFFIX
+from delta import (
+    delta_base, delta_copy, load_signature, save_signature, file_signature, signature_path, DELTA_MIN_SIZE,
+)
+import metrics
 
-BIT = 8192  # 8 KB
+COPY_BUFSIZE = 1024 * 1024       # 1 MB, tampon réutilisé pour le mode readinto
+SENDFILE_MAX = 1 << 30           # sendfile copie au plus ~2 Go par appel
+CHUNK_SIZE = 8 * 1024 * 1024     # 8 MB, unité de reprise et de parallélisme
+TRANSFER_WORKERS = 4
 
-def send_file(src_path, dest_user, downloads_dir):
+PART_SUFFIX = ".part"            # fichier en cours de réception
+MANIFEST_SUFFIX = ".part.json"   # blocs déjà copiés (reprise)
+
+# Erreurs qui signifient "méthode non supportée ici" : on passe à la suivante
+_UNSUPPORTED = {
+    errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP,
+    errno.ENOTSUP, errno.EBADF, errno.ENOTSOCK,
+}
+
+TRANSFER_BYTES = metrics.counter("transfer_bytes_total", "Octets copiés par send_file")
+TRANSFER_SECONDS = metrics.counter("transfer_seconds_total", "Durée cumulée des transferts")
+TRANSFER_RATE = metrics.gauge("transfer_mb_per_s", "Débit du dernier transfert (Mo/s)")
+
+
+def copy_range(src, dst, offset, length, buf=None):
+    """
+    Copie length octets de src vers dst à partir de offset (même position
+    des deux côtés). src et dst sont des fichiers binaires non bufferisés.
+    Essaie os.copy_file_range, puis os.sendfile (copie dans le noyau),
+    puis readinto avec un grand tampon réutilisable, sans flush par bloc.
+    Retourne (octets_copiés, méthode).
+    """
+    end = offset + length
+    pos = offset
+    method = None
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            while pos < end:
+                n = os.copy_file_range(src.fileno(), dst.fileno(), end - pos, pos, pos)
+                if n == 0:
+                    break
+                pos += n
+            method = "copy_file_range"
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+
+    if method is None and hasattr(os, "sendfile"):
+        try:
+            dst.seek(pos)
+            while pos < end:
+                n = os.sendfile(dst.fileno(), src.fileno(), pos, min(end - pos, SENDFILE_MAX))
+                if n == 0:
+                    break
+                pos += n
+            method = "sendfile"
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+
+    if method is None:
+        if buf is None:
+            buf = bytearray(COPY_BUFSIZE)
+        view = memoryview(buf)
+        src.seek(pos)
+        dst.seek(pos)
+        while pos < end:
+            n = src.readinto(view[:min(len(view), end - pos)])
+            if not n:
+                break
+            done = 0
+            while done < n:
+                done += dst.write(view[done:n])
+            pos += n
+        method = "readinto"
+
+    return pos - offset, method
+
+
+def transfer_stats(nbytes, seconds, method):
+    """
+    Construit le dict de statistiques d'un transfert.
+    """
+    seconds = max(seconds, 1e-9)
+    return {
+        "bytes": nbytes,
+        "seconds": seconds,
+        "mb_per_s": nbytes / seconds / 1e6,
+        "method": method,
+    }
+
+
+def format_stats(stats):
+    """
+    Texte lisible pour les statistiques d'un transfert.
+    """
+    text = (f"{stats['bytes'] / 1e6:.1f} Mo en {stats['seconds']:.2f} s "
+            f"({stats['mb_per_s']:.1f} Mo/s, {stats['method']})")
+    if "written_bytes" in stats:
+        text += f", {stats['written_bytes'] / 1e6:.1f} Mo écrits"
+    return text
+
+
+def is_partial(filename):
+    """
+    Vrai pour les fichiers d'un transfert en cours (.part et son manifeste).
+    """
+    return filename.endswith(PART_SUFFIX) or filename.endswith(MANIFEST_SUFFIX)
+
+
+def _load_manifest(manifest_path, source):
+    """
+    Retourne l'ensemble des blocs déjà copiés si le manifeste correspond
+    à la même source (taille, date, taille de bloc), sinon un ensemble vide.
+    """
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("source") == source:
+            return set(manifest.get("done", []))
+    except (OSError, ValueError):
+        pass
+    return set()
+
+
+def _save_manifest(manifest_path, source, done):
+    tmp_path = manifest_path + PART_SUFFIX   # reconnu par is_partial
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"source": source, "done": sorted(done)}, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def transfer_file(src_path, dest_path, chunk_size=CHUNK_SIZE, workers=TRANSFER_WORKERS):
+    """
+    Copie src_path vers dest_path de façon atomique et reprenable :
+    - les données vont dans dest_path.part, renommé seulement à la fin ;
+    - dest_path.part.json liste les blocs terminés, un transfert
+      interrompu reprend là où il s'était arrêté ;
+    - les blocs (plages d'octets disjointes) sont copiés en parallèle
+      par un pool de workers threads.
+    Retourne les statistiques du transfert (voir transfer_stats).
+    """
+    start = time.perf_counter()
+    st = os.stat(src_path)
+    size = st.st_size
+    source = {"size": size, "mtime_ns": st.st_mtime_ns, "chunk_size": chunk_size}
+    part_path = dest_path + PART_SUFFIX
+    manifest_path = dest_path + MANIFEST_SUFFIX
+
+    done = _load_manifest(manifest_path, source) if os.path.isfile(part_path) else set()
+    if not done:
+        open(part_path, 'wb').close()
+    with open(part_path, 'r+b') as part:
+        part.truncate(size)
+
+    nb_chunks = (size + chunk_size - 1) // chunk_size
+    todo = [i for i in range(nb_chunks) if i not in done]
+    resumed = sum(min(chunk_size, size - i * chunk_size) for i in done)
+    lock = threading.Lock()
+    buffers = threading.local()
+    methods = set()
+
+    def copy_chunk(index):
+        offset = index * chunk_size
+        length = min(chunk_size, size - offset)
+        if not hasattr(buffers, "buf"):
+            buffers.buf = bytearray(COPY_BUFSIZE)
+        with open(src_path, 'rb', buffering=0) as src, open(part_path, 'r+b', buffering=0) as dst:
+            copied, method = copy_range(src, dst, offset, length, buffers.buf)
+        if copied != length:
+            raise IOError(f"Le fichier {src_path} a changé pendant le transfert.")
+        with lock:
+            done.add(index)
+            methods.add(method)
+            _save_manifest(manifest_path, source, done)
+        return copied
+
+    if workers > 1 and len(todo) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            copied = sum(pool.map(copy_chunk, todo))
+    else:
+        copied = sum(copy_chunk(i) for i in todo)
+
+    make_writable(dest_path)
+    os.replace(part_path, dest_path)
+    try:
+        os.remove(manifest_path)
+    except FileNotFoundError:
+        pass
+
+    stats = transfer_stats(copied, time.perf_counter() - start, "+".join(sorted(methods)) or "none")
+    stats["resumed_bytes"] = resumed
+    TRANSFER_BYTES.inc(copied)
+    TRANSFER_SECONDS.inc(stats["seconds"])
+    TRANSFER_RATE.set(stats["mb_per_s"])
+    metrics.log.info("Transfert %s : %s", os.path.basename(dest_path), stats)
+    return stats
+
+
+def send_file(src_path, dest_user, downloads_dir, chunk_size=CHUNK_SIZE, workers=TRANSFER_WORKERS,
+              compression="off", delta=False):
     """
     Envoie un fichier src_path vers Downloads/dest_user/.
-    Retourne (nom_du_fichier, chemin_destination).
+    Le destinataire ne voit le fichier qu'une fois complet (transfer_file).
+    Avec delta, si le destinataire a déjà une version du fichier, seuls
+    les blocs modifiés sont écrits (delta.py). Sinon, avec compression
+    ("auto" ou un codec, voir compression.choose_codec), le fichier
+    arrive compressé sous le nom <fichier>.cz.
+    Retourne (nom_du_fichier, chemin_destination, statistiques).
     """
     if not os.path.isfile(src_path):
         raise FileNotFoundError(f"Le fichier {src_path} n'existe pas.")
@@ -18,34 +227,71 @@ def send_file(src_path, dest_user, downloads_dir):
     make_dir(user_dir)
 
     dest_path = os.path.join(user_dir, filename)
+    sig_path = signature_path(downloads_dir, dest_user, filename)
+    if delta and delta_base(dest_path):
+        return filename, dest_path, delta_transfer(src_path, dest_path, sig_path)
+    codec = choose_codec(src_path, compression)
+    if codec is None:
+        stats = transfer_file(src_path, dest_path, chunk_size, workers)
+        if delta and stats["bytes"] >= DELTA_MIN_SIZE:
+            # signature de la version reçue, pour le prochain envoi
+            save_signature(dest_path, sig_path, file_signature(src_path))
+    else:
+        dest_path += COMPRESSED_SUFFIX
+        stats = compress_transfer(src_path, dest_path, codec, workers)
 
-    # Copier à la main en binaire
-    with open(src_path, 'rb') as src, open(dest_path, 'wb') as dst:
-        while True:
-            bit = src.read(BIT)
-            if not bit:
-                break
-            dst.write(bit)
-            dst.flush()
-
-    return filename, dest_path
+    return filename, dest_path, stats
 
 
-def list_user_files(username, downloads_dir):
+def delta_transfer(src_path, dest_path, sig_path):
     """
-    Retourne la liste des fichiers dans Downloads/<username>.
+    Remplace dest_path (ancienne version) par src_path en n'écrivant que
+    les blocs modifiés (delta.delta_copy), de façon atomique.
     """
-    user_dir = os.path.join(downloads_dir, username)
-    if not os.path.isdir(user_dir):
-        return []
-    return os.listdir(user_dir)
+    start = time.perf_counter()
+    part_path = dest_path + PART_SUFFIX
+    try:
+        signature = load_signature(dest_path, sig_path)
+        written, reused, new_signature = delta_copy(src_path, dest_path, part_path, signature)
+        make_writable(dest_path)
+        os.replace(part_path, dest_path)
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+    save_signature(dest_path, sig_path, new_signature)
+    stats = transfer_stats(written + reused, time.perf_counter() - start, "delta")
+    stats.update(written_bytes=written, reused_bytes=reused)
+    TRANSFER_BYTES.inc(written)
+    TRANSFER_SECONDS.inc(stats["seconds"])
+    TRANSFER_RATE.set(stats["mb_per_s"])
+    metrics.log.info("Transfert différentiel %s : %s", os.path.basename(dest_path), stats)
+    return stats
 
 
-def check_new_files(username, downloads_dir, known_files):
+def compress_transfer(src_path, dest_path, codec, workers=TRANSFER_WORKERS):
     """
-    Compare les fichiers dans Downloads/<username> avec known_files.
-    Retourne les nouveaux fichiers et la liste complète.
+    Copie compressée (par blocs, compression.compress_file) de src_path
+    vers dest_path, atomique comme transfer_file mais sans reprise.
     """
-    current_files = set(list_user_files(username, downloads_dir))
-    new_files = current_files - set(known_files)
-    return list(new_files), list(current_files)
\ No newline at end of file
+    start = time.perf_counter()
+    part_path = dest_path + PART_SUFFIX
+    try:
+        raw, written = compress_file(src_path, part_path, codec, workers=workers)
+        make_writable(dest_path)
+        os.replace(part_path, dest_path)
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+    stats = transfer_stats(raw, time.perf_counter() - start, codec)
+    stats["written_bytes"] = written
+    TRANSFER_BYTES.inc(written)
+    TRANSFER_SECONDS.inc(stats["seconds"])
+    TRANSFER_RATE.set(stats["mb_per_s"])
+    metrics.log.info("Transfert compressé %s : %s", os.path.basename(dest_path), stats)
+    return stats
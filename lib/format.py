@@ -2,18 +2,30 @@
 from datetime import datetime
 import os
 
-def format_time():
+def format_time(timestamp=None):
     """
-    Retourne la date/heure actuelle au format :
+    Retourne la date/heure actuelle (ou celle de timestamp, en secondes
+    epoch) au format :
     YYYY-MM-DD HH:MM:SS.milliseconds
     """
-    return datetime.now().isoformat(sep=' ', timespec='milliseconds')
+    moment = datetime.now() if timestamp is None else datetime.fromtimestamp(timestamp)
+    return moment.isoformat(sep=' ', timespec='milliseconds')
 
-def format_msg(username, text):
+def parse_timestamp(text):
+    """
+    Convertit un horodatage texte (format_time) en secondes epoch,
+    None s'il est illisible.
+    """
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        return None
+
+def format_msg(username, text, timestamp=None):
     """
     Formate un message selon le format imposé dans le projet.
     """
-    return f"{format_time()} - {username} : {text}\n"
+    return f"{format_time(timestamp)} - {username} : {text}\n"
 
 def make_dir(path):
     """
@@ -21,12 +33,31 @@ def make_dir(path):
     """
     os.makedirs(path, exist_ok=True)
 
+
+def make_writable(path):
+    """
+    Sous Windows, retire la lecture seule de path (s'il existe) : un
+    fichier en lecture seule ne peut y être ni remplacé ni supprimé.
+    """
+    if os.name == "nt":
+        try:
+            os.chmod(path, 0o644)
+        except OSError:
+            pass
+
 def read_new_lines(file_obj, last_pos):
     """
-    Lit uniquement les nouvelles lignes ajoutées depuis last_pos.
-    Retourne (liste_des_lignes, nouvelle_position).
+    Lit toutes les lignes complètes ajoutées depuis last_pos (mode drain).
+    file_obj doit être ouvert en binaire ('rb') : les positions sont des
+    octets et une ligne encore en cours d'écriture (sans retour à la
+    ligne) n'est pas consommée, elle sera relue au prochain appel.
+    Retourne (liste_des_lignes_sans_fin_de_ligne, nouvelle_position).
     """
     file_obj.seek(last_pos)
-    lines = file_obj.readlines()
-    new_pos = file_obj.tell()
-    return lines, new_pos
\ No newline at end of file
+    data = file_obj.read()
+    end = data.rfind(b"\n") + 1
+    if not end:
+        return [], last_pos
+    text = data[:end - 1].decode("utf-8", errors="replace")
+    lines = [line.rstrip("\r") for line in text.split("\n")]
+    return lines, last_pos + end
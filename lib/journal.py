@@ -0,0 +1,258 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Mode "journal_mode": "per_writer" : chaque utilisateur écrit seulement
+# dans son propre journal, plus d'ajouts concurrents sur un même fichier
+# (sur SMB, ils se sérialisent et peuvent mélanger des lignes).
+#   shared_chat.log                    ancien journal commun (toujours lu)
+#   shared_chat.journals/alice.log     journal d'alice (segmenté, voir segments.py)
+#   shared_chat.journals/bob.log       journal de bob
+# Idem pour chaque salon (channels/dev.journals/...) et boîte de réception.
+# Les lecteurs fusionnent les journaux par horodatage (format_time, qui
+# se trie comme du texte). Un message n'est rendu que quand tous les
+# journaux actifs ont dépassé son horodatage, ou après merge_window_ms
+# (décalage d'horloge entre machines). Un journal est actif s'il a reçu
+# des messages à ce tour ou pendant la dernière fenêtre : le journal
+# commun et les écrivains inactifs ne retiennent rien. Ordre à horodatage
+# égal : nom du journal puis position, identique pour tous les lecteurs.
+import os
+import re
+import time
+import heapq
+
+import metrics
+from format import format_time, parse_timestamp
+from segments import LogTail, read_before, segment_path, line_timestamp
+
+JOURNALS_SUFFIX = ".journals"
+JOURNAL_MODES = ("shared", "per_writer")
+SHARED = ""                 # nom du journal commun dans la fusion
+DIR_CHECK = 1.0             # secondes entre deux relectures forcées du dossier
+
+MERGE_LATE = metrics.counter("merge_late_total", "Messages arrivés après la fenêtre de réordonnancement")
+MERGE_JOURNALS = metrics.gauge("merge_journals", "Journaux fusionnés (dernier lecteur ouvert)")
+
+
+def per_writer(config):
+    mode = config.get("journal_mode", "shared")
+    if mode not in JOURNAL_MODES:
+        raise ValueError(f"journal_mode inconnu : {mode}")
+    return mode == "per_writer"
+
+
+def journal_dir(base):
+    return os.path.splitext(base)[0] + JOURNALS_SUFFIX
+
+
+def journal_path(base, username):
+    """
+    Journal de username pour le journal commun base.
+    """
+    ext = os.path.splitext(base)[1] or ".log"
+    return os.path.join(journal_dir(base), username + ext)
+
+
+def list_journals(base):
+    """
+    {nom: chemin} des journaux à fusionner pour base, journal commun
+    compris (nom SHARED). Les segments suivants (alice.000001.log) et les
+    fichiers annexes ne sont pas des journaux.
+    """
+    ext = os.path.splitext(base)[1] or ".log"
+    folder = journal_dir(base)
+    journals = {SHARED: base}
+    segment = re.compile(r"\.\d{6}" + re.escape(ext) + "$")
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        names = []
+    for name in names:
+        if name.endswith(ext) and not segment.search(name):
+            journals[name[:-len(ext)]] = os.path.join(folder, name)
+    return journals
+
+
+def _key(name, position, line):
+    # position : (segment, offset) dans le journal name
+    return (line_timestamp(line), name, position[0], position[1])
+
+
+class MergedTail:
+    """
+    Même interface que segments.LogTail (read_lines, read_entries, state,
+    position, close, resume_status) pour un ensemble de journaux fusionnés.
+    Les positions rendues par read_entries sont des clés de fusion
+    (horodatage, journal, segment, position), utilisables par read_history.
+    """
+
+    def __init__(self, base, from_end=True, state=None, window=0.25):
+        self.base = base
+        self.window = window
+        self.folder = journal_dir(base)
+        self.resume_status = "new"
+        self.tails = {}          # nom -> LogTail
+        self.last = {}           # nom -> horodatage du dernier message lu
+        self._heap = []          # (clé, ligne) en attente de rendu
+        self._released = ""      # horodatage du dernier message rendu
+        self._dir_mtime = None
+        self._dir_checked = 0.0
+        saved = (state or {}).get("journals")
+        self._resumed = saved is not None
+        if self._resumed:
+            self.resume_status = "resumed"
+        self._from_end = from_end
+        self._discover(saved or {})
+
+    def _discover(self, saved=None):
+        """
+        Ouvre les journaux apparus depuis le dernier appel. À l'ouverture
+        (saved donné), les journaux connus reprennent à leur point de
+        reprise ou en fin ; ceux créés ensuite sont lus depuis le début.
+        """
+        now = time.monotonic()
+        try:
+            mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            mtime = None
+        if saved is None and mtime == self._dir_mtime and now - self._dir_checked < DIR_CHECK:
+            return
+        self._dir_mtime, self._dir_checked = mtime, now
+        for name, path in sorted(list_journals(self.base).items()):
+            if name in self.tails:
+                continue
+            if saved is None:
+                self.tails[name] = LogTail(path, from_end=False)
+            elif name in saved:
+                self.tails[name] = LogTail(path, state=saved[name])
+            else:
+                self.tails[name] = LogTail(path, from_end=self._from_end and not self._resumed)
+            self.last.setdefault(name, "")
+        MERGE_JOURNALS.set(len(self.tails))
+
+    def position(self):
+        return None
+
+    def state(self):
+        """
+        Point de reprise de chaque journal, en deçà des messages encore
+        en attente pour qu'ils ne soient pas perdus.
+        """
+        earliest = {}
+        for (_, name, segment, offset), _ in self._heap:
+            if name not in earliest or (segment, offset) < earliest[name]:
+                earliest[name] = (segment, offset)
+        journals = {name: tail.state() for name, tail in self.tails.items()}
+        for name, (segment, offset) in earliest.items():
+            if segment == journals[name]["segment"]:
+                inode = journals[name]["inode"]
+            else:
+                try:
+                    inode = os.stat(segment_path(self.tails[name].base, segment)).st_ino
+                except OSError:
+                    continue
+            journals[name] = {"segment": segment, "offset": offset, "inode": inode}
+        return {"journals": journals}
+
+    def read_lines(self):
+        return [line for _, line in self.read_entries()]
+
+    def read_entries(self):
+        """
+        Messages prêts, dans l'ordre de fusion : liste de (clé, ligne).
+        """
+        self._discover()
+        fresh = set()
+        for name, tail in self.tails.items():
+            for position, line in tail.read_entries():
+                key = _key(name, position, line)
+                if key[0] > self.last[name]:
+                    self.last[name] = key[0]
+                heapq.heappush(self._heap, (key, line))
+                fresh.add(name)
+        return self._release(fresh)
+
+    def _release(self, fresh=()):
+        cutoff = format_time(time.time() - self.window)
+        active = [last for name, last in self.last.items() if name in fresh or last > cutoff]
+        watermark = min(active) if active else ""
+        ready = []
+        heap = self._heap
+        while heap and (heap[0][0][0] <= watermark or heap[0][0][0] <= cutoff):
+            key, line = heapq.heappop(heap)
+            if key[0] < self._released:
+                MERGE_LATE.inc()
+            else:
+                self._released = key[0]
+            ready.append((key, line))
+        return ready
+
+    def pending_delay(self):
+        """
+        Secondes avant que le plus ancien message en attente puisse être
+        rendu (None si rien n'attend) : quand les journaux qui le
+        retiennent sont devenus inactifs.
+        """
+        if not self._heap:
+            return None
+        first = self._heap[0][0][0]
+        blocking = [last for last in self.last.values() if "" < last < first]
+        sent = parse_timestamp(max(blocking) if blocking else first)
+        if sent is None:
+            return 0.0
+        return max(0.0, sent + self.window - time.time())
+
+    def close(self):
+        for tail in self.tails.values():
+            tail.close()
+        self.tails.clear()
+
+
+def make_tail(path, config, state=None):
+    """
+    LogTail (journal commun) ou MergedTail (journaux par écrivain) selon
+    journal_mode.
+    """
+    if per_writer(config):
+        return MergedTail(path, state=state, window=float(config.get("merge_window_ms", 250)) / 1000)
+    return LogTail(path, state=state)
+
+
+def writer_path(path, config, username):
+    """
+    Fichier où username écrit les messages du journal path.
+    """
+    return journal_path(path, username) if per_writer(config) else path
+
+
+def _journal_before(path, name, before, count):
+    """
+    Les count derniers messages du journal name dont la clé est < before
+    (remonte page par page).
+    """
+    found = []
+    position = None
+    while True:
+        page = read_before(path, position, count)
+        if not page:
+            break
+        keys = [(_key(name, pos, line), line) for pos, line in page]
+        found[:0] = [item for item in keys if before is None or item[0] < before]
+        if len(found) >= count or len(page) < count:
+            break
+        position = page[0][0]
+    return found[-count:]
+
+
+def read_history(path, config, position=None, count=100):
+    """
+    Équivalent de segments.read_before pour les deux modes : les count
+    messages qui précèdent position (None : les derniers), du plus ancien
+    au plus récent, sous forme de (position, ligne).
+    """
+    if not per_writer(config):
+        return read_before(path, position, count)
+    merged = []
+    for name, journal in list_journals(path).items():
+        if name == SHARED and not os.path.isfile(journal):
+            continue
+        merged += _journal_before(journal, name, position, count)
+    merged.sort()
+    return merged[-count:]
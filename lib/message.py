@@ -0,0 +1,114 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Analyse des lignes du chat, partagée par read.py et chat_gui.py.
+# Format : "<horodatage> - <expéditeur> : <texte>"
+# Chemin rapide par recherche de séparateurs et de préfixes, l'expression
+# régulière (précompilée) ne sert que pour les lignes atypiques ("–"...).
+import re
+import time
+from collections import namedtuple
+
+import metrics
+
+LINE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2} .*?) ?[–-] (.*?) : (.*)$")
+
+KIND_TEXT = "text"
+KIND_EXEC = "exec"              # @exec <dest> <commande>
+KIND_EXEC_REPLY = "exec_reply"  # [EXEC] Accepted/Refused command from <user>: ...
+KIND_FILE = "file"              # [FILE] Sent <fichier> to <dest>
+KIND_JOIN = "join"              # <user> joined the chat
+KIND_LEAVE = "leave"            # <user> left the chat
+
+PARSE_LINES = metrics.counter("parse_lines_total", "Lignes analysées par parse_lines")
+PARSE_SECONDS = metrics.counter("parse_seconds_total", "Temps passé dans parse_lines")
+
+# Sous-chaîne présente dans toute ligne d'un type donné (pré-filtre)
+KIND_MARKERS = {
+    KIND_EXEC: "@exec",
+    KIND_EXEC_REPLY: "[EXEC] ",
+    KIND_FILE: "[FILE] ",
+    KIND_JOIN: " joined the chat",
+    KIND_LEAVE: " left the chat",
+}
+
+
+class Message(namedtuple("Message", "timestamp sender kind body target arg")):
+    """
+    Message analysé.
+    body : texte complet ; target : destinataire (@exec, [FILE]) ou
+    expéditeur de la demande ([EXEC]) ; arg : commande ou nom de fichier.
+    """
+    __slots__ = ()
+
+
+_new = tuple.__new__  # construction directe, sans passer par Message.__new__
+
+
+def classify(timestamp, sender, body):
+    """
+    Détermine le type du message et ses champs target / arg.
+    """
+    first = body[:1]
+    if first == "@":
+        if body.startswith("@exec "):
+            parts = body.split(maxsplit=2)
+            if len(parts) == 3:
+                return _new(Message, (timestamp, sender, KIND_EXEC, body, parts[1], parts[2]))
+    elif first == "[":
+        if body.startswith("[FILE] Sent "):
+            filename, sep, dest = body[12:].rpartition(" to ")
+            if sep:
+                return _new(Message, (timestamp, sender, KIND_FILE, body, dest, filename))
+        elif body.startswith("[EXEC] "):
+            origin, sep, command = body.partition(": ")
+            if sep and " from " in origin:
+                return _new(Message, (timestamp, sender, KIND_EXEC_REPLY, body,
+                                      origin.rsplit(" from ", 1)[1], command))
+    elif body.endswith(" the chat"):
+        if body.endswith(" joined the chat"):
+            return _new(Message, (timestamp, sender, KIND_JOIN, body, None, None))
+        if body.endswith(" left the chat"):
+            return _new(Message, (timestamp, sender, KIND_LEAVE, body, None, None))
+    return _new(Message, (timestamp, sender, KIND_TEXT, body, None, None))
+
+
+def parse_line(line):
+    """
+    Analyse une ligne du chat. Retourne un Message, ou None si la ligne
+    n'a pas le format attendu.
+    """
+    i = line.find(" - ", 19)
+    if i > 0 and line[4:5] == "-":
+        j = line.find(" : ", i + 3)
+        if j > 0 and line[:4].isdigit():
+            return classify(line[:i], line[i + 3:j].strip(), line[j + 3:].strip())
+    m = LINE_RE.match(line)
+    if not m:
+        return None
+    return classify(m.group(1).strip(), m.group(2).strip(), m.group(3).strip())
+
+
+def parse_lines(lines, kinds=None):
+    """
+    Analyse un lot de lignes. Sans kinds, retourne un Message (ou None)
+    par ligne. Avec kinds (ensemble de types), seules les lignes pouvant
+    être de ces types sont analysées et seuls ces messages sont retournés.
+    """
+    start = time.perf_counter()
+    found = _parse_lines(lines, kinds)
+    PARSE_LINES.inc(len(lines))
+    PARSE_SECONDS.inc(time.perf_counter() - start)
+    return found
+
+
+def _parse_lines(lines, kinds):
+    if kinds is None:
+        return list(map(parse_line, lines))
+    if not all(kind in KIND_MARKERS for kind in kinds):
+        return [msg for msg in map(parse_line, lines) if msg is not None and msg.kind in kinds]
+    markers = [KIND_MARKERS[kind] for kind in kinds]
+    if len(markers) == 1:
+        marker = markers[0]
+        candidates = [line for line in lines if marker in line]
+    else:
+        candidates = [line for line in lines if any(m in line for m in markers)]
+    return [msg for msg in map(parse_line, candidates) if msg is not None and msg.kind in kinds]
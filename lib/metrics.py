@@ -0,0 +1,231 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Mesures internes (compteurs, histogrammes) et journal de diagnostic.
+# Les modules déclarent leurs mesures au chargement ; si "metrics_file"
+# est renseigné dans chat.json, un thread réécrit ce fichier toutes les
+# metrics_interval_s secondes au format texte Prometheus ou JSON
+# (par exemple pour le "textfile collector" de node_exporter).
+# Le journal "messagerie" (module logging) est coupé par défaut :
+# "log_level": "debug" / "info" / "warning" / "error" et "log_file".
+import os
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+
+LEVEL_OFF = logging.CRITICAL + 10
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 60.0)
+
+log = logging.getLogger("messagerie")
+log.setLevel(LEVEL_OFF)
+log.addHandler(logging.NullHandler())
+log.propagate = False
+
+_registry = {}
+_registry_lock = threading.Lock()
+_exporting = False
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """
+    Histogramme à seuils fixes (buckets, en secondes pour les durées).
+    """
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            running += n
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+
+def _get(cls, name, *args):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, *args)
+        return metric
+
+
+def counter(name, help_text):
+    return _get(Counter, name, help_text)
+
+
+def gauge(name, help_text):
+    return _get(Gauge, name, help_text)
+
+
+def histogram(name, help_text, buckets=LATENCY_BUCKETS):
+    return _get(Histogram, name, help_text, buckets)
+
+
+def exporting():
+    """
+    Vrai si les mesures sont exportées (pour sauter les mesures coûteuses sinon).
+    """
+    return _exporting
+
+
+def _labels(labels, extra=None):
+    items = dict(labels or {})
+    if extra:
+        items.update(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(34), "")}"' for k, v in items.items()) + "}"
+
+
+def prometheus_text(labels=None):
+    out = []
+    for metric in list(_registry.values()):
+        name = "messagerie_" + metric.name
+        out.append(f"# HELP {name} {metric.help}")
+        out.append(f"# TYPE {name} {metric.kind}")
+        data = metric.snapshot()
+        if metric.kind != "histogram":
+            out.append(f"{name}{_labels(labels)} {data}")
+            continue
+        for bound, n in data["buckets"]:
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            out.append(f"{name}_bucket{_labels(labels, {'le': le})} {n}")
+        out.append(f"{name}_sum{_labels(labels)} {data['sum']}")
+        out.append(f"{name}_count{_labels(labels)} {data['count']}")
+    return "\n".join(out) + "\n"
+
+
+def json_snapshot(labels=None):
+    values = {}
+    for metric in list(_registry.values()):
+        data = metric.snapshot()
+        if metric.kind == "histogram":
+            data = dict(data, buckets={("+Inf" if b == float("inf") else repr(b)): n for b, n in data["buckets"]})
+        values[metric.name] = data
+    return {"time": time.time(), "labels": dict(labels or {}), "metrics": values}
+
+
+class MetricsExporter:
+    """
+    Réécrit path (écriture atomique) toutes les interval secondes, et une
+    dernière fois à close().
+    """
+
+    def __init__(self, path, interval=10.0, fmt="prometheus", labels=None):
+        self.path = path
+        self.interval = interval
+        self.fmt = fmt
+        self.labels = labels or {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="MetricsExporter", daemon=True)
+
+    def start(self):
+        global _exporting
+        _exporting = True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._thread.start()
+        return self
+
+    def write(self):
+        if self.fmt == "json":
+            text = json.dumps(json_snapshot(self.labels), indent=1)
+        else:
+            text = prometheus_text(self.labels)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                log.warning("Écriture des mesures impossible : %s", e)
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(1.0)
+        try:
+            self.write()
+        except OSError as e:
+            log.warning("Écriture des mesures impossible : %s", e)
+
+
+def setup_logging(level="off", path=""):
+    """
+    Active le journal de diagnostic au niveau level (ou le coupe avec "off").
+    """
+    for handler in list(log.handlers):
+        if not isinstance(handler, logging.NullHandler):
+            log.removeHandler(handler)
+            handler.close()
+    level = str(level or "off").upper()
+    if level == "OFF":
+        log.setLevel(LEVEL_OFF)
+        return
+    handler = logging.FileHandler(os.path.expanduser(path), encoding='utf-8') if path else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(threadName)s : %(message)s"))
+    log.addHandler(handler)
+    log.setLevel(getattr(logging, level, logging.INFO))
+
+
+def setup(config, username="", client_name=""):
+    """
+    Journal et export des mesures selon chat.json. Retourne le
+    MetricsExporter démarré, ou None si "metrics_file" est vide.
+    metrics_file peut contenir {user}, {client} et {pid}.
+    """
+    setup_logging(config.get("log_level", "off"), config.get("log_file", ""))
+    template = config.get("metrics_file", "")
+    if not template:
+        return None
+    path = os.path.expanduser(template.format(user=username, client=client_name, pid=os.getpid()))
+    labels = {"user": username, "client": client_name}
+    return MetricsExporter(path, float(config.get("metrics_interval_s", 10)),
+                           config.get("metrics_format", "prometheus"), labels).start()
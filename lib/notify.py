@@ -0,0 +1,246 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Notification de changement pour les lecteurs (client.py).
+# - inotify (Linux, via ctypes) : réveil dès qu'un fichier surveillé change
+# - sondage à recul exponentiel : pour les partages réseau (SMB, NFS...)
+#   qui ne remontent pas les écritures des autres machines
+import os
+import sys
+import select
+import asyncio
+import threading
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# Systèmes de fichiers où inotify ne voit pas les écritures distantes
+REMOTE_FS = {
+    "cifs", "smb3", "smbfs", "nfs", "nfs4", "afs", "ncpfs", "9p", "ceph",
+    "glusterfs", "fuse.glusterfs", "fuse.sshfs", "lustre", "davfs", "fuse.davfs2",
+}
+
+
+def fs_type(path):
+    """
+    Retourne le type de système de fichiers qui contient path (Linux),
+    ou None s'il est inconnu.
+    """
+    try:
+        real = os.path.realpath(path)
+        best, best_type = "", None
+        with open("/proc/self/mounts", "r", encoding="utf-8") as f:
+            for entry in f:
+                fields = entry.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace("\\040", " ")
+                inside = real == mount_point or real.startswith(mount_point.rstrip("/") + "/")
+                if inside and len(mount_point) >= len(best):
+                    best, best_type = mount_point, fields[2]
+        return best_type
+    except OSError:
+        return None
+
+
+def supports_inotify(paths):
+    """
+    Vrai si tous les chemins sont sur un système de fichiers local Linux.
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    for path in paths:
+        if path.startswith("//") or path.startswith("\\\\"):
+            return False
+        kind = fs_type(path)
+        if kind is None or kind in REMOTE_FS:
+            return False
+    return True
+
+
+class PollWatcher:
+    """
+    Attente par sondage : le délai double à chaque tour sans activité
+    (de min_interval jusqu'à max_interval) et revient au minimum dès
+    qu'une ligne arrive (activity()).
+    """
+
+    def __init__(self, min_interval=0.05, max_interval=2.0):
+        self.min_interval = float(min_interval)
+        self.max_interval = max(float(max_interval), self.min_interval)
+        self.delay = self.min_interval
+        self._wake = threading.Event()
+
+    def wait(self, timeout=None):
+        delay = self.delay if timeout is None else min(self.delay, timeout)
+        woken = self._wake.wait(delay)
+        self._wake.clear()
+        self.delay = min(self.delay * 2, self.max_interval)
+        return woken
+
+    def activity(self):
+        self.delay = self.min_interval
+
+    def add_path(self, path):
+        pass  # le sondage ne dépend pas des dossiers
+
+    def wake(self):
+        self._wake.set()
+
+    def close(self):
+        self.wake()
+
+
+class InotifyWatcher:
+    """
+    Attente sur inotify (dossiers surveillés) : wait() rend la main dès
+    qu'un fichier du dossier est modifié, créé ou renommé.
+    max_wait borne l'attente pour une vérification de sécurité.
+    """
+
+    def __init__(self, paths, max_wait=2.0):
+        import ctypes
+        import ctypes.util
+
+        self.max_wait = float(max_wait)
+        self._libc = libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        try:
+            for path in paths:
+                self.add_path(path)
+            self._pipe_r, self._pipe_w = os.pipe()
+        except OSError:
+            os.close(self._fd)
+            raise
+        os.set_blocking(self._pipe_r, False)
+
+    def add_path(self, path):
+        """
+        Surveille aussi le dossier path (lève OSError si impossible).
+        """
+        import ctypes
+
+        if self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK) < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+
+    def fileno(self):
+        return self._fd
+
+    def wait(self, timeout=None):
+        timeout = self.max_wait if timeout is None else min(timeout, self.max_wait)
+        ready, _, _ = select.select([self._fd, self._pipe_r], [], [], timeout)
+        for fd in ready:
+            self._drain(fd)
+        return bool(ready)
+
+    def _drain(self, fd):
+        try:
+            while os.read(fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def activity(self):
+        pass
+
+    def wake(self):
+        try:
+            os.write(self._pipe_w, b"\0")
+        except OSError:
+            pass
+
+    def close(self):
+        for fd in (self._fd, self._pipe_r, self._pipe_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def make_watcher(paths, mode="auto", min_interval=0.05, max_interval=2.0):
+    """
+    Choisit le backend de notification pour les dossiers paths.
+    mode : "auto" (inotify si possible, sinon sondage), "inotify" ou "poll".
+    """
+    paths = [p for p in paths if p]
+    if mode == "inotify" or (mode == "auto" and supports_inotify(paths)):
+        try:
+            return InotifyWatcher(paths, max_wait=max_interval)
+        except (OSError, AttributeError):
+            if mode == "inotify":
+                raise
+    return PollWatcher(min_interval, max_interval)
+
+
+class AsyncWatcher:
+    """
+    Version asyncio de make_watcher : wait() est une coroutine. inotify est
+    branché sur la boucle (add_reader), le sondage garde son recul
+    exponentiel, et wake() peut être appelé depuis n'importe quel thread.
+    À créer depuis la boucle qui l'utilise.
+    """
+
+    def __init__(self, paths, mode="auto", min_interval=0.05, max_interval=2.0):
+        self._watcher = make_watcher(paths, mode, min_interval, max_interval)
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self._inotify = isinstance(self._watcher, InotifyWatcher)
+        if self._inotify:
+            try:
+                self._loop.add_reader(self._watcher.fileno(), self._on_inotify)
+            except NotImplementedError:
+                self._inotify = False   # boucle sans add_reader (Proactor)
+
+    def add_path(self, path):
+        """
+        Ajoute un dossier à surveiller (salon rejoint après le démarrage...).
+        Sans inotify possible sur ce dossier, le sondage de sécurité
+        (max_interval) le couvre quand même.
+        """
+        try:
+            self._watcher.add_path(path)
+        except OSError:
+            pass
+
+    def _on_inotify(self):
+        self._watcher._drain(self._watcher.fileno())
+        self._event.set()
+
+    async def wait(self, timeout=None):
+        if self._inotify:
+            delay = self._watcher.max_wait
+        elif isinstance(self._watcher, PollWatcher):
+            delay = self._watcher.delay
+            self._watcher.delay = min(delay * 2, self._watcher.max_interval)
+        else:
+            delay = self._watcher.max_wait
+        if timeout is not None:
+            delay = min(delay, timeout)
+        # minuterie plutôt que wait_for : une annulation n'est jamais perdue
+        timer = self._loop.call_later(delay, self._event.set)
+        try:
+            await self._event.wait()
+        finally:
+            timer.cancel()
+        self._event.clear()
+
+    def activity(self):
+        self._watcher.activity()
+
+    def wake(self):
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            pass  # boucle déjà fermée
+
+    def close(self):
+        if self._inotify:
+            self._loop.remove_reader(self._watcher.fileno())
+        self._watcher.close()
@@ -0,0 +1,121 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Présence : qui est connecté, tenu à jour message par message.
+# - "X joined the chat" / "X left the chat" (salon general) ;
+# - tout message d'un utilisateur compte comme une activité ;
+# - chaque client écrit un battement de cœur toutes les
+#   presence_heartbeat_s secondes dans le journal caché channels.PRESENCE
+#   (channels/.presence.log) : un client arrêté sans "left" (plantage,
+#   coupure) passe hors ligne après presence_timeout_s sans nouvelle.
+# L'état (dernier horodatage et en ligne / parti par utilisateur) est
+# enregistré avec le point de reprise du lecteur : au démarrage, rien
+# n'est relu, sauf sans point de reprise (derniers messages seulement).
+import time
+
+from format import parse_timestamp
+from message import parse_line
+
+HEARTBEAT = "heartbeat"
+BOOTSTRAP = 500             # messages relus sans point de reprise
+
+ONLINE = "online"
+OFFLINE = "offline"
+_LEFT = " left the chat"
+
+
+def _fields(line):
+    """
+    (horodatage, expéditeur, texte) d'une ligne, None si elle n'a pas le
+    format du chat. Même chemin rapide que message.parse_line.
+    """
+    i = line.find(" - ", 19)
+    if i > 0 and line[4:5] == "-":
+        j = line.find(" : ", i + 3)
+        if j > 0 and line[:4].isdigit():
+            return line[:i], line[i + 3:j].strip(), line[j + 3:]
+    msg = parse_line(line)
+    return None if msg is None else (msg.timestamp, msg.sender, msg.body)
+
+
+class Roster:
+    """
+    Présence des utilisateurs : observe() en O(1) par message.
+    users : {nom: [dernier_horodatage, connecté]} (horodatages texte de
+    format_time, comparables comme des chaînes).
+    """
+
+    def __init__(self, timeout=180.0, snapshot=None):
+        self.timeout = float(timeout)
+        self.users = {}
+        self._epochs = {}    # nom -> (horodatage texte, epoch) : dernier calculé
+        for name, entry in (snapshot or {}).items():
+            if isinstance(entry, list) and len(entry) == 2:
+                self.users[name] = [str(entry[0]), bool(entry[1])]
+
+    def observe(self, line):
+        fields = _fields(line)
+        if fields is None:
+            return
+        timestamp, sender, body = fields
+        entry = self.users.get(sender)
+        if entry is None:
+            entry = self.users[sender] = ["", False]
+        elif timestamp < entry[0]:
+            return  # message en retard : l'état connu est plus récent
+        entry[0] = timestamp
+        entry[1] = body.rstrip() != sender + _LEFT
+
+    def observe_lines(self, lines):
+        for line in lines:
+            self.observe(line)
+
+    def snapshot(self):
+        return {name: list(entry) for name, entry in self.users.items()}
+
+    def _epoch(self, name, timestamp):
+        cached = self._epochs.get(name)
+        if cached is None or cached[0] != timestamp:
+            cached = self._epochs[name] = (timestamp, parse_timestamp(timestamp))
+        return cached[1]
+
+    def roster(self, now=None):
+        """
+        Liste de (nom, ONLINE ou OFFLINE, dernière activité en epoch ou
+        None) : connectés d'abord, puis les plus récemment vus.
+        """
+        now = time.time() if now is None else now
+        result = []
+        for name, (timestamp, connected) in self.users.items():
+            seen = self._epoch(name, timestamp)
+            online = connected and seen is not None and now - seen < self.timeout
+            result.append((name, ONLINE if online else OFFLINE, seen))
+        result.sort(key=lambda item: (item[1] != ONLINE, -(item[2] or 0), item[0]))
+        return result
+
+    def online(self, now=None):
+        return frozenset(name for name, status, _ in self.roster(now) if status == ONLINE)
+
+    def next_expiry(self, now=None):
+        """
+        Secondes avant qu'un utilisateur connecté passe hors ligne faute de
+        nouvelles (None s'il n'y en a pas).
+        """
+        now = time.time() if now is None else now
+        delays = []
+        for name, (timestamp, connected) in self.users.items():
+            seen = self._epoch(name, timestamp) if connected else None
+            if seen is not None and now - seen < self.timeout:
+                delays.append(seen + self.timeout - now)
+        return min(delays) if delays else None
+
+
+def format_roster(roster):
+    """
+    Texte de @who : une ligne par utilisateur.
+    """
+    if not roster:
+        return "Personne pour l'instant."
+    lines = []
+    for name, status, seen in roster:
+        when = time.strftime("%d/%m %H:%M", time.localtime(seen)) if seen else "?"
+        lines.append(f"  {name} : en ligne" if status == ONLINE else f"  {name} : absent (vu le {when})")
+    return "\n".join(lines)
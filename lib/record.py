@@ -0,0 +1,228 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Format binaire optionnel du journal ("log_format": "binary" dans chat.json).
+# Chaque enregistrement :
+#   en-tête  magic(2) flags(1) type(1) longueur(4) crc32(4) horodatage(8) len_expéditeur(2)
+#   puis     expéditeur (utf-8) et texte (utf-8, compressé zlib si utile)
+# La longueur permet de sauter un enregistrement sans le décoder, le CRC
+# de le valider, et le texte peut contenir des retours à la ligne.
+import os
+import sys
+import time
+import zlib
+import struct
+
+from format import format_msg, format_time, parse_timestamp
+from compression import open_read
+from message import (
+    parse_line, classify, KIND_TEXT, KIND_EXEC, KIND_EXEC_REPLY, KIND_FILE, KIND_JOIN, KIND_LEAVE,
+)
+
+MAGIC = b"\xabM"
+HEADER = struct.Struct("<2sBBIIdH")
+FLAG_ZLIB = 0x01
+COMPRESS_MIN = 256          # en dessous, zlib ne fait rien gagner
+MAX_RECORD = 16 * 1024 * 1024
+
+KIND_CODES = {KIND_TEXT: 0, KIND_EXEC: 1, KIND_EXEC_REPLY: 2, KIND_FILE: 3, KIND_JOIN: 4, KIND_LEAVE: 5}
+
+
+def _crc(kind_code, timestamp, sender, payload):
+    return zlib.crc32(payload, zlib.crc32(sender, zlib.crc32(struct.pack("<Bd", kind_code, timestamp))))
+
+
+def encode_record(username, text, timestamp=None):
+    """
+    Encode un message en enregistrement binaire.
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    kind = classify("", username, text).kind
+    code = KIND_CODES.get(kind, 0)
+    sender = username.encode("utf-8")
+    payload = text.encode("utf-8")
+    flags = 0
+    if len(payload) >= COMPRESS_MIN:
+        packed = zlib.compress(payload, 6)
+        if len(packed) < len(payload):
+            payload, flags = packed, FLAG_ZLIB
+    header = HEADER.pack(MAGIC, flags, code, len(payload), _crc(code, timestamp, sender, payload),
+                         timestamp, len(sender))
+    return header + sender + payload
+
+
+def _valid_at(data, pos):
+    """
+    Vrai si data contient à pos un enregistrement complet et valide (CRC).
+    """
+    if len(data) - pos < HEADER.size:
+        return False
+    magic, _, code, length, crc, timestamp, sender_len = HEADER.unpack_from(data, pos)
+    end = pos + HEADER.size + sender_len + length
+    if magic != MAGIC or length > MAX_RECORD or end > len(data):
+        return False
+    start = pos + HEADER.size
+    return _crc(code, timestamp, data[start:start + sender_len], data[start + sender_len:end]) == crc
+
+
+def _next_valid(data, start):
+    """
+    Position du prochain enregistrement valide de data à partir de start,
+    None s'il n'y en a pas.
+    """
+    pos = data.find(MAGIC, start)
+    while pos >= 0:
+        if _valid_at(data, pos):
+            return pos
+        pos = data.find(MAGIC, pos + 1)
+    return None
+
+
+def decode_records(data, base=0, final=False):
+    """
+    Décode les enregistrements complets de data (bytes lus à la position
+    base du fichier). Un enregistrement invalide (CRC, magic) est sauté
+    et la lecture se resynchronise sur le magic suivant. Un en-tête dont
+    la longueur dépasse data n'est attendu que si rien de valide ne le
+    suit et que le fichier peut encore grandir (sinon final) : une
+    écriture interrompue ne bloque pas la lecture de la suite.
+    Retourne (liste de (position, ligne_texte), octets_consommés, erreurs).
+    La ligne texte a le format habituel "<date> - <user> : <texte>".
+    """
+    entries = []
+    errors = 0
+    pos = 0
+    size = len(data)
+    while size - pos >= HEADER.size:
+        magic, flags, code, length, crc, timestamp, sender_len = HEADER.unpack_from(data, pos)
+        if magic != MAGIC or length > MAX_RECORD:
+            errors += 1
+            nxt = data.find(MAGIC, pos + 1)
+            pos = nxt if nxt >= 0 else max(pos + 1, size - 1)
+            continue
+        end = pos + HEADER.size + sender_len + length
+        if end > size:
+            nxt = _next_valid(data, pos + 1)
+            if nxt is None and not final:
+                break  # enregistrement incomplet : on attend la suite
+            errors += 1
+            pos = size if nxt is None else nxt
+            continue
+        start = pos + HEADER.size
+        sender = data[start:start + sender_len]
+        payload = data[start + sender_len:end]
+        if _crc(code, timestamp, sender, payload) != crc:
+            errors += 1
+            nxt = data.find(MAGIC, pos + 1)
+            pos = nxt if nxt >= 0 else max(pos + 1, size - 1)
+            continue
+        if flags & FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        text = payload.decode("utf-8", errors="replace")
+        username = sender.decode("utf-8", errors="replace")
+        entries.append((base + pos, f"{format_time(timestamp)} - {username} : {text}"))
+        pos = end
+    return entries, pos, errors
+
+
+def is_binary(path):
+    """
+    Vrai si le fichier commence par un enregistrement binaire, None s'il
+    est vide (format pas encore décidé).
+    """
+    try:
+        with open_read(path) as f:
+            head = f.read(len(MAGIC))
+    except OSError:
+        return None
+    if not head:
+        return None
+    return head == MAGIC
+
+
+def read_new_records(file_obj, last_pos):
+    """
+    Équivalent binaire de format.read_new_lines : retourne les lignes
+    texte des enregistrements complets ajoutés depuis last_pos.
+    """
+    file_obj.seek(last_pos)
+    data = file_obj.read()
+    entries, consumed, _ = decode_records(data, last_pos)
+    return [line for _, line in entries], last_pos + consumed
+
+
+def encode_message(log_format, username, text, timestamp=None):
+    """
+    Message prêt à écrire dans le journal, au format demandé
+    ("text" ou "binary").
+    """
+    if log_format == "binary":
+        return encode_record(username, text, timestamp)
+    return format_msg(username, text, timestamp).encode("utf-8")
+
+
+def first_timestamp(path):
+    """
+    Horodatage (epoch) du premier enregistrement d'un journal binaire.
+    """
+    with open_read(path) as f:
+        head = f.read(HEADER.size)
+    if len(head) < HEADER.size:
+        return None
+    magic, _, _, _, _, timestamp, _ = HEADER.unpack(head)
+    return timestamp if magic == MAGIC else None
+
+
+# ---------------------- Conversion ----------------------
+
+def text_to_binary(src_path, dest_path):
+    """
+    Convertit un journal texte en journal binaire. Retourne le nombre
+    d'enregistrements écrits (les lignes illisibles sont gardées en texte
+    avec l'expéditeur vide).
+    """
+    count = 0
+    with open(src_path, 'r', encoding='utf-8', errors='replace') as src, open(dest_path, 'wb') as dst:
+        for line in src:
+            line = line.rstrip("\r\n")
+            msg = parse_line(line)
+            if msg is None:
+                dst.write(encode_record("", line))
+            else:
+                timestamp = parse_timestamp(msg.timestamp) or 0.0
+                dst.write(encode_record(msg.sender, msg.body, timestamp))
+            count += 1
+    return count
+
+
+def binary_to_text(src_path, dest_path):
+    """
+    Convertit un journal binaire en journal texte. Retourne
+    (enregistrements, erreurs).
+    """
+    with open(src_path, 'rb') as src:
+        entries, _, errors = decode_records(src.read(), final=True)
+    with open(dest_path, 'w', encoding='utf-8', newline='\n') as dst:
+        for _, line in entries:
+            dst.write(line + "\n")
+    return len(entries), errors
+
+
+def main():
+    # python record.py to-binary|to-text <source> <destination>
+    if len(sys.argv) != 4 or sys.argv[1] not in ("to-binary", "to-text"):
+        print("Usage : python record.py to-binary|to-text <source> <destination>")
+        return 1
+    _, action, src, dest = sys.argv
+    if not os.path.isfile(src):
+        print(f"[ERREUR] Fichier introuvable : {src}")
+        return 1
+    if action == "to-binary":
+        print(f"[OK] {text_to_binary(src, dest)} enregistrements écrits")
+    else:
+        count, errors = binary_to_text(src, dest)
+        print(f"[OK] {count} lignes écrites, {errors} enregistrements invalides ignorés")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Transport "relay" ("transport": "relay" dans chat.json) : petit serveur
+# pub/sub asyncio sur TCP. Les clients s'y connectent au lieu de sonder le
+# fichier partagé ; chaque message est poussé aussitôt aux abonnés de son
+# salon (voir channels.py) et peut aussi être écrit dans le journal du
+# salon (relay_persist).
+# Protocole : une trame JSON par ligne.
+#   client -> serveur : {"op": "sub", "channels": [...]}   {"op": "unsub", "channels": [...]}
+#                       {"op": "pub", "channel": ..., "user": ..., "text": ...}
+#   serveur -> client : {"op": "msg", "channel": ..., "line": "<date> - <user> : <texte>"}
+# Lancement : python relay.py [--no-persist] (sans journal, même si relay_persist)
+import sys
+import json
+import time
+import socket
+import asyncio
+import threading
+from collections import deque
+
+import metrics
+from format import format_msg
+from channels import GENERAL, valid_channel
+
+MAX_FRAME = 16 * 1024 * 1024        # taille maximale d'une trame
+MAX_CLIENT_BUFFER = 1024 * 1024     # au-delà, l'abonné trop lent est déconnecté
+RECONNECT_MIN = 0.5                 # attente avant de se reconnecter, doublée à chaque échec
+RECONNECT_MAX = 30.0
+MAX_BACKLOG = 10000                 # trames gardées pendant une reconnexion
+
+
+def _frame(obj):
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class RelayServer:
+    """
+    Serveur de diffusion : chaque message publié est horodaté, écrit dans
+    le journal de son salon si writer (channels.ChannelWriter) est donné,
+    puis envoyé aux abonnés du salon (trame encodée une seule fois). Un
+    journal inaccessible n'empêche pas la diffusion.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, writer=None):
+        self.host = host
+        self.port = port
+        self.writer = writer
+        self.subscribers = {}   # salon -> ensemble des transports abonnés
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_FRAME)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def publish(self, username, text, channel=GENERAL):
+        timestamp = time.time()
+        if self.writer is not None:
+            try:
+                self.writer.post(username, text, channel, timestamp)
+            except OSError as e:
+                metrics.log.warning("Message non écrit dans le journal de #%s : %s", channel, e)
+        subscribers = self.subscribers.get(channel)
+        if not subscribers:
+            return
+        frame = _frame({"op": "msg", "channel": channel, "line": format_msg(username, text, timestamp)[:-1]})
+        for transport in list(subscribers):
+            if transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                self._drop(transport)
+                transport.close()
+            else:
+                transport.write(frame)
+
+    def _drop(self, transport):
+        for subscribers in self.subscribers.values():
+            subscribers.discard(transport)
+
+    async def _handle(self, reader, writer):
+        transport = writer.transport
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                data = await reader.readline()
+                if not data:
+                    break
+                try:
+                    frame = json.loads(data)
+                except ValueError:
+                    continue
+                if not isinstance(frame, dict):
+                    continue
+                op = frame.get("op")
+                if op == "pub":
+                    channel = frame.get("channel", GENERAL)
+                    if isinstance(channel, str) and valid_channel(channel):
+                        self.publish(str(frame.get("user", "")), str(frame.get("text", "")), channel)
+                elif op in ("sub", "unsub"):
+                    channels = frame.get("channels", [GENERAL] if op == "sub" else [])
+                    if not isinstance(channels, list):
+                        continue
+                    for channel in channels:
+                        if not (isinstance(channel, str) and valid_channel(channel)):
+                            continue
+                        if op == "sub":
+                            self.subscribers.setdefault(channel, set()).add(transport)
+                        else:
+                            self.subscribers.get(channel, set()).discard(transport)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self._drop(transport)
+            writer.close()
+
+
+class RelayClient:
+    """
+    Connexion à un RelayServer. S'utilise comme un écrivain (post, flush,
+    close) et, abonnée à des salons (channels), comme un lecteur
+    (read_messages, read_lines) : un thread met les messages reçus en file
+    et appelle on_message() à chaque arrivée (réveil du lecteur).
+    post() ne bloque pas : les trames partent d'un thread d'envoi.
+    Connexion perdue : connected passe à False (on_message est appelé),
+    le thread de lecture se reconnecte et se réabonne ; les messages
+    publiés entre-temps ne sont pas reçus (ils restent dans le journal avec
+    relay_persist). Les envois attendent la reconnexion (MAX_BACKLOG
+    trames au plus).
+    """
+    resume_status = "relay"
+
+    def __init__(self, host="127.0.0.1", port=8765, channels=None, on_message=None, timeout=5.0):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.sock = self._connect()
+        self.on_message = on_message
+        self.connected = True
+        self.channels = set()
+        self._lines = deque()
+        self._out = deque()      # trames à envoyer, dans l'ordre
+        self._cond = threading.Condition()
+        self._closed = False
+        if channels:
+            self.subscribe(channels)
+        self._sender = threading.Thread(target=self._send_loop, name="RelaySend", daemon=True)
+        self._sender.start()
+        self._thread = threading.Thread(target=self._run, name="RelayClient", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, self.timeout)
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _send(self, obj):
+        data = _frame(obj)
+        with self._cond:
+            if len(self._out) >= MAX_BACKLOG:
+                raise OSError("Relais injoignable : trop de messages en attente")
+            self._out.append(data)
+            self._cond.notify_all()
+
+    def _send_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and not (self._out and self.connected):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                data, sock = self._out[0], self.sock
+            try:
+                sock.sendall(data)
+            except OSError:
+                self._lost(sock)
+                continue
+            with self._cond:
+                for i, item in enumerate(self._out):
+                    if item is data:
+                        del self._out[i]
+                        break
+                self._cond.notify_all()
+
+    def _lost(self, sock):
+        # le thread de lecture voit la connexion fermée et se reconnecte
+        with self._cond:
+            if sock is self.sock:
+                self.connected = False
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def subscribe(self, channels):
+        self.channels.update(channels)
+        self._send({"op": "sub", "channels": list(channels)})
+
+    def unsubscribe(self, channels):
+        self.channels.difference_update(channels)
+        self._send({"op": "unsub", "channels": list(channels)})
+
+    def post(self, username, text, channel=GENERAL):
+        """
+        Publie le message text de username dans channel, sans attendre
+        l'envoi (lève OSError si trop de messages attendent la reconnexion).
+        """
+        self._send({"op": "pub", "channel": channel, "user": username, "text": text})
+
+    def flush(self, timeout=5.0):
+        """
+        Attend (au plus timeout secondes) que les trames en attente soient
+        envoyées, sauf si la connexion est perdue.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: not self._out or not self.connected or self._closed, timeout)
+
+    def _run(self):
+        delay = RECONNECT_MIN
+        while not self._closed:
+            self._receive(self.sock)
+            if self._closed:
+                break
+            with self._cond:
+                self.connected = False
+                self._cond.notify_all()
+            if self.on_message:
+                self.on_message()
+            while not self._closed:
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+                try:
+                    sock = self._connect()
+                except OSError:
+                    continue
+                with self._cond:
+                    old, self.sock = self.sock, sock
+                    old.close()
+                    self._out.appendleft(_frame({"op": "sub", "channels": sorted(self.channels)}))
+                    self.connected = True
+                    self._cond.notify_all()
+                metrics.log.info("Reconnecté au relais %s:%s", *self.address)
+                delay = RECONNECT_MIN
+                if self.on_message:
+                    self.on_message()
+                break
+
+    def _receive(self, sock):
+        try:
+            with sock.makefile('rb') as stream:
+                for raw in stream:
+                    try:
+                        frame = json.loads(raw)
+                    except ValueError:
+                        continue
+                    if not isinstance(frame, dict) or frame.get("op") != "msg":
+                        continue
+                    channel, line = frame.get("channel", GENERAL), frame.get("line")
+                    if isinstance(channel, str) and isinstance(line, str):
+                        self._lines.append((channel, line))
+                        if self.on_message:
+                            self.on_message()
+        except (OSError, ValueError):
+            pass
+
+    def read_messages(self):
+        """
+        Messages reçus depuis le dernier appel : liste de (salon, ligne).
+        """
+        lines = self._lines
+        return [lines.popleft() for _ in range(len(lines))]
+
+    def read_lines(self):
+        return [line for _, line in self.read_messages()]
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush(2.0)  # laisse partir les derniers messages (départ du salon)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self._sender.join(1.0)
+        self._thread.join(1.0)
+
+
+def connect(config, channels=None, on_message=None):
+    """
+    Ouvre une connexion au serveur relais décrit dans chat.json, abonnée
+    aux salons channels s'il y en a.
+    """
+    return RelayClient(config["relay_host"], int(config["relay_port"]), channels, on_message)
+
+
+def main():
+    from config import get_config
+    from channels import ChannelWriter
+
+    config = get_config()
+    writer = None
+    if config["relay_persist"] and "--no-persist" not in sys.argv[1:]:
+        writer = ChannelWriter(config["shared_file"], config)
+    server = RelayServer(config["relay_host"], int(config["relay_port"]), writer)
+    print(f"[INFO] Relais en écoute sur {config['relay_host']}:{config['relay_port']}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if writer is not None:
+            writer.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
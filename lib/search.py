@@ -0,0 +1,393 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Recherche dans l'historique du chat : index inversé sur disque (sqlite3,
+# fourni avec Python), tenu à jour au fil de l'eau.
+#   messages : un message = (journal, segment, position) + date, expéditeur, type
+#   postings : mot -> messages qui le contiennent
+#   sources  : position déjà indexée dans chaque journal
+#   indexer  : bail du client qui indexe (un seul par utilisateur)
+# Le texte n'est pas recopié : les résultats sont relus dans le journal à
+# leur position. L'index est local (state_dir/index-<user>.sqlite) : il
+# couvre general, les salons publics et la boîte de réception de l'utilisateur.
+# Requête : mots (ET), "mot*" (préfixe), from:<user>, kind:<type>, in:#salon
+#   ex. "kind:file rapport"   "from:alice kind:exec"   "in:#dev deploy*"
+# Usage : python search.py <utilisateur> <requête...>
+import os
+import re
+import sys
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+
+import metrics
+from message import parse_line, KIND_TEXT, KIND_EXEC, KIND_EXEC_REPLY, KIND_FILE, KIND_JOIN, KIND_LEAVE
+from segments import list_segments, segment_path, iter_messages, read_message_at
+from compression import data_size
+from channels import GENERAL, CHANNELS_DIR, channel_path, channel_name, inbox
+from journal import list_journals, per_writer, SHARED
+
+Hit = namedtuple("Hit", "timestamp channel sender kind line")
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_TOKEN = 64
+BATCH = 20000               # messages indexés par transaction
+RARE = 5000                 # en dessous, un mot mène la recherche par ses postings
+MAX_EXPAND = 200            # mots au plus pour un préfixe "mot*"
+LEASE = 60.0                # bail de l'indexeur, renouvelé à chaque tour
+KIND_ALIASES = {
+    "text": KIND_TEXT, "exec": KIND_EXEC, "result": KIND_EXEC_REPLY, "reply": KIND_EXEC_REPLY,
+    KIND_EXEC_REPLY: KIND_EXEC_REPLY, "file": KIND_FILE, "join": KIND_JOIN, "leave": KIND_LEAVE,
+}
+
+SEARCH_SECONDS = metrics.histogram("search_seconds", "Durée d'une recherche")
+INDEXED = metrics.counter("search_indexed_total", "Messages ajoutés à l'index de recherche")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL, segment INTEGER NOT NULL, offset INTEGER NOT NULL,
+    channel TEXT NOT NULL, timestamp TEXT NOT NULL, sender TEXT NOT NULL COLLATE NOCASE, kind TEXT NOT NULL,
+    UNIQUE (source, segment, offset)
+);
+CREATE INDEX IF NOT EXISTS messages_time ON messages (timestamp);
+CREATE INDEX IF NOT EXISTS messages_sender ON messages (sender, timestamp);
+CREATE INDEX IF NOT EXISTS messages_kind ON messages (kind, timestamp);
+CREATE TABLE IF NOT EXISTS postings (
+    token TEXT NOT NULL, msg INTEGER NOT NULL, PRIMARY KEY (token, msg)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY, segment INTEGER NOT NULL, offset INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS indexer (
+    id INTEGER PRIMARY KEY CHECK (id = 1), owner TEXT NOT NULL, expires REAL NOT NULL
+);
+"""
+
+
+def tokens(msg):
+    """
+    Mots indexés d'un message (minuscules) ; pour [FILE], le nom de
+    fichier complet aussi.
+    """
+    words = {w for w in TOKEN_RE.findall(msg.body.lower()) if len(w) <= MAX_TOKEN}
+    if msg.kind == KIND_FILE and len(msg.arg) <= MAX_TOKEN:
+        words.add(msg.arg.lower())
+    return words
+
+
+def index_path(config, username):
+    return os.path.join(os.path.expanduser(config["state_dir"]), f"index-{username}.sqlite")
+
+
+def search_sources(shared_file, config, username):
+    """
+    Journaux à indexer : {source: (salon, chemin)} ; source est le chemin
+    relatif au dossier du journal commun.
+    """
+    folder = os.path.dirname(os.path.abspath(shared_file))
+    ext = os.path.splitext(shared_file)[1] or ".log"
+    channels = [GENERAL, inbox(username)]
+    segment = re.compile(r"\.\d{6}" + re.escape(ext) + "$")
+    try:
+        names = os.listdir(os.path.join(folder, CHANNELS_DIR))
+    except OSError:
+        names = []
+    for name in sorted(names):
+        if name.endswith(ext) and not segment.search(name):
+            try:
+                channels.append(channel_name(name[:-len(ext)]))
+            except ValueError:
+                pass
+    sources = {}
+    for channel in channels:
+        base = channel_path(shared_file, channel)
+        journals = list_journals(base) if per_writer(config) else {SHARED: base}
+        for path in journals.values():
+            if os.path.isfile(path):
+                sources[os.path.relpath(os.path.abspath(path), folder)] = (channel, path)
+    return sources
+
+
+def parse_query(query):
+    """
+    Retourne (mots, préfixes, expéditeur, type, salon).
+    Lève ValueError pour un type inconnu.
+    """
+    words, prefixes = [], []
+    sender = kind = channel = None
+    for part in query.split():
+        field, sep, value = part.partition(":")
+        if sep and value and field == "from":
+            sender = value
+        elif sep and value and field == "kind":
+            if value.lower() not in KIND_ALIASES:
+                raise ValueError(f"Type inconnu : {value} ({', '.join(sorted(KIND_ALIASES))})")
+            kind = KIND_ALIASES[value.lower()]
+        elif sep and value and field == "in":
+            channel = inbox(value[1:]) if value.startswith("@") else channel_name(value)
+        else:
+            found = TOKEN_RE.findall(part.lower())
+            if found and part.endswith("*"):
+                prefixes.append(found.pop())
+            words += found
+    return words, prefixes, sender, kind, channel
+
+
+class SearchIndex:
+    """
+    Index de recherche de shared_file dans la base sqlite path.
+    update() indexe les messages ajoutés depuis le dernier appel,
+    search() répond à une requête. Une instance par thread.
+    """
+
+    def __init__(self, path, shared_file):
+        self.path = path
+        self.shared_file = shared_file
+        self.root = os.path.dirname(os.path.abspath(shared_file))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def update(self, sources, budget=BATCH):
+        """
+        Indexe au plus budget nouveaux messages des sources
+        (voir search_sources). Retourne le nombre de messages lus.
+        """
+        db = self.db
+        state = {row[0]: (row[1], row[2]) for row in db.execute("SELECT source, segment, offset FROM sources")}
+        count = 0
+        with db:
+            for source, (channel, base) in sources.items():
+                done_segment, done_offset = state.get(source, (0, 0))
+                for number, path in list_segments(base):
+                    if number < done_segment or count >= budget:
+                        continue
+                    offset = done_offset if number == done_segment else 0
+                    try:
+                        if data_size(path) < offset:
+                            # segment tronqué ou remplacé : on le réindexe
+                            self._forget(source, number)
+                            offset = 0
+                        for start, end, line in iter_messages(path, offset):
+                            self._add(source, number, start, channel, line)
+                            offset = end
+                            count += 1
+                            if count >= budget:
+                                break
+                    except OSError:
+                        break
+                    done_segment, done_offset = number, offset
+                    db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)", (source, number, offset))
+        return count
+
+    def claim(self, owner, lease=LEASE):
+        """
+        Prend ou renouvelle le bail d'indexation pour owner. Faux si un
+        autre client (chat, read, gui du même utilisateur) le détient
+        encore : il indexe déjà, inutile de refaire le travail.
+        """
+        now = time.time()
+        with self.db:
+            cur = self.db.execute(
+                "INSERT INTO indexer VALUES (1, ?, ?) ON CONFLICT (id) DO UPDATE "
+                "SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE indexer.owner = excluded.owner OR indexer.expires < ?", (owner, now + lease, now))
+        return cur.rowcount == 1
+
+    def release(self, owner):
+        with self.db:
+            self.db.execute("DELETE FROM indexer WHERE owner = ?", (owner,))
+
+    def _add(self, source, segment, offset, channel, line):
+        msg = parse_line(line)
+        if msg is None:
+            return
+        cur = self.db.execute(
+            "INSERT OR IGNORE INTO messages (source, segment, offset, channel, timestamp, sender, kind) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (source, segment, offset, channel, msg.timestamp, msg.sender, msg.kind))
+        if cur.rowcount != 1:
+            return  # déjà indexé (autre client du même utilisateur)
+        msg_id = cur.lastrowid
+        self.db.executemany("INSERT OR IGNORE INTO postings VALUES (?, ?)",
+                            [(word, msg_id) for word in tokens(msg)])
+        INDEXED.inc()
+
+    def _forget(self, source, segment):
+        self.db.execute("DELETE FROM postings WHERE msg IN "
+                        "(SELECT id FROM messages WHERE source = ? AND segment >= ?)", (source, segment))
+        self.db.execute("DELETE FROM messages WHERE source = ? AND segment >= ?", (source, segment))
+
+    def _expand(self, prefix):
+        """
+        Mots de l'index qui commencent par prefix (au plus MAX_EXPAND),
+        trouvés par sauts dans l'index des postings.
+        """
+        found = []
+        token, end = prefix, prefix + "\U0010ffff"
+        row = self.db.execute("SELECT min(token) FROM postings WHERE token >= ? AND token < ?", (token, end)).fetchone()
+        while row and row[0] is not None and len(found) < MAX_EXPAND:
+            found.append(row[0])
+            row = self.db.execute("SELECT min(token) FROM postings WHERE token > ? AND token < ?",
+                                  (row[0], end)).fetchone()
+        return found
+
+    def _frequency(self, words):
+        # nombre de messages (plafonné à RARE) : choix du mot qui mène la recherche
+        marks = ",".join("?" * len(words))
+        sql = f"SELECT count(*) FROM (SELECT 1 FROM postings WHERE token IN ({marks}) LIMIT {RARE})"
+        return self.db.execute(sql, words).fetchone()[0]
+
+    def search(self, query, limit=50):
+        """
+        Les limit messages les plus récents qui correspondent à query
+        (voir parse_query), du plus récent au plus ancien : liste de Hit.
+        """
+        start = time.perf_counter()
+        words, prefixes, sender, kind, channel = parse_query(query)
+        if not (words or prefixes or sender or kind or channel):
+            return []
+        terms = [[word] for word in dict.fromkeys(words)] + [self._expand(prefix) for prefix in prefixes]
+        if not all(terms):
+            return []
+        terms.sort(key=self._frequency)
+        columns = "m.source, m.segment, m.offset, m.channel, m.timestamp, m.sender, m.kind"
+        if terms and self._frequency(terms[0]) < RARE:
+            # mot rare : on part de ses postings, puis on vérifie le reste
+            driver = terms.pop(0)
+            sql = (f"SELECT DISTINCT {columns} FROM postings p CROSS JOIN messages m ON m.id = p.msg "
+                   f"WHERE p.token IN ({','.join('?' * len(driver))})")
+            args = list(driver)
+        else:
+            # mots fréquents ou filtres seuls : on remonte le temps jusqu'à limit résultats
+            sql = f"SELECT {columns} FROM messages m WHERE 1"
+            args = []
+        for term in terms:
+            sql += f" AND EXISTS (SELECT 1 FROM postings WHERE token IN ({','.join('?' * len(term))}) AND msg = m.id)"
+            args += term
+        for column, value in (("sender", sender), ("kind", kind), ("channel", channel)):
+            if value is not None:
+                sql += f" AND m.{column} = ?"
+                args.append(value)
+        sql += " ORDER BY m.timestamp DESC, m.id DESC LIMIT ?"
+        args.append(int(limit))
+        hits = []
+        for source, segment, offset, chan, timestamp, who, what in self.db.execute(sql, args):
+            try:
+                line = read_message_at(segment_path(os.path.join(self.root, source), segment), offset)
+            except OSError:
+                line = None
+            if line is not None:
+                hits.append(Hit(timestamp, chan, who, what, line))
+        SEARCH_SECONDS.observe(time.perf_counter() - start)
+        return hits
+
+    def close(self):
+        self.db.close()
+
+
+class Indexer(threading.Thread):
+    """
+    Tient l'index à jour en arrière-plan : un tour dès wake() (nouvelles
+    lignes) ou toutes les interval secondes. Le premier passage indexe
+    tout l'historique par lots. Un seul client par utilisateur indexe
+    (bail SearchIndex.claim) ; les autres reprennent le bail s'il expire.
+    """
+
+    def __init__(self, config, username, interval=5.0):
+        super().__init__(name="Indexer", daemon=True)
+        self.config = config
+        self.username = username
+        self.interval = interval
+        self.path = index_path(config, username)
+        self.owner = f"{os.getpid()}-{id(self)}"
+        self._wake = threading.Event()
+        self._closing = threading.Event()
+
+    def run(self):
+        try:
+            index = SearchIndex(self.path, self.config["shared_file"])
+        except sqlite3.Error as e:
+            metrics.log.error("Index de recherche indisponible : %s", e)
+            return
+        try:
+            while not self._closing.is_set():
+                try:
+                    if index.claim(self.owner):
+                        sources = search_sources(self.config["shared_file"], self.config, self.username)
+                        while index.update(sources) >= BATCH and not self._closing.is_set():
+                            index.claim(self.owner)   # rattrapage de l'historique
+                except (sqlite3.Error, OSError) as e:
+                    metrics.log.warning("Indexation interrompue : %s", e)
+                except Exception:
+                    metrics.log.exception("Erreur d'indexation")
+                self._wake.wait(self.interval)
+                self._wake.clear()
+        finally:
+            try:
+                index.release(self.owner)
+            except sqlite3.Error:
+                pass
+            index.close()
+
+    def wake(self):
+        self._wake.set()
+
+    def search(self, query, limit=50):
+        """
+        Recherche (connexion sqlite propre à l'appelant, sans attendre
+        l'indexation en cours).
+        """
+        index = SearchIndex(self.path, self.config["shared_file"])
+        try:
+            return index.search(query, limit)
+        finally:
+            index.close()
+
+    def close(self):
+        self._closing.set()
+        self._wake.set()
+        if self.is_alive():
+            self.join(2.0)
+
+
+def format_hit(hit):
+    label = "" if hit.channel == GENERAL else f"[{hit.channel if hit.channel.startswith('@') else '#' + hit.channel}] "
+    return label + hit.line
+
+
+def main():
+    from config import get_config
+
+    if len(sys.argv) < 3:
+        print("Usage : python search.py <utilisateur> <requête...>")
+        return 1
+    config = get_config()
+    username, query = sys.argv[1], " ".join(sys.argv[2:])
+    index = SearchIndex(index_path(config, username), config["shared_file"])
+    owner = f"{os.getpid()}-cli"
+    try:
+        if index.claim(owner):
+            # sinon un client connecté tient déjà l'index à jour
+            sources = search_sources(config["shared_file"], config, username)
+            while index.update(sources) >= BATCH:
+                index.claim(owner)
+            index.release(owner)
+        start = time.perf_counter()
+        hits = index.search(query)
+        elapsed = time.perf_counter() - start
+    except ValueError as e:
+        print(f"[ERREUR] {e}")
+        return 1
+    finally:
+        index.close()
+    for hit in reversed(hits):
+        print(format_hit(hit))
+    print(f"[INFO] {len(hits)} résultat(s) en {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
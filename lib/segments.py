@@ -0,0 +1,536 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Journal partagé découpé en segments numérotés.
+#   shared_chat.log          segment 0 (le fichier historique)
+#   shared_chat.000001.log   segment 1, puis 2, 3...
+# Chaque segment peut avoir un index creux <segment>.idx qui associe
+# numéro de message et horodatage à une position en octets, pour
+# aller directement aux "500 derniers messages" ou "depuis 09:00".
+# Les anciens segments peuvent être compressés par blocs (compress_segments,
+# "segment_compress" dans chat.json) : ils gardent leur nom et les
+# positions restent celles du contenu décompressé.
+import os
+import re
+import json
+import time
+
+from format import read_new_lines, parse_timestamp, format_time
+from record import is_binary, first_timestamp, decode_records, MAGIC, MAX_RECORD
+from compression import open_read, data_size, compress_file, is_compressed, BlockFile, CODECS
+import metrics
+
+INDEX_SUFFIX = ".idx"
+INDEX_EVERY = 128          # une entrée d'index tous les N messages
+PREV_GRACE = 5.0           # secondes pendant lesquelles on relit l'ancien segment
+SCAN_BLOCK = 1024 * 1024
+COMPRESS_MIN_AGE = 600     # secondes sans écriture avant de compresser un segment
+TIME_ONLY_RE = re.compile(r"^(\d{1,2})(:\d{2}.*)$")  # "9:00", "09:00:30" : heure du jour
+
+READ_TICK = metrics.histogram("read_tick_seconds", "Durée d'une lecture du journal (LogTail)")
+READ_TICKS = metrics.counter("read_ticks_total", "Lectures du journal")
+READ_BYTES = metrics.counter("read_bytes_total", "Octets lus dans le journal")
+READ_LINES = metrics.counter("read_lines_total", "Messages lus dans le journal")
+
+
+def segment_path(base, number):
+    """
+    Chemin du segment number pour le journal base.
+    """
+    if number == 0:
+        return base
+    stem, ext = os.path.splitext(base)
+    return f"{stem}.{number:06d}{ext}"
+
+
+def list_segments(base):
+    """
+    Retourne la liste triée des (numéro, chemin) des segments existants.
+    """
+    folder = os.path.dirname(base) or "."
+    stem, ext = os.path.splitext(os.path.basename(base))
+    pattern = re.compile(re.escape(stem) + r"\.(\d{6})" + re.escape(ext) + "$")
+    segments = [(0, base)] if os.path.isfile(base) else []
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        names = []
+    for name in names:
+        m = pattern.match(name)
+        if m:
+            segments.append((int(m.group(1)), os.path.join(folder, name)))
+    return sorted(segments)
+
+
+def last_segment(base):
+    """
+    Numéro du segment courant (le plus récent), 0 s'il n'y en a pas.
+    """
+    segments = list_segments(base)
+    return segments[-1][0] if segments else 0
+
+
+def line_timestamp(line):
+    """
+    Horodatage texte en tête d'une ligne "<date> - <user> : <texte>".
+    """
+    for sep in (" - ", " – "):
+        i = line.find(sep)
+        if i > 0:
+            return line[:i].strip()
+    return ""
+
+
+def segment_start_time(path):
+    """
+    Horodatage (epoch) du premier message du segment, None s'il est vide.
+    """
+    try:
+        if is_binary(path):
+            return first_timestamp(path)
+        with open_read(path) as f:
+            first = f.readline().decode("utf-8", errors="replace")
+    except OSError:
+        return None
+    return parse_timestamp(line_timestamp(first)) if first.endswith("\n") else None
+
+
+def _iter_entries(path, offset=0):
+    """
+    Itère sur les messages complets du segment à partir de offset, texte
+    ou binaire (record.py) : (position, position_suivante, contenu).
+    contenu est la ligne en bytes (texte, décodée à la demande par
+    _as_text) ou déjà en str (binaire).
+    """
+    binary = is_binary(path)
+    with open_read(path) as f:
+        pos = offset
+        while True:
+            f.seek(pos)
+            block = f.read(SCAN_BLOCK)
+            if binary:
+                entries, consumed, _ = decode_records(block, pos)
+                if not consumed and len(block) == SCAN_BLOCK:
+                    # enregistrement plus grand qu'un bloc
+                    block += f.read(MAX_RECORD)
+                    entries, consumed, _ = decode_records(block, pos)
+                if not consumed:
+                    return
+                for i, (start, line) in enumerate(entries):
+                    end = entries[i + 1][0] if i + 1 < len(entries) else pos + consumed
+                    yield start, end, line
+                pos += consumed
+            else:
+                if len(block) == SCAN_BLOCK and b"\n" not in block:
+                    block += f.readline()  # ligne plus longue qu'un bloc
+                end = block.rfind(b"\n") + 1
+                if not end:
+                    return
+                start = 0
+                while start < end:
+                    nl = block.index(b"\n", start)
+                    yield pos + start, pos + nl + 1, block[start:nl]
+                    start = nl + 1
+                pos += end
+
+
+def _as_text(content):
+    if isinstance(content, bytes):
+        return content.decode("utf-8", errors="replace").rstrip("\r")
+    return content
+
+
+def iter_messages(path, offset=0):
+    """
+    Messages complets du segment path à partir de offset, lus par blocs :
+    (position, position_suivante, ligne).
+    """
+    for start, end, content in _iter_entries(path, offset):
+        yield start, end, _as_text(content)
+
+
+def read_message_at(path, offset):
+    """
+    Le message qui commence à offset dans le segment path (None s'il n'y
+    en a pas de complet). Ne lit que ce message, pas un bloc entier.
+    """
+    binary = is_binary(path)
+    with open_read(path) as f:
+        f.seek(offset)
+        if not binary:
+            line = f.readline()
+            return _as_text(line[:-1]) if line.endswith(b"\n") else None
+        for size in (4096, MAX_RECORD):
+            f.seek(offset)
+            entries, _, _ = decode_records(f.read(size), offset)
+            if entries:
+                return entries[0][1] if entries[0][0] == offset else None
+    return None
+
+
+# ---------------------- Index creux ----------------------
+
+def load_index(path):
+    """
+    Charge l'index du segment path : {"size", "count", "entries"}.
+    entries = [[numéro_message, position, horodatage], ...]
+    """
+    try:
+        with open(path + INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if isinstance(index.get("entries"), list):
+            return index
+    except (OSError, ValueError):
+        pass
+    return {"size": 0, "count": 0, "entries": []}
+
+
+def update_index(path):
+    """
+    Complète l'index du segment path avec les messages ajoutés depuis la
+    dernière mise à jour (seule la fin du segment est relue).
+    Retourne l'index à jour.
+    """
+    index = load_index(path)
+    try:
+        size = data_size(path)
+    except OSError:
+        return index
+    if size < index["size"]:
+        # segment tronqué ou remplacé : on reconstruit
+        index = {"size": 0, "count": 0, "entries": []}
+    if size == index["size"]:
+        return index
+
+    pos, count, entries = index["size"], index["count"], index["entries"]
+    for start, end, content in _iter_entries(path, pos):
+        if count % INDEX_EVERY == 0:
+            entries.append([count, start, line_timestamp(_as_text(content))])
+        count += 1
+        pos = end
+
+    index = {"size": pos, "count": count, "entries": entries}
+    tmp_path = f"{path}{INDEX_SUFFIX}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(tmp_path, path + INDEX_SUFFIX)
+    except OSError:
+        pass
+    return index
+
+
+def _read_from(path, offset, skip=0, limit=None):
+    """
+    Lit les messages complets de path à partir de offset, en sautant les
+    skip premiers. Retourne une liste de (position, ligne).
+    """
+    result = []
+    if limit == 0:
+        return result
+    for start, _, content in _iter_entries(path, offset):
+        if skip:
+            skip -= 1
+            continue
+        result.append((start, _as_text(content)))
+        if limit is not None and len(result) >= limit:
+            break
+    return result
+
+
+def _entry_before(entries, field, value):
+    """
+    Dernière entrée d'index dont le champ field (0 : numéro, 1 : position)
+    est <= value. Retourne (numéro, position).
+    """
+    ordinal, offset = 0, 0
+    for entry in entries:
+        if entry[field] > value:
+            break
+        ordinal, offset = entry[0], entry[1]
+    return ordinal, offset
+
+
+def _ordinal_at(path, index, offset):
+    """
+    Numéro du premier message du segment qui commence à offset ou après.
+    """
+    ordinal, start = _entry_before(index["entries"], 1, offset)
+    for pos, _, _ in _iter_entries(path, start):
+        if pos >= offset:
+            return ordinal
+        ordinal += 1
+    return ordinal
+
+
+def read_before(base, position=None, count=100):
+    """
+    Retourne les count messages qui précèdent position (segment, offset),
+    ou les count derniers du journal si position vaut None, du plus ancien
+    au plus récent, sous forme de ((segment, position), ligne).
+    """
+    result = []
+    for number, path in reversed(list_segments(base)):
+        if count <= 0:
+            break
+        if position is not None and number > position[0]:
+            continue
+        index = update_index(path)
+        end = index["count"]
+        if position is not None and number == position[0]:
+            end = _ordinal_at(path, index, position[1])
+        first = max(0, end - count)
+        # entrée d'index la plus proche avant le premier message voulu
+        ordinal, offset = _entry_before(index["entries"], 0, first)
+        lines = _read_from(path, offset, skip=first - ordinal, limit=end - first)
+        result[:0] = [((number, pos), line) for pos, line in lines]
+        count -= len(lines)
+    return result
+
+
+def last_messages(base, count):
+    """
+    Retourne les count derniers messages du journal, du plus ancien au
+    plus récent, sous forme de ((segment, position), ligne).
+    """
+    return read_before(base, None, count)
+
+
+def messages_since(base, timestamp):
+    """
+    Itère sur les messages horodatés à partir de timestamp (texte ISO,
+    ex. "2025-01-31 09:00", ou heure seule "09:00" pour aujourd'hui), sous
+    forme de ((segment, position), ligne).
+    """
+    match = TIME_ONLY_RE.match(timestamp)
+    if match:
+        # les horodatages se comparent en texte : on complète avec la date du jour
+        timestamp = f"{format_time()[:10]} {int(match.group(1)):02d}{match.group(2)}"
+    segments = [(number, path, update_index(path)["entries"]) for number, path in list_segments(base)]
+    start = 0
+    for i, (_, _, entries) in enumerate(segments):
+        if entries and entries[0][2] and entries[0][2] < timestamp:
+            start = i
+    for number, path, entries in segments[start:]:
+        offset = 0
+        for _, entry_offset, entry_ts in entries:
+            if entry_ts and entry_ts >= timestamp:
+                break
+            offset = entry_offset
+        for pos, line in _read_from(path, offset):
+            if line_timestamp(line) >= timestamp:
+                yield (number, pos), line
+
+
+# ---------------------- Compression des anciens segments ----------------------
+
+def compress_segments(base, codec="zlib", keep=2, min_age=COMPRESS_MIN_AGE, current=None):
+    """
+    Compresse par blocs les segments de base, sauf les keep plus récents
+    (au moins le dernier), ceux modifiés il y a moins de min_age secondes
+    et, si current est donné, le segment current (celui de l'écrivain qui
+    appelle) et les suivants. Le segment est
+    remplacé atomiquement ; s'il a changé pendant la compression (ou si
+    un autre client l'a déjà fait), il est laissé tel quel.
+    Retourne le nombre de segments compressés.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Codec inconnu : {codec}")
+    done = 0
+    segments = list_segments(base)
+    for number, path in segments[:max(0, len(segments) - max(1, keep))]:
+        if current is not None and number >= current:
+            continue
+        try:
+            st = os.stat(path)
+            if not st.st_size or time.time() - st.st_mtime < min_age or is_compressed(path):
+                continue
+            tmp_path = f"{path}.{os.getpid()}.cz.tmp"
+            try:
+                compress_file(path, tmp_path, codec)
+                after = os.stat(path)
+                if (after.st_size, after.st_mtime_ns) != (st.st_size, st.st_mtime_ns) or is_compressed(path):
+                    continue
+                os.replace(tmp_path, path)
+                done += 1
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        except OSError as e:
+            # Windows : un segment ouvert par un lecteur ne peut pas être remplacé
+            metrics.log.warning("Segment non compressé %s : %s", path, e)
+    return done
+
+
+# ---------------------- Lecture en continu ----------------------
+
+class LogTail:
+    """
+    Suit le journal segmenté comme "tail -f" : read_lines() retourne les
+    nouvelles lignes complètes et passe au segment suivant dès qu'il
+    apparaît (l'ancien segment est encore relu quelques secondes pour
+    les écrivains en retard). Chaque segment peut être texte ou binaire.
+    Avec state (voir state()), la lecture reprend au point sauvegardé ;
+    resume_status indique alors "resumed", "truncated", "replaced",
+    "rotated" ou "new".
+    """
+
+    def __init__(self, base, from_end=True, state=None):
+        self.base = base
+        self._prev = None  # (fichier, position, binaire, échéance, segment)
+        self.resume_status = "new"
+        if state and "offset" in state and self._resume(state):
+            return
+        self._open(last_segment(base))
+        self.pos = self.f.seek(0, os.SEEK_END) if from_end else 0
+
+    def _open(self, number):
+        self.segment = number
+        self.path = segment_path(self.base, number)
+        if not os.path.isfile(self.path):
+            open(self.path, 'ab').close()
+        self.f = open_read(self.path)
+        self.pos = 0
+        self.binary = None  # décidé à la lecture des premiers octets
+        self.inode = os.fstat(self.f.fileno()).st_ino
+
+    @staticmethod
+    def _read_new(f, pos, binary, positions=False, final=False):
+        """
+        Nouveaux messages de f (texte ou binaire), final si f ne grandira
+        plus (segment remplacé par le suivant).
+        Retourne (lignes, nouvelle_position, binaire) ; avec positions,
+        les lignes sont des (position, ligne).
+        """
+        if binary is None:
+            f.seek(0)
+            head = f.read(len(MAGIC))
+            if len(head) < len(MAGIC):
+                return [], pos, None
+            binary = head == MAGIC
+        if binary:
+            f.seek(pos)
+            entries, consumed, _ = decode_records(f.read(), pos, final)
+            lines = entries if positions else [line for _, line in entries]
+            return lines, pos + consumed, binary
+        if not positions:
+            lines, pos = read_new_lines(f, pos)
+            return lines, pos, binary
+        f.seek(pos)
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        entries = []
+        start = 0
+        while start < end:
+            nl = data.index(b"\n", start)
+            entries.append((pos + start, data[start:nl].decode("utf-8", errors="replace").rstrip("\r")))
+            start = nl + 1
+        return entries, pos + end, binary
+
+    def _resume(self, state):
+        """
+        Reprend au segment et à la position de state, en vérifiant que le
+        fichier est le même (inode) et qu'il n'a pas été tronqué.
+        """
+        number, offset = state.get("segment", 0), state.get("offset", 0)
+        if not os.path.isfile(segment_path(self.base, number)):
+            later = [n for n, _ in list_segments(self.base) if n > number]
+            if not later:
+                return False
+            # segment disparu : on repart du début du suivant
+            self._open(later[0])
+            self.resume_status = "rotated"
+            return True
+        self._open(number)
+        compressed = isinstance(self.f, BlockFile)
+        size = self.f.size if compressed else os.fstat(self.f.fileno()).st_size
+        if state.get("inode") and self.inode and state["inode"] != self.inode and not compressed:
+            self.resume_status = "replaced"
+        elif size < offset:
+            self.resume_status = "truncated"
+        else:
+            self.pos = offset
+            self.resume_status = "resumed"
+        return True
+
+    def position(self):
+        return self.segment, self.pos
+
+    def state(self):
+        """
+        Point de reprise : segment, position et identité du fichier.
+        """
+        return {"segment": self.segment, "offset": self.pos, "inode": self.inode}
+
+    def _check_identity(self):
+        """
+        Journal remplacé (autre inode) ou tronqué : on relit depuis le début.
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        if st.st_ino and self.inode and st.st_ino != self.inode:
+            pos = self.pos
+            self.f.close()
+            self._open(self.segment)
+            if isinstance(self.f, BlockFile):
+                self.pos = pos  # segment compressé : même contenu
+        elif st.st_size < self.pos and not isinstance(self.f, BlockFile):
+            self.pos = 0
+
+    def read_lines(self):
+        """
+        Nouvelles lignes complètes depuis le dernier appel.
+        """
+        return self._read(False)
+
+    def read_entries(self):
+        """
+        Comme read_lines, mais retourne des ((segment, position), ligne).
+        """
+        return self._read(True)
+
+    def _read(self, positions):
+        def tag(number, lines):
+            return [((number, pos), line) for pos, line in lines] if positions else lines
+
+        start, segment, pos = time.perf_counter(), self.segment, self.pos
+        lines, self.pos, self.binary = self._read_new(self.f, self.pos, self.binary, positions)
+        lines = tag(self.segment, lines)
+        if not lines:
+            self._check_identity()
+
+        if self._prev:
+            prev_f, prev_pos, prev_binary, deadline, prev_segment = self._prev
+            expired = time.monotonic() > deadline
+            late, prev_pos, prev_binary = self._read_new(prev_f, prev_pos, prev_binary, positions, expired)
+            lines[:0] = tag(prev_segment, late)
+            if expired:
+                prev_f.close()
+                self._prev = None
+            else:
+                self._prev = (prev_f, prev_pos, prev_binary, deadline, prev_segment)
+
+        next_path = segment_path(self.base, self.segment + 1)
+        while os.path.isfile(next_path):
+            more, self.pos, self.binary = self._read_new(self.f, self.pos, self.binary, positions)
+            lines += tag(self.segment, more)
+            if self._prev:
+                self._prev[0].close()
+            self._prev = (self.f, self.pos, self.binary, time.monotonic() + PREV_GRACE, self.segment)
+            self._open(self.segment + 1)
+            more, self.pos, self.binary = self._read_new(self.f, self.pos, self.binary, positions)
+            lines += tag(self.segment, more)
+            next_path = segment_path(self.base, self.segment + 1)
+
+        READ_TICK.observe(time.perf_counter() - start)
+        READ_TICKS.inc()
+        READ_LINES.inc(len(lines))
+        # changement de segment : octets du nouveau segment seulement
+        READ_BYTES.inc(self.pos - pos if self.segment == segment else self.pos)
+        return lines
+
+    def close(self):
+        self.f.close()
+        if self._prev:
+            self._prev[0].close()
+            self._prev = None
@@ -0,0 +1,358 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Écriture groupée dans le fichier partagé.
+# Le fichier reste ouvert, les messages écrits dans une petite fenêtre
+# (temps ou taille) partent en un seul write de lignes complètes, et
+# l'fsync suit une politique configurable : "always", "interval", "never".
+# Avec segment_max_bytes / segment_max_age_s, le journal passe au segment
+# suivant (voir segments.py) quand le segment courant est trop gros ou vieux.
+# log_format choisit le format des nouveaux segments ("text" ou "binary",
+# voir record.py) ; un segment déjà commencé garde son format. Le format
+# d'un segment vide est réservé avant la première écriture : le premier
+# écrivain crée <segment>.fmt (O_EXCL), les autres adoptent ce format, et
+# le fichier est supprimé une fois le segment commencé.
+# Avec segment_compress, chaque passage au segment suivant compresse en
+# arrière-plan les anciens segments (voir segments.compress_segments).
+import os
+import time
+import threading
+
+from segments import segment_path, last_segment, segment_start_time, compress_segments
+from record import is_binary, encode_message
+from message import parse_line
+from format import parse_timestamp
+import metrics
+
+FSYNC_POLICIES = ("always", "interval", "never")
+FORMAT_SUFFIX = ".fmt"      # réservation du format d'un segment encore vide
+CLAIM_TRIES = 200
+
+OPEN_SECONDS = metrics.histogram("write_open_seconds", "Ouverture d'un segment du journal")
+WRITE_SECONDS = metrics.histogram("write_seconds", "Écriture d'un lot dans le journal")
+FSYNC_SECONDS = metrics.histogram("write_fsync_seconds", "fsync du journal")
+WRITE_BYTES = metrics.counter("write_bytes_total", "Octets écrits dans le journal")
+WRITE_MESSAGES = metrics.counter("write_messages_total", "Messages écrits dans le journal")
+
+
+class LogWriter:
+    """
+    Écrivain long-vivant pour un fichier journal en ajout.
+    post() et write() ne bloquent pas : un thread regroupe les messages
+    et les écrit.
+    """
+
+    def __init__(self, path, fsync="interval", fsync_interval_ms=200,
+                 group_window_ms=2, group_max_bytes=64 * 1024,
+                 segment_max_bytes=0, segment_max_age_s=0, log_format="text",
+                 segment_compress="off", segment_compress_keep=2):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Politique fsync inconnue : {fsync}")
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.group_window = group_window_ms / 1000
+        self.group_max_bytes = group_max_bytes
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age = segment_max_age_s
+        self.segmented = bool(segment_max_bytes or segment_max_age_s)
+        self.log_format = log_format
+        self.segment_compress = segment_compress
+        self.segment_compress_keep = segment_compress_keep
+        self._segment_format = log_format
+        self._format_known = False   # format lu dans le segment (sinon log_format)
+        self.segment = last_segment(path) if self.segmented else 0
+        self._segment_start = None
+
+        self._fd = None
+        self._pending = []
+        self._pending_bytes = 0
+        self._written = 0          # lots écrits (pour flush())
+        self._queued = 0           # lots demandés
+        self._dirty = False        # données écrites mais pas encore fsync
+        self._last_sync = time.monotonic()
+        self._error = None
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._open()
+        self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        current = segment_path(self.path, self.segment)
+        start = time.perf_counter()
+        self._fd = os.open(current, flags, 0o644)
+        OPEN_SECONDS.observe(time.perf_counter() - start)
+        self._segment_format = self.log_format
+        self._format_known = False
+        self._check_format()
+        if self.segment_max_age:
+            self._segment_start = segment_start_time(current)
+
+    def _check_format(self):
+        """
+        Adopte le format du segment courant s'il a déjà un début.
+        """
+        binary = is_binary(segment_path(self.path, self.segment))
+        if binary is not None:
+            self._segment_format = "binary" if binary else "text"
+            self._format_known = True
+
+    def _claim_format(self):
+        """
+        Fixe le format du segment courant, encore vide, pour tous ses
+        écrivains. Retourne le chemin de la réservation si elle est à nous
+        (à supprimer après notre première écriture), sinon None.
+        """
+        claim = segment_path(self.path, self.segment) + FORMAT_SUFFIX
+        for _ in range(CLAIM_TRIES):
+            self._check_format()
+            if self._format_known:
+                return None
+            try:
+                fd = os.open(claim, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                try:
+                    with open(claim, 'r', encoding='ascii', errors='replace') as f:
+                        claimed = f.read().strip()
+                except FileNotFoundError:
+                    continue  # segment commencé et réservation supprimée entre-temps
+                if claimed in ("text", "binary"):
+                    self._segment_format, self._format_known = claimed, True
+                    return None
+                time.sleep(0.005)  # réservation en cours d'écriture
+                continue
+            try:
+                os.write(fd, self.log_format.encode("ascii"))
+            finally:
+                os.close(fd)
+            # un autre écrivain a pu commencer le segment et supprimer sa
+            # réservation juste avant la création de la nôtre
+            self._check_format()
+            if self._format_known:
+                _remove(claim)
+                return None
+            self._segment_format, self._format_known = self.log_format, True
+            return claim
+        metrics.log.warning("Format du segment %s non réservé, %s utilisé", self.path, self.log_format)
+        self._segment_format, self._format_known = self.log_format, True
+        return None
+
+    def _roll_if_needed(self):
+        """
+        Passe au segment suivant s'il existe déjà (autre écrivain) ou si
+        le segment courant a dépassé la taille ou l'âge maximal.
+        """
+        next_path = segment_path(self.path, self.segment + 1)
+        if not os.path.exists(next_path):
+            if self._segment_start is None:
+                self._segment_start = time.time()
+            too_big = self.segment_max_bytes and os.fstat(self._fd).st_size >= self.segment_max_bytes
+            too_old = self.segment_max_age and time.time() - self._segment_start >= self.segment_max_age
+            if not (too_big or too_old):
+                return
+            try:
+                os.close(os.open(next_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+            except FileExistsError:
+                pass
+        if self._dirty and self.fsync != "never":
+            self._sync()
+        os.close(self._fd)
+        self._fd = None
+        self.segment = max(self.segment + 1, last_segment(self.path))
+        self._segment_start = None
+        self._open()
+        if self.segment_compress != "off":
+            threading.Thread(target=self._compress_old, args=(self.segment,), name="SegmentCompress",
+                             daemon=True).start()
+
+    def _compress_old(self, current):
+        try:
+            count = compress_segments(self.path, self.segment_compress, self.segment_compress_keep,
+                                      current=current)
+            metrics.log.info("%d segment(s) compressé(s) pour %s", count, self.path)
+        except (OSError, ValueError) as e:
+            metrics.log.warning("Compression des segments de %s impossible : %s", self.path, e)
+
+    def post(self, username, text, timestamp=None):
+        """
+        Ajoute le message text de username au prochain lot ; il est encodé
+        au format du segment courant au moment de l'écriture.
+        Lève l'erreur du dernier lot s'il n'a pas pu être écrit.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self._enqueue((username, text, timestamp), len(text) + len(username) + 32)
+
+    def write(self, text):
+        """
+        Ajoute des lignes déjà formatées (format.format_msg) au prochain lot.
+        Lève l'erreur du dernier lot s'il n'a pas pu être écrit.
+        """
+        data = text.encode("utf-8")
+        self._enqueue(data, len(data))
+
+    def _enqueue(self, item, size):
+        with self._cond:
+            if self._closed:
+                raise ValueError("LogWriter fermé")
+            self._raise_error()
+            self._pending.append(item)
+            self._pending_bytes += size
+            self._queued += 1
+            self._cond.notify()
+
+    def _encode(self, item):
+        """
+        Encode un élément du lot au format du segment courant.
+        """
+        if isinstance(item, tuple):
+            return encode_message(self._segment_format, *item)
+        if self._segment_format == "text":
+            return item
+        # lignes texte vers un segment binaire : on les réencode
+        records = []
+        for line in item.decode("utf-8").splitlines():
+            msg = parse_line(line)
+            if msg is not None:
+                records.append(encode_message("binary", msg.sender, msg.body,
+                                              parse_timestamp(msg.timestamp)))
+        return b"".join(records)
+
+    def flush(self):
+        """
+        Attend que tous les messages déjà reçus soient écrits.
+        """
+        with self._cond:
+            target = self._queued
+            self._cond.notify()
+            while self._written < target and self._error is None:
+                self._cond.wait()
+            self._raise_error()
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        if self._fd is not None:
+            if self._dirty and self.fsync != "never":
+                self._sync()
+            os.close(self._fd)
+            self._fd = None
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    timeout = None
+                    if self._dirty and self.fsync == "interval":
+                        timeout = max(0, self._last_sync + self.fsync_interval - time.monotonic())
+                    if not self._cond.wait(timeout) and timeout is not None:
+                        break
+                if self._pending and not self._closed:
+                    # fenêtre de regroupement : attendre d'autres messages
+                    deadline = time.monotonic() + self.group_window
+                    while self._pending_bytes < self.group_max_bytes and not self._closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                batch, count = self._pending, self._queued
+                self._pending, self._pending_bytes = [], 0
+                closed = self._closed
+
+            if batch:
+                try:
+                    self._write_all(batch)
+                except OSError as e:
+                    with self._cond:
+                        self._error = e
+                        self._written = count
+                        self._cond.notify_all()
+                    continue
+            self._maybe_sync(force=closed)
+            with self._cond:
+                self._written = count
+                self._cond.notify_all()
+            if closed:
+                return
+
+    def _write_all(self, batch):
+        if self._fd is None:
+            self._open()
+        if self.segmented:
+            self._roll_if_needed()
+        claim = None if self._format_known else self._claim_format()
+        self._write_bytes(b"".join(map(self._encode, batch)), len(batch))
+        if claim is not None:
+            _remove(claim)   # le segment a maintenant un début
+        if self.fsync == "always":
+            self._sync()
+
+    def _write_bytes(self, data, count):
+        view = memoryview(data)
+        size = len(view)
+        start = time.perf_counter()
+        try:
+            while view:
+                n = os.write(self._fd, view)
+                view = view[n:]
+        except OSError:
+            # partage réseau coupé : rouvrir au prochain lot
+            try:
+                os.close(self._fd)
+            finally:
+                self._fd = None
+            raise
+        WRITE_SECONDS.observe(time.perf_counter() - start)
+        WRITE_BYTES.inc(size)
+        WRITE_MESSAGES.inc(count)
+        self._dirty = True
+
+    def _maybe_sync(self, force=False):
+        if not self._dirty or self.fsync == "never" or self._fd is None:
+            return
+        if force or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self._sync()
+
+    def _sync(self):
+        start = time.perf_counter()
+        try:
+            os.fsync(self._fd)
+        except OSError as e:
+            metrics.log.warning("fsync impossible sur %s : %s", self.path, e)
+        FSYNC_SECONDS.observe(time.perf_counter() - start)
+        self._dirty = False
+        self._last_sync = time.monotonic()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def make_writer(path, config):
+    """
+    Crée un LogWriter pour path avec les options de chat.json.
+    """
+    return LogWriter(
+        path,
+        fsync=config.get("fsync", "interval"),
+        fsync_interval_ms=float(config.get("fsync_interval_ms", 200)),
+        group_window_ms=float(config.get("group_window_ms", 2)),
+        segment_max_bytes=int(float(config.get("segment_max_mb", 0)) * 1024 * 1024),
+        segment_max_age_s=float(config.get("segment_max_age_h", 0)) * 3600,
+        log_format=config.get("log_format", "text"),
+        segment_compress=config.get("segment_compress", "off"),
+        segment_compress_keep=int(config.get("segment_compress_keep", 2)),
+    )
@@ -0,0 +1,6 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Les modules de lib/ s'importent entre eux par leur nom (python lib/chat.py).
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib"))
@@ -0,0 +1,69 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Stockage par contenu (blobs.py) : un seul blob par contenu, et gc()
+# qui ne supprime que les blobs sans lien, leurs signatures et les
+# écritures temporaires abandonnées.
+import os
+import time
+
+from blobs import send_blob, gc, blobs_dir
+from delta import signature_path, SIGNATURE_SUFFIX, DELTA_MIN_SIZE
+
+
+def _send(tmp_path, name, data, users, delta=False):
+    src = tmp_path / "src" / name
+    src.parent.mkdir(exist_ok=True)
+    src.write_bytes(data)
+    return send_blob(str(src), users, str(tmp_path / "dl"), delta=delta)
+
+
+def _blob(stats, downloads_dir):
+    digest = stats["digest"]
+    return os.path.join(blobs_dir(downloads_dir), digest[:2], digest)
+
+
+def test_same_content_stored_once(tmp_path):
+    data = os.urandom(10000)
+    _, paths, stats = _send(tmp_path, "a.bin", data, ["alice", "bob"])
+    assert stats["written_bytes"] == len(data)
+    assert {user: open(path, "rb").read() == data for user, path in paths.items()} == {"alice": True, "bob": True}
+    _, _, again = _send(tmp_path, "copy.bin", data, ["carol"])
+    assert again["written_bytes"] == 0
+    assert again["digest"] == stats["digest"]
+
+
+def test_gc_keeps_linked_blobs_and_removes_unused_ones(tmp_path):
+    downloads_dir = str(tmp_path / "dl")
+    data = os.urandom(DELTA_MIN_SIZE + 1000)
+    _, paths, stats = _send(tmp_path, "big.bin", data, ["alice", "bob"], delta=True)
+    blob = _blob(stats, downloads_dir)
+    assert os.path.exists(blob + SIGNATURE_SUFFIX)
+    time.sleep(0.01)
+    if os.stat(blob).st_nlink > 1:
+        assert gc(downloads_dir, grace_s=0) == (0, 0)   # encore relié aux destinataires
+        assert os.path.exists(blob)
+    for path in paths.values():
+        os.remove(path)
+    assert gc(downloads_dir, grace_s=0) == (1, len(data))
+    assert not os.path.exists(blob)
+    assert not os.path.exists(blob + SIGNATURE_SUFFIX)
+    # signatures des destinataires : leur fichier n'existe plus
+    assert not os.path.exists(signature_path(downloads_dir, "alice", "big.bin"))
+
+
+def test_gc_removes_abandoned_writes_after_grace_and_orphan_signatures(tmp_path):
+    downloads_dir = str(tmp_path / "dl")
+    root = blobs_dir(downloads_dir)
+    os.makedirs(os.path.join(root, "tmp"))
+    os.makedirs(os.path.join(root, "ab"))
+    part = os.path.join(root, "tmp", "123-456-789.part")
+    with open(part, "wb") as f:
+        f.write(b"x" * 100)
+    orphan = os.path.join(root, "ab", "ab" + "0" * 62 + SIGNATURE_SUFFIX)
+    with open(orphan, "wb") as f:
+        f.write(b"{}")
+    assert gc(downloads_dir, grace_s=3600) == (0, 0)   # écriture peut-être en cours
+    assert os.path.exists(part)
+    assert not os.path.exists(orphan)
+    time.sleep(0.01)
+    assert gc(downloads_dir, grace_s=0) == (1, 100)
+    assert not os.path.exists(part)
@@ -0,0 +1,86 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Exécution des @exec (commande.py) : sorties récupérées, file bornée,
+# commandes tuées (avec leurs fils) au-delà du délai ou à l'arrêt.
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+from commande import ExecEngine
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="commandes shell POSIX")
+
+
+def _run(engine_options, commands, wait=10.0, before_wait=None):
+    results = []
+
+    async def main():
+        engine = ExecEngine(results.append, **engine_options)
+        accepted = [engine.submit(command, "alice") for command in commands]
+        if before_wait is not None:
+            before_wait(engine)
+        deadline = time.monotonic() + wait
+        while len(results) < accepted.count(True) and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        await engine.shutdown(1.0)
+        return accepted
+
+    return asyncio.run(main()), results
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_output_and_return_code_collected():
+    _, results = _run({}, ["echo hello; echo oops >&2; exit 3"])
+    (result,) = results
+    assert (result.returncode, result.stdout, result.stderr, result.timed_out) == (3, "hello\n", "oops\n", False)
+    assert result.sender == "alice"
+
+
+def test_timeout_kills_command_and_children(tmp_path):
+    pidfile = tmp_path / "child.pid"
+    start = time.monotonic()
+    _, results = _run({"timeout": 0.5}, [f"sleep 30 & echo $! > {pidfile}; wait"])
+    (result,) = results
+    assert result.timed_out
+    assert time.monotonic() - start < 10
+    child = int(pidfile.read_text())
+    deadline = time.monotonic() + 5
+    while _alive(child) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _alive(child)
+
+
+def test_queue_and_concurrency_are_bounded():
+    seen = {}
+
+    def check(engine):
+        seen.update(running=engine.running(), pending=engine.pending())
+
+    accepted, results = _run({"max_jobs": 1, "max_queue": 1}, ["sleep 0.2", "echo two", "echo three"],
+                             before_wait=check)
+    assert accepted == [True, True, False]
+    assert seen == {"running": 1, "pending": 1}
+    assert [result.command for result in results] == ["sleep 0.2", "echo two"]
+
+
+def test_shutdown_kills_running_commands():
+    async def main():
+        engine = ExecEngine(timeout=60)
+        engine.submit("sleep 30")
+        await asyncio.sleep(0.2)
+        start = time.monotonic()
+        await engine.shutdown(0.2)
+        return time.monotonic() - start, engine.running(), engine.submit("echo late")
+
+    elapsed, running, accepted = asyncio.run(main())
+    assert elapsed < 5
+    assert (running, accepted) == (0, False)
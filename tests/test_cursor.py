@@ -0,0 +1,44 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Point de reprise du lecteur (cursor.py) : reprise après un passage au
+# segment suivant, sans perte ni doublon.
+import time
+
+import pytest
+
+from writer import LogWriter
+from segments import LogTail, list_segments
+from cursor import ReaderCursor
+
+
+def _body(line):
+    return line.split(" : ", 1)[1]
+
+
+@pytest.mark.parametrize("log_format", ["text", "binary"])
+def test_rollover_and_cursor_resume(tmp_path, log_format):
+    base = str(tmp_path / "chat.log")
+    cursor = ReaderCursor(str(tmp_path / "state" / "cursor.json"), 0)
+    writer = LogWriter(base, segment_max_bytes=2048, log_format=log_format)
+    tail = LogTail(base, from_end=False)
+    seen = []
+    try:
+        for i in range(100):
+            writer.post("alice", f"message {i:03d} " + "x" * 40)
+            writer.flush()
+        seen += tail.read_lines()
+        cursor.save(tail.state(), force=True)
+        tail.close()
+        for i in range(100, 250):
+            writer.post("alice", f"message {i:03d} " + "x" * 40)
+            writer.flush()
+    finally:
+        writer.close()
+    assert len(list_segments(base)) > 3
+
+    resumed = LogTail(base, state=ReaderCursor(cursor.path).load())
+    assert resumed.resume_status == "resumed"
+    deadline = time.monotonic() + 5
+    while len(seen) < 250 and time.monotonic() < deadline:
+        seen += resumed.read_lines()
+    resumed.close()
+    assert [_body(line)[:11] for line in seen] == [f"message {i:03d}" for i in range(250)]
@@ -0,0 +1,61 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Transfert différentiel (delta.py) : la reconstruction doit redonner
+# exactement la nouvelle version, en reprenant les blocs inchangés.
+import os
+import random
+
+import pytest
+
+from delta import delta_copy, file_signature, load_signature, DELTA_BLOCK
+
+SIZE = 40 * DELTA_BLOCK + 1234
+
+
+def _data(seed, size=SIZE):
+    return random.Random(seed).randbytes(size)
+
+
+def _edits(old):
+    middle = len(old) // 2
+    return {
+        "insert": old[:middle] + b"inserted bytes" + old[middle:],
+        "delete": old[:middle] + old[middle + 5000:],
+        "replace": old[:middle] + b"X" * 100 + old[middle + 100:],
+        "truncate": old[:len(old) // 3],
+        "append": old + _data(2, 3 * DELTA_BLOCK),
+        "prepend": b"header" + old,
+    }
+
+
+@pytest.mark.parametrize("edit", ["insert", "delete", "replace", "truncate", "append", "prepend"])
+def test_delta_reconstruction(tmp_path, edit):
+    old = _data(1)
+    new = _edits(old)[edit]
+    base, src, dest = tmp_path / "old.bin", tmp_path / "new.bin", tmp_path / "out.bin"
+    base.write_bytes(old)
+    src.write_bytes(new)
+    written, reused, signature = delta_copy(str(src), str(base), str(dest), file_signature(str(base)))
+    assert dest.read_bytes() == new
+    assert written + reused == len(new)
+    # seuls les blocs autour de la modification sont réécrits
+    assert written <= 5 * DELTA_BLOCK
+    assert signature == file_signature(str(dest))
+
+
+def test_delta_unrelated_content(tmp_path):
+    base, src, dest = tmp_path / "old.bin", tmp_path / "new.bin", tmp_path / "out.bin"
+    base.write_bytes(_data(1))
+    src.write_bytes(_data(3))
+    written, reused, _ = delta_copy(str(src), str(base), str(dest), file_signature(str(base)))
+    assert dest.read_bytes() == src.read_bytes()
+    assert reused == 0
+
+
+def test_signature_cache_invalidated_on_change(tmp_path):
+    path, sig_path = tmp_path / "f.bin", tmp_path / "f.bin.sig"
+    path.write_bytes(_data(1))
+    first = load_signature(str(path), str(sig_path))
+    assert os.path.isfile(sig_path)
+    assert load_signature(str(path), str(sig_path)) == first
+    path.write_bytes(_data(4))
+    assert load_signature(str(path), str(sig_path)) == file_signature(str(path))
@@ -0,0 +1,71 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Surveillance du dossier de réception (downloads.py) : fichiers ajoutés,
+# terminés, supprimés, transferts .part et reprise depuis known_files.
+import os
+import time
+
+import pytest
+
+from downloads import DownloadsWatcher
+from file_transfer import PART_SUFFIX
+
+SETTLE = 0.1
+
+
+def _poll_until(watcher, field, timeout=3.0):
+    found = []
+    deadline = time.monotonic() + timeout
+    while not found and time.monotonic() < deadline:
+        found = getattr(watcher.poll(), field)
+        time.sleep(0.02)
+    return found
+
+
+@pytest.fixture(params=["poll", "auto"])
+def watch(request):
+    return request.param
+
+
+def test_existing_files_ignored_new_file_completes_once_stable(tmp_path, watch):
+    (tmp_path / "old.txt").write_text("old")
+    watcher = DownloadsWatcher(str(tmp_path), settle=SETTLE, watch=watch)
+    try:
+        assert watcher.poll() == ([], [], [], [])
+        (tmp_path / "new.txt").write_text("new")
+        changes = watcher.poll()
+        assert changes.added == ["new.txt"]
+        if not changes.completed:
+            assert watcher.pending()
+            assert _poll_until(watcher, "completed") == ["new.txt"]
+        assert not watcher.pending()
+        os.remove(tmp_path / "old.txt")
+        assert _poll_until(watcher, "removed") == ["old.txt"]
+    finally:
+        watcher.close()
+
+
+def test_renamed_part_file_completes_at_once(tmp_path, watch):
+    watcher = DownloadsWatcher(str(tmp_path), settle=60, watch=watch)
+    try:
+        part = tmp_path / ("report.pdf" + PART_SUFFIX)
+        part.write_bytes(b"x" * 1000)
+        assert watcher.poll() == ([], [], [], [])   # transfert en cours : rien à signaler
+        os.replace(part, tmp_path / "report.pdf")
+        changes = watcher.poll()
+        assert (changes.added, changes.completed) == (["report.pdf"], ["report.pdf"])
+    finally:
+        watcher.close()
+
+
+def test_known_files_resume(tmp_path, watch):
+    for name in ("seen.txt", "missed.txt"):
+        (tmp_path / name).write_text(name)
+    old = time.time() - 60
+    os.utime(tmp_path / "missed.txt", (old, old))
+    watcher = DownloadsWatcher(str(tmp_path), known_files=["seen.txt"], settle=SETTLE, watch=watch)
+    try:
+        changes = watcher.poll()
+        assert (changes.added, changes.completed) == (["missed.txt"], ["missed.txt"])
+        assert sorted(watcher.known_files()) == ["missed.txt", "seen.txt"]
+    finally:
+        watcher.close()
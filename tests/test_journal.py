@@ -0,0 +1,105 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Journaux par écrivain (journal.py) : ordre de fusion et rendu.
+import os
+import time
+
+from writer import LogWriter
+from journal import MergedTail, journal_path, journal_dir, read_history
+
+
+def _writers(tmp_path, *names):
+    base = str(tmp_path / "chat.log")
+    open(base, "w").close()
+    os.makedirs(journal_dir(base))
+    return base, {name: LogWriter(journal_path(base, name)) for name in names}
+
+
+def _close(writers):
+    for writer in writers.values():
+        writer.close()
+
+
+def test_merge_orders_by_timestamp_then_journal(tmp_path):
+    base, writers = _writers(tmp_path, "alice", "bob")
+    start = time.time() - 10
+    try:
+        # chaque journal est dans l'ordre, pas l'ensemble
+        for name, offsets in (("bob", (1, 3, 5)), ("alice", (0, 2, 3, 4))):
+            for offset in offsets:
+                writers[name].post(name, f"{name} {offset}", start + offset)
+            writers[name].flush()
+        tail = MergedTail(base, from_end=False, window=0.05)
+        lines = tail.read_lines()
+        tail.close()
+    finally:
+        _close(writers)
+    bodies = [line.split(" : ", 1)[1] for line in lines]
+    assert bodies == ["alice 0", "bob 1", "alice 2", "alice 3", "bob 3", "alice 4", "bob 5"]
+
+
+def test_lone_writer_released_without_waiting(tmp_path):
+    base, writers = _writers(tmp_path, "alice", "bob")
+    try:
+        writers["bob"].post("bob", "old", time.time() - 60)
+        writers["bob"].flush()
+        tail = MergedTail(base, from_end=False, window=30.0)
+        assert len(tail.read_lines()) == 1
+        writers["alice"].post("alice", "hello")
+        writers["alice"].flush()
+        # bob et le journal commun sont inactifs : rien n'attend la fenêtre
+        assert [line.split(" : ", 1)[1] for line in tail.read_lines()] == ["hello"]
+        assert tail.pending_delay() is None
+        tail.close()
+    finally:
+        _close(writers)
+
+
+def test_active_writer_holds_later_messages(tmp_path):
+    base, writers = _writers(tmp_path, "alice", "bob")
+    now = time.time()
+    try:
+        tail = MergedTail(base, from_end=False, window=0.5)
+        writers["bob"].post("bob", "b1", now)
+        writers["alice"].post("alice", "a1", now + 0.001)
+        writers["alice"].post("alice", "a2", now + 0.002)
+        for writer in writers.values():
+            writer.flush()
+        first = [line.split(" : ", 1)[1] for line in tail.read_lines()]
+        assert first == ["b1"]
+        assert 0 < tail.pending_delay() <= 0.5
+        time.sleep(tail.pending_delay() + 0.05)
+        assert [line.split(" : ", 1)[1] for line in tail.read_lines()] == ["a1", "a2"]
+        tail.close()
+    finally:
+        _close(writers)
+
+
+def test_journal_created_later_read_from_start(tmp_path):
+    base, writers = _writers(tmp_path, "alice")
+    try:
+        tail = MergedTail(base, from_end=True, window=0.05)
+        writers["carol"] = LogWriter(journal_path(base, "carol"))
+        writers["carol"].post("carol", "first", time.time() - 1)
+        writers["carol"].post("carol", "second", time.time() - 1)
+        writers["carol"].flush()
+        # nouveau venu : lu depuis le début, même si le lecteur part de la fin
+        assert [line.split(" : ", 1)[1] for line in tail.read_lines()] == ["first", "second"]
+        tail.close()
+    finally:
+        _close(writers)
+
+
+def test_read_history_pages_across_journals(tmp_path):
+    base, writers = _writers(tmp_path, "alice", "bob")
+    start = time.time() - 60
+    config = {"journal_mode": "per_writer"}
+    try:
+        for i in range(10):
+            name = "alice" if i % 2 else "bob"
+            writers[name].post(name, f"m{i}", start + i)
+    finally:
+        _close(writers)
+    page = read_history(base, config, None, 4)
+    assert [line.split(" : ", 1)[1] for _, line in page] == ["m6", "m7", "m8", "m9"]
+    older = read_history(base, config, page[0][0], 4)
+    assert [line.split(" : ", 1)[1] for _, line in older] == ["m2", "m3", "m4", "m5"]
@@ -0,0 +1,61 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Format binaire (record.py) : écrivains texte et binaire sur un même
+# segment, resynchronisation après un en-tête corrompu.
+import struct
+
+import pytest
+
+from writer import LogWriter
+from segments import LogTail
+from record import is_binary, encode_record, decode_records
+
+
+def _body(line):
+    return line.split(" : ", 1)[1]
+
+
+def _bad_length(record, length=1000000):
+    # longueur plausible (< MAX_RECORD) mais au-delà des données
+    return record[:4] + struct.pack("<I", length) + record[8:]
+
+
+@pytest.mark.parametrize("first, second", [("binary", "text"), ("text", "binary")])
+def test_mixed_writers_share_segment_format(tmp_path, first, second):
+    base = str(tmp_path / "chat.log")
+    a = LogWriter(base, log_format=first)
+    b = LogWriter(base, log_format=second)
+    try:
+        a.post("alice", "one")
+        a.flush()
+        b.post("bob", "two")
+        b.flush()
+        a.post("alice", "three")
+        a.flush()
+        b.write("2026-01-01 10:00:00.000 - bob : four\n")
+        b.flush()
+    finally:
+        a.close()
+        b.close()
+    assert is_binary(base) == (first == "binary")
+    tail = LogTail(base, from_end=False)
+    assert [_body(line) for line in tail.read_lines()] == ["one", "two", "three", "four"]
+    tail.close()
+
+
+def test_corrupt_length_skipped_when_valid_data_follows():
+    data = encode_record("alice", "one") + _bad_length(encode_record("bob", "lost")) + encode_record("alice", "two")
+    entries, consumed, errors = decode_records(data)
+    assert [_body(line) for _, line in entries] == ["one", "two"]
+    assert consumed == len(data)
+    assert errors == 1
+
+
+def test_incomplete_record_waits_unless_final():
+    first = encode_record("alice", "one")
+    data = first + _bad_length(encode_record("bob", "cut"))
+    entries, consumed, errors = decode_records(data)
+    assert [_body(line) for _, line in entries] == ["one"]
+    assert (consumed, errors) == (len(first), 0)
+    entries, consumed, errors = decode_records(data, final=True)
+    assert [_body(line) for _, line in entries] == ["one"]
+    assert (consumed, errors) == (len(data), 1)
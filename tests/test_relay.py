@@ -0,0 +1,108 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Transport relay (relay.py) : abonnements, trames invalides ignorées,
+# reconnexion avec envoi des messages mis en attente.
+import sys
+import json
+import time
+import socket
+import subprocess
+
+import pytest
+
+import relay
+
+LIB = relay.__file__.rsplit("relay.py", 1)[0]
+SERVE = ("import sys, asyncio; sys.path.insert(0, {lib!r}); import relay; "
+         "asyncio.run(relay.RelayServer('127.0.0.1', {port}).serve_forever())")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(port):
+    proc = subprocess.Popen([sys.executable, "-c", SERVE.format(lib=LIB, port=port)])
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    pytest.fail("le relais n'a pas démarré")
+
+
+def _wait_lines(client, count, timeout=5.0):
+    lines = []
+    deadline = time.monotonic() + timeout
+    while len(lines) < count and time.monotonic() < deadline:
+        lines += client.read_messages()
+        time.sleep(0.02)
+    return [(channel, line.split(" : ", 1)[1]) for channel, line in lines]
+
+
+@pytest.fixture
+def server():
+    port = _free_port()
+    proc = _start_server(port)
+    yield port
+    proc.kill()
+    proc.wait()
+
+
+def test_messages_reach_subscribers_of_their_channel(server):
+    reader = relay.RelayClient("127.0.0.1", server, ["general", "dev"])
+    writer = relay.RelayClient("127.0.0.1", server)
+    try:
+        time.sleep(0.2)   # abonnement pris en compte
+        writer.post("alice", "hello")
+        writer.post("alice", "deploy", "dev")
+        writer.post("alice", "ignored", "other")
+        writer.post("alice", "bye")
+        writer.flush()
+        assert _wait_lines(reader, 3) == [("general", "hello"), ("dev", "deploy"), ("general", "bye")]
+        assert _wait_lines(reader, 1, timeout=0.3) == []
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_bad_frames_are_ignored(server):
+    reader = relay.RelayClient("127.0.0.1", server, ["general"])
+    try:
+        time.sleep(0.2)
+        with socket.create_connection(("127.0.0.1", server)) as sock:
+            for frame in (b"not json\n", b"[1, 2]\n", b'{"op": "sub", "channels": "general"}\n',
+                          b'{"op": "pub", "channel": "../x", "text": "t"}\n', b'{"op": "pub", "channel": 3}\n'):
+                sock.sendall(frame)
+            sock.sendall((json.dumps({"op": "pub", "channel": "general", "user": "bob", "text": "ok"}) + "\n").encode())
+            assert _wait_lines(reader, 1) == [("general", "ok")]
+    finally:
+        reader.close()
+
+
+def test_reconnect_resubscribes_and_sends_queued_messages(monkeypatch):
+    monkeypatch.setattr(relay, "RECONNECT_MIN", 0.1)
+    port = _free_port()
+    proc = _start_server(port)
+    # un seul client : son réabonnement part avant les messages en attente
+    client = relay.RelayClient("127.0.0.1", port, ["general"])
+    try:
+        proc.kill()
+        proc.wait()
+        deadline = time.monotonic() + 5
+        while client.connected and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert not client.connected
+        for i in range(3):
+            client.post("alice", f"queued {i}")   # en attente, sans erreur
+        proc = _start_server(port)
+        assert _wait_lines(client, 3, timeout=10) == [("general", f"queued {i}") for i in range(3)]
+        assert client.connected
+    finally:
+        client.close()
+        proc.kill()
+        proc.wait()
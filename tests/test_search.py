@@ -0,0 +1,82 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Recherche dans l'historique (search.py) : requêtes, mise à jour
+# incrémentale de l'index et un seul indexeur par utilisateur.
+import os
+
+import pytest
+
+from writer import LogWriter
+from channels import channel_path, inbox
+from search import SearchIndex, search_sources
+
+CONFIG = {"journal_mode": "shared"}
+
+
+def _post(shared_file, channel, *messages):
+    path = channel_path(shared_file, channel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    writer = LogWriter(path)
+    try:
+        for sender, text in messages:
+            writer.post(sender, text)
+    finally:
+        writer.close()
+
+
+@pytest.fixture
+def index(tmp_path):
+    shared_file = str(tmp_path / "chat.log")
+    _post(shared_file, "general",
+          ("alice", "deploy the release tonight"),
+          ("bob", "the release notes are ready"),
+          ("alice", "@exec bob uptime"),
+          ("bob", "[FILE] Sent report.pdf to alice"))
+    _post(shared_file, "dev", ("carol", "deployment failed on staging"))
+    _post(shared_file, inbox("alice"), ("bob", "private release plan"))
+    _post(shared_file, inbox("bob"), ("carol", "not for alice"))
+    index = SearchIndex(str(tmp_path / "index.sqlite"), shared_file)
+    index.update(search_sources(shared_file, CONFIG, "alice"))
+    yield index
+    index.close()
+
+
+def _bodies(hits):
+    return sorted(hit.line.split(" : ", 1)[1] for hit in hits)
+
+
+def test_words_prefixes_and_filters(index):
+    assert _bodies(index.search("release")) == [
+        "deploy the release tonight", "private release plan", "the release notes are ready"]
+    assert _bodies(index.search("release notes")) == ["the release notes are ready"]
+    assert _bodies(index.search("deploy*")) == ["deploy the release tonight", "deployment failed on staging"]
+    assert _bodies(index.search("from:alice release")) == ["deploy the release tonight"]
+    assert _bodies(index.search("kind:exec")) == ["@exec bob uptime"]
+    assert _bodies(index.search("kind:file report.pdf")) == ["[FILE] Sent report.pdf to alice"]
+    assert _bodies(index.search("in:#dev")) == ["deployment failed on staging"]
+    assert _bodies(index.search("in:@alice")) == ["private release plan"]
+    assert index.search("not") == []   # boîte de réception de bob : pas indexée pour alice
+    with pytest.raises(ValueError):
+        index.search("kind:nope")
+
+
+def test_update_indexes_only_new_messages(index):
+    sources = search_sources(index.shared_file, CONFIG, "alice")
+    assert index.update(sources) == 0
+    _post(index.shared_file, "general", ("dave", "late release"))
+    assert index.update(sources) == 1
+    assert "late release" in _bodies(index.search("release"))
+
+
+def test_single_indexer_lease(tmp_path):
+    path, shared_file = str(tmp_path / "index.sqlite"), str(tmp_path / "chat.log")
+    first, second = SearchIndex(path, shared_file), SearchIndex(path, shared_file)
+    try:
+        assert first.claim("chat")
+        assert not second.claim("gui")
+        assert first.claim("chat")          # renouvellement
+        first.release("chat")
+        assert second.claim("gui", lease=-1)  # bail déjà expiré
+        assert first.claim("chat")          # repris après expiration
+    finally:
+        first.close()
+        second.close()
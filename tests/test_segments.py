@@ -0,0 +1,50 @@
+# KALANGOSO KANGELA - RAYANE BADKOUF
+# Journal segmenté : passage au segment suivant, lecture depuis une date.
+import time
+from datetime import datetime
+
+import pytest
+
+from writer import LogWriter
+from segments import LogTail, list_segments, messages_since
+
+
+def _body(line):
+    return line.split(" : ", 1)[1]
+
+
+@pytest.mark.parametrize("log_format", ["text", "binary"])
+def test_rollover_keeps_every_message_in_order(tmp_path, log_format):
+    base = str(tmp_path / "chat.log")
+    writer = LogWriter(base, segment_max_bytes=2048, log_format=log_format)
+    tail = LogTail(base, from_end=False)
+    seen = []
+    try:
+        for i in range(100):
+            writer.post("alice", f"message {i:03d} " + "x" * 40)
+            writer.flush()
+            if i % 10 == 0:
+                seen += tail.read_lines()
+    finally:
+        writer.close()
+    deadline = time.monotonic() + 5
+    while len(seen) < 100 and time.monotonic() < deadline:
+        seen += tail.read_lines()
+    tail.close()
+    assert len(list_segments(base)) > 3
+    assert [_body(line)[:11] for line in seen] == [f"message {i:03d}" for i in range(100)]
+
+
+def test_messages_since_accepts_time_of_day(tmp_path):
+    base = str(tmp_path / "chat.log")
+    today = datetime.now().replace(minute=0, second=0, microsecond=0)
+    writer = LogWriter(base)
+    try:
+        for hour in (8, 9, 10):
+            writer.post("alice", f"{hour}h", today.replace(hour=hour).timestamp())
+    finally:
+        writer.close()
+    assert [_body(line) for _, line in messages_since(base, "09:00")] == ["9h", "10h"]
+    assert [_body(line) for _, line in messages_since(base, "9:30")] == ["10h"]
+    since = today.strftime("%Y-%m-%d") + " 10:00"
+    assert [_body(line) for _, line in messages_since(base, since)] == ["10h"]